@@ -27,8 +27,11 @@ else:
     from acoustics import Acoustics
 
 import time
+import struct
 import numpy as np
 
+import frames
+
 # Flush stout so that system logging file can update with information
 sys.stdout.flush()
 
@@ -68,7 +71,18 @@ def send(msg):
 
 
 def read():
-    input = pAC.readline()
+    # Binary frames start with a sync byte that no text command does
+    first = pAC.read(1)
+    if first == frames.SYNC[0:1]:
+        try:
+            return frames.read_frame(pAC, first)
+        except ValueError as e:
+            print("Acoustics: dropped a bad frame (%s)." % e)
+            return None
+
+    input = first
+    if first and first != '\n':
+        input += pAC.readline()
     if input:
         if (input[-1] != '\n'):
             print("String is missing \\n terminator!")
@@ -118,30 +132,95 @@ def process_input(port):
             usage(pAC)
 
 
+def get_data_dictionary():
+    """Reply to get_data (see create_data_dictionary)."""
+    # Initialize
+    data_dictionary = create_data_dictionary()
+
+    # Get data
+    # Don't need this anymore... acoustics.log_ready('srp')
+    (data_dictionary['data']['heading'], epoch, dynamic_ss, raw_vpp) = acoustics.get_last_measurement()
+
+    #
+    if config.getboolean('Acoustics', 'enabled')==False:
+        data_dictionary['data']['epoch'] = None
+        data_dictionary['txt'] = 'Acoustics is disabled!'
+        data_dictionary['error'] = 1
+
+    elif data_dictionary['data']['heading'] == None:
+        data_dictionary['data']['epoch'] = None
+        data_dictionary['txt'] = 'have not located pinger yet'
+        data_dictionary['error'] = 1
+    else:
+        data_dictionary['data']['epoch'] = time.time() - epoch
+        data_dictionary['data']['signal_strength'] = dynamic_ss # 1 = 100% signal signal_strength
+        data_dictionary['data']['raw_transducer_voltage'] = raw_vpp
+
+    return data_dictionary
+
+
+def get_position_dictionary():
+    """Reply to get_position."""
+    data_dictionary = {'data': {'position': None, 'std': None,
+                                'n_bearings': acoustics.triangulator.n_bearings},
+                       'txt': '',
+                       'error': 0}
+    (position, covariance) = acoustics.get_pinger_position()
+    if position is None:
+        data_dictionary['txt'] = 'not enough bearings to locate pinger yet'
+        data_dictionary['error'] = 1
+    else:
+        # depth is unknown (nan) until a bearing with an elevation
+        # comes in. Send None, which the client can parse.
+        std = np.sqrt(np.diag(covariance))
+        data_dictionary['data']['position'] = [float(v) if np.isfinite(v) else None for v in position]
+        data_dictionary['data']['std'] = [float(v) if np.isfinite(v) else None for v in std]
+
+    return data_dictionary
+
+
+def send_frame(msg_type, payload=b''):
+    pAC.write(frames.encode_frame(msg_type, payload))
+
+
+def frame_manager(frame):
+    """Binary counterpart of task_manager (see frames.py)."""
+    # Refuse what isn't a well formed request, rather than unpack it
+    try:
+        frames.check_payload(frame)
+    except ValueError as e:
+        send_frame(frames.MSG_NAK, frames.encode_nak(frame.type, str(e)))
+        return
+
+    if frame.type == frames.MSG_GET_DATA:
+        send_frame(frames.MSG_DATA, frames.encode_data(get_data_dictionary()))
+
+    elif frame.type == frames.MSG_GET_POSITION:
+        data = get_position_dictionary()['data']
+        send_frame(frames.MSG_POSITION, frames.encode_position(data['position'], data['std'],
+                                                              data['n_bearings']))
+
+    elif frame.type == frames.MSG_SET_BAUD:
+        (baud,) = struct.unpack(frames.BAUD_FORMAT, frame.payload)
+        if baud not in frames.BAUD_RATES:
+            send_frame(frames.MSG_NAK, frames.encode_nak(frame.type, "unsupported baud rate %d" % baud))
+            return
+
+        # Acknowledge at the old rate, then switch once it's out
+        send_frame(frames.MSG_ACK, frames.encode_ack(frame.type, baud))
+        pAC.flush()
+        pAC.baudrate = baud
+        print("Acoustics: switched to %d baud." % baud)
+
+    else:
+        # a reply type, which only the client should get
+        send_frame(frames.MSG_NAK, frames.encode_nak(frame.type, "not a request"))
+
+
 def task_manager(input):
     # Other logic for input
     if (input == "get_data"):
-        # Initialize
-        data_dictionary = create_data_dictionary()
-
-        # Get data
-        # Don't need this anymore... acoustics.log_ready('srp')
-        (data_dictionary['data']['heading'], epoch, dynamic_ss, raw_vpp) = acoustics.get_last_measurement()
-
-        #
-        if config.getboolean('Acoustics', 'enabled')==False:
-            data_dictionary['data']['epoch'] = None
-            data_dictionary['txt'] = 'Acoustics is disabled!'
-            data_dictionary['error'] = 1
-        
-        elif data_dictionary['data']['heading'] == None:
-            data_dictionary['data']['epoch'] = None
-            data_dictionary['txt'] = 'have not located pinger yet'
-            data_dictionary['error'] = 1
-        else:
-            data_dictionary['data']['epoch'] = time.time() - epoch
-            data_dictionary['data']['signal_strength'] = dynamic_ss # 1 = 100% signal signal_strength
-            data_dictionary['data']['raw_transducer_voltage'] = raw_vpp
+        data_dictionary = get_data_dictionary()
 
         # Convert response into string
         str_response = str(data_dictionary)
@@ -197,9 +276,40 @@ def task_manager(input):
         # send back response just to let user know op. was successful   
         pAC.write('spacing changed successfully\n')
 
+    elif "update_yaw" in input:
+        # Takes input in the form "update_yaw,12.5" or "update_yaw,12.5,-3.0"
+        # (yaw in degrees, optionally followed by yaw rate in deg/sec)
+        args = [float(arg) for arg in input.split(',')[1:]] # will throw up error if not float
+        acoustics.update_yaw(*args)
+
+        # send back response just to let user know op. was successful
+        pAC.write('yaw updated successfully\n')
+
+    elif "update_pose" in input:
+        # Takes input in the form "update_pose,x,y,z,yaw" or
+        # "update_pose,x,y,z,yaw,yaw_rate" (meters, degrees, deg/sec)
+        args = [float(arg) for arg in input.split(',')[1:]] # will throw up error if not float
+        acoustics.update_pose(args[0:3], *args[3:])
+
+        # send back response just to let user know op. was successful
+        pAC.write('pose updated successfully\n')
+
+    elif input == "get_position":
+        # Reply with the pinger position located from the bearings taken
+        # at each pose so far
+        data_dictionary = get_position_dictionary()
+        str_response = str(data_dictionary)
+        print(str_response)
+        pAC.write(str_response + '\n')
+
+    elif input == "reset_position":
+        # Forget the bearings taken so far (eg. new pinger, new mission)
+        acoustics.triangulator.reset()
+        pAC.write('position reset successfully\n')
+
     elif input == "hello":
         send("Hello to you too, Seawolf.")
-        
+
     elif input == "enable":
         enable_acoustics()
             
@@ -229,10 +339,11 @@ def main_loop():
         try:
             # Try reading and acting upon seawolf's input first
             input = read()
-            print('DEBUGGING NOV 2nd'); input = 'get_data'
-            
-            
-            if input:
+
+            if isinstance(input, frames.Frame):
+                print("RX: frame 0x%02x" % input.type)
+                frame_manager(input)
+            elif input:
                 # Process user input
                 print("RX: {0}".format(input))
                 task_manager(input)
@@ -368,18 +479,33 @@ class API(object):
     def __init__(self):
         init_acoustics()
 
-    def process(self, input_data):
+    def process(self, input_data, sample_rate=None):
+        """Pushes one recorded ping through the acoustics pipeline (sim
+        mode). input_data is an (M, n_channels) array of samples. Returns
+        a dictionary describing what the pipeline did with the ping.
+        """
+        # match the sampling parameters of the recording
+        if sample_rate is not None and sample_rate != acoustics.adc.sample_rate:
+            acoustics.adc.update_sample_rate(sample_rate)
+
         # plant the acoustic data in the ADC
         acoustics.adc.sim_load_data(list(np.transpose(input_data)))
 
         # Run the update measurement command (simulated)
-        acoustics.update_measurement() # pulls data from acoustics.adc automatically
+        start = time.time()
+        update_occured = acoustics.update_measurement() # pulls data from acoustics.adc automatically
+        process_time = time.time() - start
 
         # run the get data command
         task_manager('get_data')
 
         output_data = {}
-
-
-
-        return output_data
\ No newline at end of file
+        output_data['update'] = update_occured
+        output_data['result'] = acoustics.get_last_measurement()[0] if update_occured else None
+        output_data['TOF'] = acoustics.adc.TOF
+        output_data['TRG_CH'] = acoustics.adc.TRG_CH
+        output_data['AGain'] = acoustics.filt.Gval
+        output_data['DGain'] = acoustics.adc.digital_gain
+        output_data['process_time'] = process_time
+
+        return output_data
@@ -0,0 +1,346 @@
+"""Binary framed protocol between acoustics_terminal2 and the Seawolf client.
+
+The text protocol answers get_data with the repr of a dictionary, several
+hundred bytes at 9600 baud. The same answer fits in a 50 byte frame:
+
+    +------+------+---------+------+--------+---------+-------+
+    | 0xA5 | 0x5A | version | type | length | payload | crc16 |
+    +------+------+---------+------+--------+---------+-------+
+       1      1        1       1       2      length      2
+
+Multi-byte fields are little endian. The CRC is CRC-CCITT (binascii.crc_hqx,
+initial value 0xFFFF) over everything from version up to the end of the
+payload. Payloads have a fixed layout per message type (see the *_FORMAT
+constants). Missing values are sent as NaN and decoded back into None.
+
+Text commands never start with the 0xA5 sync byte, so the terminal tells
+them apart from frames by the first byte it reads, and keeps answering
+legacy text commands as before.
+
+Message types:
+    * MSG_GET_DATA (no payload): answered with MSG_DATA, the content of the
+    text get_data reply.
+    * MSG_GET_POSITION (no payload): answered with MSG_POSITION, the
+    content of the text get_position reply.
+    * MSG_SET_BAUD (baud): answered with MSG_ACK at the current baud rate,
+    after which the terminal switches over, or MSG_NAK if the rate isn't in
+    BAUD_RATES. The client switches once it gets the MSG_ACK.
+    * MSG_NAK (type of the rejected message, followed by an ascii reason).
+    Also the answer to requests of an unknown type, or whose payload isn't
+    the size of their type (see PAYLOAD_SIZES).
+"""
+import binascii
+import math
+import struct
+import time
+from collections import namedtuple
+
+SYNC = b'\xa5\x5a'
+VERSION = 1
+
+HEADER_FORMAT = '<2sBBH'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+CRC_FORMAT = '<H'
+CRC_SIZE = struct.calcsize(CRC_FORMAT)
+
+# Longest payload accepted. Anything longer is taken for line noise.
+MAX_PAYLOAD = 256
+
+MSG_GET_DATA = 0x01
+MSG_GET_POSITION = 0x02
+MSG_SET_BAUD = 0x03
+MSG_DATA = 0x81
+MSG_POSITION = 0x82
+MSG_ACK = 0xF0
+MSG_NAK = 0xFF
+
+# Rates the terminal may be switched to with MSG_SET_BAUD
+BAUD_RATES = (9600, 19200, 38400, 57600, 115200, 230400)
+
+# MSG_DATA: error code, then one float32 per field. The heading fields are
+# the ones of the get_data result dictionary (see Acoustics).
+DATA_FORMAT = '<B10f'
+DATA_FIELDS = ('epoch', 'signal_strength', 'raw_transducer_voltage')
+HEADING_FIELDS = ('ab', 'cd', 'az', 'el', 'quality', 'heading', 'heading_std')
+
+# MSG_POSITION: error code, number of bearings, position (m) and its std
+POSITION_FORMAT = '<BH6f'
+
+# MSG_SET_BAUD and MSG_ACK: baud rate (MSG_ACK also names the type it acks)
+BAUD_FORMAT = '<I'
+ACK_FORMAT = '<BI'
+
+# Error codes, and the text the legacy reply carries for each
+ERR_NONE = 0
+ERR_NO_DATA = 1
+ERR_DISABLED = 2
+ERROR_TEXT = {ERR_NONE: '',
+              ERR_NO_DATA: 'have not located pinger yet',
+              ERR_DISABLED: 'Acoustics is disabled!'}
+
+# Payload size of each message type. MSG_NAK is the only one of variable
+# size: at least the type it refuses.
+PAYLOAD_SIZES = {MSG_GET_DATA: 0,
+                 MSG_GET_POSITION: 0,
+                 MSG_SET_BAUD: struct.calcsize(BAUD_FORMAT),
+                 MSG_DATA: struct.calcsize(DATA_FORMAT),
+                 MSG_POSITION: struct.calcsize(POSITION_FORMAT),
+                 MSG_ACK: struct.calcsize(ACK_FORMAT)}
+NAK_MIN_SIZE = 1
+
+Frame = namedtuple('Frame', ['type', 'payload'])
+
+
+# ######################
+#### Framing ###########
+########################
+
+
+def crc16(data):
+    return binascii.crc_hqx(data, 0xFFFF)
+
+
+def encode_frame(msg_type, payload=b''):
+    if len(payload) > MAX_PAYLOAD:
+        raise ValueError("encode_frame: payload of %d bytes is over %d." % (len(payload), MAX_PAYLOAD))
+
+    frame = struct.pack(HEADER_FORMAT, SYNC, VERSION, msg_type, len(payload)) + payload
+    return frame + struct.pack(CRC_FORMAT, crc16(frame[len(SYNC):]))
+
+
+def decode_header(header):
+    """Returns (msg_type, length) of a frame header. Raises ValueError if
+    it isn't one."""
+    (sync, version, msg_type, length) = struct.unpack(HEADER_FORMAT, header)
+    if sync != SYNC:
+        raise ValueError("decode_header: bad sync bytes %r." % sync)
+    if version != VERSION:
+        raise ValueError("decode_header: frame version %d, expected %d." % (version, VERSION))
+    if length > MAX_PAYLOAD:
+        raise ValueError("decode_header: payload length %d is over %d." % (length, MAX_PAYLOAD))
+
+    return (msg_type, length)
+
+
+def check_crc(frame):
+    """Raises ValueError if the crc of a complete frame is wrong."""
+    body = frame[len(SYNC):-CRC_SIZE]
+    (crc,) = struct.unpack(CRC_FORMAT, frame[-CRC_SIZE:])
+    if crc != crc16(body):
+        raise ValueError("check_crc: crc mismatch (got 0x%04x, expected 0x%04x)." % (crc, crc16(body)))
+
+
+def check_payload(frame):
+    """Raises ValueError if the frame is of an unknown type, or its payload
+    isn't the size of its type."""
+    size = len(frame.payload)
+    if frame.type == MSG_NAK:
+        if size < NAK_MIN_SIZE:
+            raise ValueError("check_payload: empty nak.")
+    elif frame.type not in PAYLOAD_SIZES:
+        raise ValueError("check_payload: unknown message type 0x%02x." % frame.type)
+    elif size != PAYLOAD_SIZES[frame.type]:
+        raise ValueError("check_payload: message 0x%02x has a %d byte payload, expected %d."
+                         % (frame.type, size, PAYLOAD_SIZES[frame.type]))
+
+
+def read_frame(port, first=b''):
+    """Reads one frame from a serial port (anything with read(n)). first
+    holds any of its bytes that were already read off the port. Returns a
+    Frame, or raises ValueError on a bad or incomplete frame.
+    """
+    header = first + port.read(HEADER_SIZE - len(first))
+    if len(header) < HEADER_SIZE:
+        raise ValueError("read_frame: timed out in the header.")
+    (msg_type, length) = decode_header(header)
+
+    rest = port.read(length + CRC_SIZE)
+    if len(rest) < length + CRC_SIZE:
+        raise ValueError("read_frame: timed out in the payload.")
+    check_crc(header + rest)
+
+    return Frame(msg_type, rest[:length])
+
+
+class Frame_Decoder(object):
+    """Pulls frames out of a byte stream that arrives in arbitrary pieces.
+    Garbage and corrupt frames are skipped, by searching for the next
+    sync bytes.
+    """
+
+    def __init__(self):
+        self.buffer = b''
+        self.n_dropped = 0  # bytes skipped so far
+
+    def feed(self, data):
+        """Adds data to the stream. Returns the list of Frames it
+        completed."""
+        self.buffer += data
+        frames = []
+        while True:
+            start = self.buffer.find(SYNC)
+            if start < 0:
+                # keep a trailing first sync byte, the second may be next
+                keep = 1 if self.buffer[-1:] == SYNC[0:1] else 0
+                self.n_dropped += len(self.buffer) - keep
+                self.buffer = self.buffer[len(self.buffer) - keep:]
+                break
+            self.n_dropped += start
+            self.buffer = self.buffer[start:]
+
+            if len(self.buffer) < HEADER_SIZE:
+                break
+            try:
+                (msg_type, length) = decode_header(self.buffer[:HEADER_SIZE])
+                end = HEADER_SIZE + length + CRC_SIZE
+                if len(self.buffer) < end:
+                    break
+                check_crc(self.buffer[:end])
+            except ValueError:
+                # not a frame after all. Look past these sync bytes.
+                self.n_dropped += len(SYNC)
+                self.buffer = self.buffer[len(SYNC):]
+                continue
+
+            frames.append(Frame(msg_type, self.buffer[HEADER_SIZE:end - CRC_SIZE]))
+            self.buffer = self.buffer[end:]
+
+        return frames
+
+
+# ######################
+#### Payloads ##########
+########################
+
+
+def _to_float(value):
+    return float('nan') if value is None else float(value)
+
+
+def _from_float(value):
+    return None if math.isnan(value) else value
+
+
+def encode_data(data_dictionary):
+    """Packs a get_data reply dictionary (see
+    acoustics_terminal2.create_data_dictionary) into a MSG_DATA payload."""
+    data = data_dictionary['data']
+    heading = data['heading'] or {}
+
+    if data_dictionary['error'] == 0:
+        error = ERR_NONE
+    elif data_dictionary['txt'] == ERROR_TEXT[ERR_DISABLED]:
+        error = ERR_DISABLED
+    else:
+        error = ERR_NO_DATA
+
+    values = ([data.get(name, None) for name in DATA_FIELDS]
+              + [heading.get(name, None) for name in HEADING_FIELDS])
+    return struct.pack(DATA_FORMAT, error, *[_to_float(v) for v in values])
+
+
+def decode_data(payload):
+    """Unpacks a MSG_DATA payload into the same dictionary the text get_data
+    reply holds (heading only has the fields of HEADING_FIELDS)."""
+    values = struct.unpack(DATA_FORMAT, payload)
+    error = values[0]
+    values = [_from_float(v) for v in values[1:]]
+
+    data = dict(zip(DATA_FIELDS, values[:len(DATA_FIELDS)]))
+    heading = dict(zip(HEADING_FIELDS, values[len(DATA_FIELDS):]))
+    data['heading'] = heading if error == ERR_NONE else None
+
+    return {'data': data,
+            'txt': ERROR_TEXT.get(error, 'error %d' % error),
+            'error': 0 if error == ERR_NONE else 1}
+
+
+def encode_position(position, std, n_bearings):
+    """Packs a pinger position (or None) and its std into a MSG_POSITION
+    payload."""
+    if position is None:
+        return struct.pack(POSITION_FORMAT, ERR_NO_DATA, n_bearings, *([float('nan')] * 6))
+
+    values = [_to_float(v) for v in list(position) + list(std)]
+    return struct.pack(POSITION_FORMAT, ERR_NONE, n_bearings, *values)
+
+
+def decode_position(payload):
+    values = struct.unpack(POSITION_FORMAT, payload)
+    (error, n_bearings) = values[0:2]
+    values = [_from_float(v) for v in values[2:]]
+
+    data = {'position': None, 'std': None, 'n_bearings': n_bearings}
+    if error == ERR_NONE:
+        (data['position'], data['std']) = (values[0:3], values[3:6])
+
+    return {'data': data,
+            'txt': '' if error == ERR_NONE else 'not enough bearings to locate pinger yet',
+            'error': 0 if error == ERR_NONE else 1}
+
+
+def encode_ack(msg_type, value=0):
+    return struct.pack(ACK_FORMAT, msg_type, value)
+
+
+def encode_nak(msg_type, reason):
+    return struct.pack('<B', msg_type) + reason.encode('ascii')
+
+
+# ######################
+#### Client ############
+########################
+
+
+class Frame_Client(object):
+    """Seawolf end of the binary protocol.
+
+    Parameters:
+        * port: open serial port (serial.Serial, or anything with write(),
+        read(n) and a settable baudrate), talking to acoustics_terminal2.
+    """
+
+    def __init__(self, port):
+        self.port = port
+
+    def request(self, msg_type, payload=b'', reply_type=None):
+        """Sends a frame and returns the payload of the reply. Raises
+        IOError if there's no valid reply, or it isn't of reply_type."""
+        self.port.write(encode_frame(msg_type, payload))
+
+        # Skip anything that isn't a frame (eg. text from before)
+        first = b''
+        while first != SYNC[0:1]:
+            first = self.port.read(1)
+            if not first:
+                raise IOError("Frame_Client: no reply to message 0x%02x." % msg_type)
+        try:
+            frame = read_frame(self.port, first)
+            check_payload(frame)
+        except ValueError as e:
+            raise IOError("Frame_Client: bad reply to message 0x%02x (%s)" % (msg_type, e))
+
+        if frame.type == MSG_NAK:
+            raise IOError("Frame_Client: message 0x%02x was refused (%s)."
+                          % (msg_type, frame.payload[1:].decode('ascii', 'replace')))
+        if reply_type is not None and frame.type != reply_type:
+            raise IOError("Frame_Client: expected a 0x%02x reply to 0x%02x, got 0x%02x."
+                          % (reply_type, msg_type, frame.type))
+
+        return frame.payload
+
+    def get_data(self):
+        """Same as seawolf's Acoustics.get_data(), over the binary
+        protocol."""
+        return decode_data(self.request(MSG_GET_DATA, reply_type=MSG_DATA))
+
+    def get_position(self):
+        return decode_position(self.request(MSG_GET_POSITION, reply_type=MSG_POSITION))
+
+    def set_baud(self, baud):
+        """Switches both ends of the link over to baud."""
+        self.request(MSG_SET_BAUD, struct.pack(BAUD_FORMAT, baud), reply_type=MSG_ACK)
+
+        # give the terminal a moment to switch over too
+        time.sleep(0.05)
+        self.port.baudrate = baud
@@ -0,0 +1,491 @@
+"""Load tester for the acoustics terminal protocol, over a pseudo-terminal.
+
+Runs the real acoustics_terminal2 main loop (sim mode) on the slave end of a
+PTY pair, and drives it from the master end with the Seawolf client
+(host_communication/seawolf/acoustics.py). Commands go out at a fixed rate,
+either drawn from a weighted mix or replayed from a file, and the time each
+one takes to get its reply is recorded.
+
+The Seawolf client isn't tracked in this repository (git ignores
+host_communication/seawolf), so a clean checkout doesn't have it. Without it,
+the tester falls back on Text_Client, which speaks the same text protocol
+but doesn't log.
+
+usage:
+    python pty_loadtest.py --rate 2 -n 200 --mix get_data:9 hello:1
+    python pty_loadtest.py --replay commands.txt --baud 9600 -o latency.csv
+    python pty_loadtest.py --mix get_data_bin --switch-baud 115200
+
+get_data_bin is get_data over the binary protocol (see frames.py).
+--switch-baud has the client negotiate a faster rate with MSG_SET_BAUD
+before the commands start.
+
+Replay files hold one command per line. A line may start with the time (sec)
+at which to send it; untimed lines go out 1/rate after the previous one.
+Lines copied from the terminal's own output ("RX: get_data") work as is.
+
+The terminal captures from a synthetic stream (Capture_Generator.stream) in
+real time, so update_measurement() blocks for as long as the PRU would wait
+for a ping. The terminal reports every capture back to the tester, and the
+latency of get_data requests that overlapped one is summarized separately.
+
+A PTY moves bytes instantly, whatever its baud rate, so both ends hold each
+write for as long as it would take on the wire (8N1).
+"""
+from os import path
+
+# Get variables for navigating the file system.
+root_directory = path.dirname(path.dirname(path.dirname(path.realpath(__file__))))
+hc_directory = path.join(root_directory, "host_communication")
+pf_directory = path.join(root_directory, "pinger_finder")
+
+import sys
+sys.path.insert(0, hc_directory)
+sys.path.insert(0, pf_directory)
+
+import os
+import re
+import csv
+import imp
+import ast
+import tty
+import time
+import Queue
+import shutil
+import select
+import argparse
+import tempfile
+import multiprocessing
+from collections import OrderedDict
+
+import numpy as np
+import serial
+
+import frames
+
+BITS_PER_BYTE = 10  # 8N1: start bit, 8 data bits, stop bit
+CLIENT_TIMEOUT = 10  # sec. Same as seawolf's Acoustics.connect()
+TERMINAL_TIMEOUT = 1  # sec. Same as acoustics_terminal2.define_commlink()
+
+TIMED_LINE = re.compile(r'^(\d+(?:\.\d*)?)\s+(\S.*)$')
+RESULT_HEADER = ['sent', 'command', 'latency_ms', 'ok', 'during_capture', 'slip_ms']
+
+
+def wire_time(n_bytes, baud):
+    return n_bytes * BITS_PER_BYTE / float(baud)
+
+
+# ######################
+#### Serial ends #######
+########################
+
+
+class Paced_Serial(serial.Serial):
+    """pyserial port whose write() blocks for as long as the bytes would
+    take to go out at its baud rate."""
+
+    def write(self, data):
+        n = super(Paced_Serial, self).write(data)
+        time.sleep(wire_time(len(data), self.baudrate))
+        return n
+
+
+class Pty_Port(object):
+    """Stands in for serial.Serial on the master end of the PTY. Only has
+    what seawolf's Acoustics uses (write() and readline()), with the same
+    pacing as Paced_Serial.
+    """
+
+    def __init__(self, fd, baudrate, timeout=CLIENT_TIMEOUT):
+        self.fd = fd
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.buffer = ''
+
+    def write(self, data):
+        sent = 0
+        while sent < len(data):
+            sent += os.write(self.fd, data[sent:])
+        time.sleep(wire_time(len(data), self.baudrate))
+
+        return sent
+
+    def read(self, size=1):
+        """Returns up to size bytes, fewer if the timeout runs out first."""
+        deadline = time.time() + self.timeout
+        while len(self.buffer) < size:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            if select.select([self.fd], [], [], remaining)[0]:
+                self.buffer += os.read(self.fd, 4096)
+
+        (data, self.buffer) = (self.buffer[:size], self.buffer[size:])
+
+        return data
+
+    def readline(self):
+        """Returns the next line, with its newline. Like pyserial, returns
+        whatever arrived so far (possibly '') if the timeout runs out first.
+        """
+        deadline = time.time() + self.timeout
+        while '\n' not in self.buffer:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            if select.select([self.fd], [], [], remaining)[0]:
+                self.buffer += os.read(self.fd, 4096)
+
+        idx = self.buffer.find('\n') + 1 or len(self.buffer)
+        (line, self.buffer) = (self.buffer[:idx], self.buffer[idx:])
+
+        return line
+
+    def flush_input(self):
+        """Drops anything received but not read yet (eg. the late reply to
+        a command that timed out)."""
+        self.buffer = ''
+        while select.select([self.fd], [], [], 0)[0]:
+            self.buffer += os.read(self.fd, 4096)
+        dropped = self.buffer
+        self.buffer = ''
+
+        return dropped
+
+
+class Text_Client(object):
+    """Stand-in for seawolf's Acoustics, for when it isn't checked out.
+    Only has what the tester uses (send(), read() and get_data()), and
+    replies the same way.
+    """
+
+    def __init__(self):
+        self.s_port = None
+
+    def send(self, msg):
+        self.s_port.write(msg + '\n')
+
+    def read(self):
+        """Returns the next line without its newline, or None if the read
+        timed out."""
+        line = self.s_port.readline()
+        if line:
+            return line.rstrip('\n')
+
+        return None
+
+    def get_data(self):
+        self.send('get_data')
+        return ast.literal_eval(self.read())
+
+
+# ######################
+#### Terminal end ######
+########################
+
+
+def run_terminal(slave_name, args, captures):
+    """Runs in its own process. Sets up acoustics_terminal2 for the test and
+    runs its main loop until terminated. The start/end time of every
+    capture is put on the captures queue.
+    """
+    if not args.verbose:
+        sys.stdout = open(os.devnull, 'w')
+
+    # Imported here rather than at the top, so that only this process loads
+    # the pipeline. Loaded from this file, it comes up in sim mode.
+    import acoustics_terminal2 as terminal
+    import acoustics as pf_acoustics
+    from environment import source
+    from environment.acousimtools import Capture_Generator
+
+    # Work on a copy of config.ini, so that the test's settings (and the
+    # terminal's own writes to it on enable/disable) never touch the real one
+    work_dir = tempfile.mkdtemp(prefix='pty_loadtest_')
+    config_fp = path.join(work_dir, 'config.ini')
+    shutil.copy(path.join(root_directory, 'config.ini'), config_fp)
+    terminal.root_directory = work_dir
+    pf_acoustics.BASE_DIR = work_dir
+
+    config = terminal.config
+    config.read(config_fp)
+    if args.sampling_interval is not None:
+        config.set('Terminal', 'sampling_interval', repr(args.sampling_interval))
+    config.set('Terminal', 'debugging', 'False')
+    config.set('Terminal', 'viewer_active', 'False')
+    config.set('Terminal', 'log_at_start', 'False')
+    config.set('Acoustics', 'default_enable_state', 'True')
+    with open(config_fp, 'wb') as configfile:
+        config.write(configfile)
+
+    # Pipeline, fed by a synthetic pinger
+    ac = terminal.acoustics
+    terminal.init_acoustics()
+
+    bearing = np.radians(args.bearing)
+    pinger = source.Pinger()
+    pinger.position = np.array([[args.range * np.sin(bearing), args.range * np.cos(bearing),
+                                 -args.depth]])
+    gen = Capture_Generator(ac.array, pinger, filt=ac.filt, seed=args.seed)
+    gen.freq = config.getfloat('Acoustics', 'pinger_frequency')
+
+    if args.capture == 'stream':
+        stream = gen.stream(ac.adc, 2 * args.ping_interval, interval=args.ping_interval)
+        ac.adc.sim_load_stream(stream, filt=ac.filt, loop=True)
+        ac.adc.sim_realtime = True
+    else:
+        ac.adc.sim_attach(gen)
+
+    # Report every capture to the tester
+    update_measurement = ac.update_measurement
+
+    def reported_update_measurement(*a, **kw):
+        start = time.time()
+        try:
+            return update_measurement(*a, **kw)
+        finally:
+            captures.put((start, time.time()))
+
+    ac.update_measurement = reported_update_measurement
+
+    # Swap the sim port for the slave end of the PTY, and go
+    terminal.pAC = Paced_Serial(slave_name, args.baud, timeout=TERMINAL_TIMEOUT)
+    terminal.main_loop()
+
+
+# ######################
+#### Client end ########
+########################
+
+
+def load_client():
+    """Returns seawolf's Acoustics client, or a Text_Client if seawolf's
+    acoustics.py isn't there. The seawolf module gets a name of its own,
+    since the pipeline's acoustics module already goes by 'acoustics'."""
+    fp = path.join(hc_directory, 'seawolf', 'acoustics.py')
+    if not path.isfile(fp):
+        print("pty_loadtest: %s not found. Using the built in text client." % fp)
+        return Text_Client()
+
+    return imp.load_source('seawolf_acoustics', fp).Acoustics()
+
+
+def parse_mix(mix):
+    """Parses ['get_data:9', 'hello'] into [('get_data', 9.0), ('hello', 1.0)]."""
+    parsed = []
+    for item in mix:
+        (cmd, _, weight) = item.rpartition(':') if ':' in item else (item, '', '1')
+        parsed.append((cmd, float(weight)))
+
+    return parsed
+
+
+def fake_commands(mix, n, rate, seed=None):
+    """Returns n (send time, command) pairs drawn from a weighted mix, sent
+    at a fixed rate."""
+    rng = np.random.RandomState(seed)
+    (cmds, weights) = zip(*mix)
+    p = np.array(weights, dtype=float)
+    picks = rng.choice(len(cmds), size=n, p=p / p.sum())
+
+    return [(i / rate, cmds[k]) for (i, k) in enumerate(picks)]
+
+
+def load_commands(fp, rate):
+    """Reads a command stream from a file. Returns (send time, command)
+    pairs."""
+    schedule = []
+    t = -1.0 / rate
+    with open(fp, 'r') as f:
+        for line in f:
+            line = line.split('#')[0].strip()
+            if line.startswith('RX: '):
+                line = line[4:].strip()
+            if not line:
+                continue
+
+            m = TIMED_LINE.match(line)
+            if m:
+                (t, line) = (float(m.group(1)), m.group(2))
+            else:
+                t += 1.0 / rate
+            schedule.append((t, line))
+
+    return schedule
+
+
+def issue(client, cmd):
+    """Sends one command with the client and waits for the reply.
+    Returns (reply, ok)."""
+    try:
+        if cmd == 'get_data':
+            return (client.get_data(), True)
+        if cmd == 'get_data_bin':
+            return (client.frames.get_data(), True)
+
+        client.send(cmd)
+        reply = client.read()
+        return (reply, reply is not None)
+
+    except (ValueError, SyntaxError, IOError):
+        # get_data() couldn't parse its reply (eg. the read timed out)
+        return (None, False)
+
+
+def run_client(client, schedule):
+    results = []
+    start = time.time()
+    for (t_send, cmd) in schedule:
+        delay = start + t_send - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+        dropped = client.s_port.flush_input()
+        if dropped:
+            print("pty_loadtest: dropped stale input %r" % dropped)
+
+        sent = time.time()
+        (reply, ok) = issue(client, cmd)
+        done = time.time()
+
+        results.append({
+            'sent': sent,
+            'done': done,
+            'command': cmd,
+            'ok': ok,
+            'slip': sent - (start + t_send),
+        })
+
+    return results
+
+
+def drain(captures):
+    windows = []
+    while True:
+        try:
+            windows.append(captures.get(timeout=0.1))
+        except Queue.Empty:
+            return windows
+
+
+def mark_captures(results, windows):
+    """Flags the results whose command overlapped a capture."""
+    for result in results:
+        result['during_capture'] = any((c0 < result['done']) and (c1 > result['sent'])
+                                       for (c0, c1) in windows)
+
+
+def summarize(results, windows, elapsed):
+    groups = OrderedDict()
+    for result in results:
+        name = result['command'].split(',')[0]
+        groups.setdefault(name, []).append(result)
+        if name in ('get_data', 'get_data_bin'):
+            key = name + (' (capture)' if result['during_capture'] else ' (idle)')
+            groups.setdefault(key, []).append(result)
+
+    print("pty_loadtest: %d commands in %.1fs, %d captures" % (len(results), elapsed, len(windows)))
+    print("%-20s %6s %6s %9s %9s %9s %9s %9s"
+          % ('command', 'n', 'failed', 'mean_ms', 'p50_ms', 'p90_ms', 'p99_ms', 'max_ms'))
+    for (name, group) in groups.items():
+        latency = np.array([1000 * (r['done'] - r['sent']) for r in group if r['ok']])
+        failed = len(group) - latency.size
+        if latency.size:
+            stats = [np.mean(latency)] + list(np.percentile(latency, [50, 90, 99])) + [np.max(latency)]
+        else:
+            stats = [np.nan] * 5
+        print("%-20s %6d %6d %9.1f %9.1f %9.1f %9.1f %9.1f" % tuple([name, len(group), failed] + stats))
+
+    if windows:
+        durations = np.array([1000 * (c1 - c0) for (c0, c1) in windows])
+        print("capture: mean = %.1fms, max = %.1fms" % (np.mean(durations), np.max(durations)))
+    if results:
+        slip = np.array([1000 * r['slip'] for r in results])
+        print("schedule slip: mean = %.1fms, max = %.1fms" % (np.mean(slip), np.max(slip)))
+
+
+def save(results, fp):
+    t0 = results[0]['sent'] if results else 0
+    with open(fp, 'wb') as f:
+        writer = csv.writer(f)
+        writer.writerow(RESULT_HEADER)
+        for r in results:
+            writer.writerow([r['sent'] - t0, r['command'], 1000 * (r['done'] - r['sent']),
+                             int(r['ok']), int(r['during_capture']), 1000 * r['slip']])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the acoustics terminal over a PTY.")
+    parser.add_argument('--baud', type=int, default=9600)
+    parser.add_argument('--switch-baud', type=int, choices=frames.BAUD_RATES,
+                        help="baud rate to negotiate before sending commands")
+    parser.add_argument('--rate', type=float, default=1.0, help="commands/sec")
+    parser.add_argument('-n', '--count', type=int, default=100, help="commands to send (--mix)")
+    parser.add_argument('--mix', nargs='+', default=['get_data:9', 'hello:1'],
+                        help="weighted commands, as cmd:weight")
+    parser.add_argument('--replay', help="command stream to replay instead of --mix")
+    parser.add_argument('--capture', choices=['stream', 'instant'], default='stream',
+                        help="capture in real time from a stream, or instantly from the generator")
+    parser.add_argument('--ping-interval', type=float, default=2.0, help="time between pings (sec)")
+    parser.add_argument('--sampling-interval', type=float, default=None,
+                        help="terminal's time between captures (sec). Defaults to config.ini")
+    parser.add_argument('--range', type=float, default=5.0, help="pinger range (m)")
+    parser.add_argument('--bearing', type=float, default=30.0, help="pinger bearing (deg)")
+    parser.add_argument('--depth', type=float, default=1.0, help="pinger depth below the array (m)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--startup-timeout', type=float, default=60.0,
+                        help="time to wait for the terminal to come up (sec)")
+    parser.add_argument('-o', '--out', help="per-command results csv")
+    parser.add_argument('-v', '--verbose', action='store_true', help="show terminal output")
+    args = parser.parse_args(argv)
+
+    if args.replay:
+        schedule = load_commands(args.replay, args.rate)
+    else:
+        schedule = fake_commands(parse_mix(args.mix), args.count, args.rate, args.seed)
+
+    # PTY pair. Raw mode on the slave, so nothing gets echoed or cooked
+    # before the terminal's port opens it.
+    (master_fd, slave_fd) = os.openpty()
+    tty.setraw(slave_fd)
+    slave_name = os.ttyname(slave_fd)
+
+    captures = multiprocessing.Queue()
+    term = multiprocessing.Process(target=run_terminal, args=(slave_name, args, captures))
+    term.daemon = True
+    term.start()
+
+    client = load_client()
+    client.s_port = Pty_Port(master_fd, args.baud, timeout=args.startup_timeout)
+    client.frames = frames.Frame_Client(client.s_port)
+
+    try:
+        # The main loop starts by enabling acoustics, which replies
+        banner = client.read()
+        if banner is None:
+            raise IOError("pty_loadtest: terminal didn't come up within %.0fs" % args.startup_timeout)
+        client.s_port.timeout = CLIENT_TIMEOUT
+        if args.switch_baud:
+            client.frames.set_baud(args.switch_baud)
+            print("pty_loadtest: switched to %d baud" % args.switch_baud)
+        print("pty_loadtest: terminal up on %s (%r). Sending %d commands at %d baud"
+              % (slave_name, banner, len(schedule), client.s_port.baudrate))
+
+        start = time.time()
+        results = run_client(client, schedule)
+        elapsed = time.time() - start
+        windows = drain(captures)
+    finally:
+        term.terminate()
+        term.join()
+        os.close(master_fd)
+        os.close(slave_fd)
+
+    mark_captures(results, windows)
+    summarize(results, windows, elapsed)
+    if args.out:
+        save(results, args.out)
+        print("pty_loadtest: results written to %s" % args.out)
+
+if __name__ == '__main__':
+    main()
@@ -16,6 +16,11 @@ except ImportError:
 import glob
 #from scipy.signal import argrelextrema
 
+# Scripts that run the acoustics code against simulated hardware. Importing
+# this module from any of them loads the sim versions of the ADC and filter.
+SIM_FILENAMES = ['mission_replay.py', 'batch_replay.py', 'sweep_acoustics.py',
+                 'pty_loadtest.py']
+
 # sense the name of the script that imported this data,
 # and use that information to somehow change these imports
 def is_sim_child():
@@ -23,6 +28,7 @@ def is_sim_child():
     frame               = inspect.currentframe()
     parent_frames       = inspect.getouterframes(frame)
     sim_file_filename   = 'mission_replay.py'
+    sim_file_filenames  = SIM_FILENAMES
     base_pathname       = os.path.dirname(__file__)
     sim_rel_pathname    = '../tools/mission replay'
     sim_file_fileloc    = os.path.join(base_pathname, sim_rel_pathname,sim_file_filename)
@@ -39,8 +45,8 @@ def is_sim_child():
 
     for parent_frame in parent_frames:
         frame_obj = parent_frame[0]
-        frame_name = parent_frame[1]
-        if sim_file_filename == frame_name:
+        frame_name = os.path.basename(parent_frame[1])
+        if frame_name in sim_file_filenames:
             return (True, frame_obj)
 
         else:
@@ -63,8 +69,13 @@ import locate_pinger
 import numpy as np
 import quickplot2
 import get_heading
+import beamformer
+import bearing_tracker
+import triangulation
 
 from environment import hydrophones
+from environment import bearing_lut
+from environment import steering
 from environment.tools3d import Environment
 from environment import source
 
@@ -72,6 +83,7 @@ from os import path
 LOG_DIR = path.join(path.dirname(path.realpath(__file__)), "saved_data/")
 PINGER_FINDER_DIR = path.dirname(path.realpath(__file__))
 BASE_DIR = path.dirname(path.dirname(path.realpath(__file__)))
+LUT_DIR = path.join(LOG_DIR, "bearing_lut")
 
 
 # ##############################################
@@ -182,6 +194,14 @@ class Acoustics():
         # Initialize Data buffer
         self.data_buffer = (None, None, None, None)
 
+        # Bearing track over all measurements (see get_last_measurement)
+        self.tracker = bearing_tracker.Bearing_Tracker()
+
+        # Pinger position from bearings at the robot positions reported by
+        # update_pose (see get_pinger_position)
+        self.triangulator = triangulation.Pinger_Triangulator()
+        self.position = None
+
         # Initialize pinger frequency via config file
         self.pinger_freq = config.getfloat('Acoustics', 'pinger_frequency')
 
@@ -204,6 +224,16 @@ class Acoustics():
         self.valid_signal_flg = ''
         self.fig = None
 
+        # Max number of captures get_data() may take looking for the pinger
+        # (None = keep trying until the watchdog timer expires)
+        self.max_captures = None
+
+        # Bearing lookup table (see get_bearing_lut)
+        self.bearing_lut = None
+
+        # Beamformer (see get_beamformer)
+        self.beamformer = None
+
         # Init logging class
         self.logger = Logging()
 
@@ -231,6 +261,7 @@ class Acoustics():
         loop_counter = 0
         watchdog_timer = 0 # seconds 
         capture_flg = False
+        n_captures = 0
         
         # adjust sampling parameters (condition) if a sample captures has been
         # previously performed. Otherwise, just perform a sample capture.
@@ -244,7 +275,14 @@ class Acoustics():
                 next_state='sample_capture'  
             
             elif next_state == 'sample_capture':
+                if self.max_captures is not None and n_captures >= self.max_captures:
+                    # Out of attempts. data is void.
+                    y = None
+                    next_state = 'exit'
+                    continue
+
                 y = self.adc.get_data()
+                n_captures += 1
                 
                 if self.adc.TOF == 1:
                     # Signal was not strong enough to pass trigger. increase
@@ -419,26 +457,61 @@ class Acoustics():
                                                                   self.array,
                                                                   env.c)
 
-            # Get direction
+            # Get direction. Only the pairs that get reported are computed.
+            n = self.array.n_elements
+            if n == 2:
+                pairs = [idx_pair_ab]
+            elif n == 4:
+                pairs = [idx_pair_ab, idx_pair_cd]
+            else:
+                pairs = None
+
             toa_dists = tdoa_times * env.c
-            info_string = self.array.get_direction(toa_dists)
+            info_string = self.array.get_direction(toa_dists, pairs=pairs)
 
             # Report angles if applicable
             if ang_ret:
                 angles = [(-math.atan2(b, a) * 180 / math.pi + 90) for (a, b) in self.array.ab]
 
-                n = self.array.n_elements
                 if n == 2:
-                    return {'ab': angles[idx_pair_ab], 'cd': None}
+                    return {'ab': angles[0], 'cd': None}
 
                 elif n == 3:
-                    return {'ra': angles[0],
-                            'rb': angles[1],
-                            'ab': angles[2]
+                    return {'ra': angles[idx_tri_ra],
+                            'rb': angles[idx_tri_rb],
+                            'ab': angles[idx_tri_ab]
                             }
                             
                 elif n == 4:
-                    return {'ab': angles[idx_pair_ab], 'cd': angles[idx_pair_cd]}
+                    result = {'ab': angles[0], 'cd': angles[1]}
+
+                    # Full 3D bearing from every pair. compute_relative_delay_times
+                    # reports how far each element leads element 0, which is
+                    # minus its distance of arrival.
+                    method = self.get_direction_method()
+                    if method == 'ml':
+                        phasors = get_heading.get_phasors(self.adc, self.pinger_freq, n)
+                        (u, az, el, quality, ambiguity) = steering.search(phasors, self.array,
+                                                                          self.pinger_freq, env.c)
+                        result['quality'] = float(quality)
+                        result['ambiguity'] = float(ambiguity)
+                    elif method in beamformer.METHODS:
+                        bf = self.get_beamformer()
+                        (u, az, el, quality, ambiguity) = bf.process_adc(self.adc, method)
+                        result['quality'] = float(quality)
+                        result['ambiguity'] = float(ambiguity)
+                        result['timing'] = dict(bf.timing)
+                    else:
+                        if method == 'lut':
+                            phases = 2 * np.pi * self.pinger_freq / env.c * (toa_dists[1:] - toa_dists[0])
+                            (u, az, el, residual) = self.get_bearing_lut().lookup(phases)
+                        else:
+                            (u, az, el, residual) = self.array.compute_bearing(-toa_dists)
+                        result['residual'] = float(residual)
+                    result['az'] = float(az)
+                    result['el'] = float(el)
+
+                    return result
                 else:
                     raise IOError('%d hydrophone elements was not expected' % n)
         else:
@@ -466,6 +539,10 @@ class Acoustics():
         # time) to get data
         result = self.compute_pinger_direction3(ang_ret=True)
 
+        # Skip frames whose measurements don't agree on a bearing
+        if result != None and not self.check_bearing(result):
+            result = None
+
         # Use logic to decide whether or not to update data buffer
         update_occured = False
         if result == None:
@@ -479,6 +556,22 @@ class Acoustics():
             (dynamic_ss, raw_vpp) = self.compute_last_signal_strength()
             self.data_buffer = (result, time.time(),dynamic_ss,raw_vpp)
             update_occured = True
+
+            # Fuse it into the bearing track. Outliers are flagged, but
+            # don't move the track.
+            heading = bearing_tracker.measured_heading(result)
+            quality = result.get('quality', None)
+            epoch = self.data_buffer[1]
+            if not self.tracker.update(heading, quality, epoch):
+                result['outlier'] = True
+
+            # and into the position fix, if the robot says where it is.
+            # Elevation is taken as is, assuming the array is level.
+            elif self.position is not None:
+                self.triangulator.add_bearing(self.position,
+                                              self.tracker.get_yaw(epoch) + heading,
+                                              result.get('el', None),
+                                              self.tracker.measurement_std(quality))
             
             # Record data that says a ping was captured
             self.log_ready('sp')
@@ -486,6 +579,81 @@ class Acoustics():
 
         return update_occured
 
+    def get_direction_method(self):
+        """Returns how the 3D bearing gets computed, per the optional
+        Acoustics/direction_method setting: 'least_squares' (closed form,
+        the default), 'lut' (see get_bearing_lut), 'ml' (grid search over
+        the phasors of every element, see steering.search), or 'das'/'mvdr'
+        (see beamformer.py).
+        """
+        if not config.has_option('Acoustics', 'direction_method'):
+            return 'least_squares'
+
+        method = config.get('Acoustics', 'direction_method')
+        if method not in ('least_squares', 'lut', 'ml') + beamformer.METHODS:
+            raise IOError("Unrecognized direction method (%s)." % method)
+
+        return method
+
+    def get_bearing_lut(self):
+        """Returns the bearing lookup table for the current array geometry,
+        pinger frequency and speed of sound. Tables are saved under LUT_DIR,
+        so a new combination is only ever built once.
+        """
+        if (self.bearing_lut is None) or not self.bearing_lut.matches(self.array, self.pinger_freq, env.c):
+            self.bearing_lut = bearing_lut.Bearing_LUT(self.array, self.pinger_freq, env.c)
+            self.bearing_lut.load_or_build(LUT_DIR)
+
+        return self.bearing_lut
+
+    def get_beamformer(self):
+        """Returns the beamformer for the current array, pinger frequency
+        and speed of sound."""
+        if (self.beamformer is None) or not self.beamformer.matches(self.array, self.pinger_freq, env.c):
+            self.beamformer = beamformer.Beamformer(self.array, self.pinger_freq, env.c)
+
+        return self.beamformer
+
+    def check_bearing(self, result):
+        """Returns False if the bearing fit's residual (meters) exceeds the
+        optional Acoustics/max_bearing_residual setting, its quality (see
+        steering.search) is under the optional Acoustics/min_bearing_quality
+        setting, or its ambiguity (see steering.get_ambiguity) is over the
+        Acoustics/max_bearing_ambiguity setting (steering.MAX_AMBIGUITY if
+        not set). Checks that are missing a setting, or a value in the
+        result, always pass.
+        """
+        residual = result.get('residual', None)
+        if residual is not None and config.has_option('Acoustics', 'max_bearing_residual'):
+            max_residual = config.getfloat('Acoustics', 'max_bearing_residual')
+            if residual > max_residual:
+                print("acoustics.py: Bearing residual of %.2fmm is above %.2fmm. "
+                      % (residual * 1000, max_residual * 1000) + "Skipping this frame.")
+                return False
+
+        quality = result.get('quality', None)
+        if quality is not None and config.has_option('Acoustics', 'min_bearing_quality'):
+            min_quality = config.getfloat('Acoustics', 'min_bearing_quality')
+            if quality < min_quality:
+                print("acoustics.py: Bearing quality of %.3f is under %.3f. "
+                      % (quality, min_quality) + "Skipping this frame.")
+                return False
+
+        # A grating lobe fits as well as the peak, so the bearing may be
+        # the wrong one however good its quality
+        ambiguity = result.get('ambiguity', None)
+        if ambiguity is not None:
+            if config.has_option('Acoustics', 'max_bearing_ambiguity'):
+                max_ambiguity = config.getfloat('Acoustics', 'max_bearing_ambiguity')
+            else:
+                max_ambiguity = steering.MAX_AMBIGUITY
+            if ambiguity > max_ambiguity:
+                print("acoustics.py: Bearing ambiguity of %.3f is over %.3f. "
+                      % (ambiguity, max_ambiguity) + "Skipping this frame.")
+                return False
+
+        return True
+
     def compute_last_signal_strength(self):
         # initial parameters
         full_scale_range = 5.0 #volts
@@ -502,7 +670,36 @@ class Acoustics():
         
     
     def get_last_measurement(self):
-        return self.data_buffer
+        """Returns (result, epoch, dynamic_ss, raw_vpp) of the last capture
+        that had a ping in it. result also carries the tracked 'heading'
+        (deg, clockwise like 'az') at the time of the call, and its
+        'heading_std' (see bearing_tracker.py).
+        """
+        (result, epoch, dynamic_ss, raw_vpp) = self.data_buffer
+        if result is not None:
+            result = dict(result)
+            (result['heading'], result['heading_std']) = self.tracker.get_heading()
+
+        return (result, epoch, dynamic_ss, raw_vpp)
+
+    def update_yaw(self, yaw, yaw_rate=0.0):
+        """Reports the robot's yaw (deg, clockwise) and yaw rate (deg/sec)
+        to the bearing tracker, which then keeps the served heading right
+        while the robot turns."""
+        self.tracker.update_yaw(yaw, yaw_rate)
+
+    def update_pose(self, position, yaw, yaw_rate=0.0):
+        """Reports the robot's position (x, y, z in meters, any fixed world
+        frame) along with its yaw (see update_yaw). Bearings measured from
+        then on also go towards locating the pinger."""
+        self.position = np.array(position, dtype=float)
+        self.update_yaw(yaw, yaw_rate)
+
+    def get_pinger_position(self):
+        """Returns (position, covariance) of the pinger in the frame of
+        update_pose (see triangulation.py), or (None, None) if the bearings
+        so far can't locate it."""
+        return self.triangulator.get_position()
 
     def calibrate(self):
         cal_data = config.get(acoustics, 'cal_data')
@@ -692,13 +889,25 @@ class Acoustics():
         """
         return config
     def _refresh_pinger_freq(self):
-        self.pinger_freq = config.getfloat('Acoustics','pinger_frequency')
+        freq = config.getfloat('Acoustics','pinger_frequency')
+
+        # A new frequency means a different pinger: its bearing has
+        # nothing to do with the current track
+        if freq != self.pinger_freq:
+            self.tracker.reset()
+            self.triangulator.reset()
+        self.pinger_freq = freq
 
     def refresh_config(self):
         config.read(BASE_DIR + '/config.ini')
         self._refresh_array_spacing()
         self._refresh_pinger_freq()
 
+        # Have the lookup table follow spacing/frequency changes now, rather
+        # than in the middle of the next measurement
+        if self.get_direction_method() == 'lut' and self.array.n_elements > 2:
+            self.get_bearing_lut()
+
 # ##################################
 #### Logging Tool ##################
 ####################################
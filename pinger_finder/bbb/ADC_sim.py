@@ -1,4 +1,5 @@
 
+import time
 import numpy as np
 
 ## simply copy and paste the global variable section of ADC.py,
@@ -35,6 +36,12 @@ TFLG1_BIT = 5
 
 CONV_RATE_LIMIT = 800e3  # Hertz
 
+# Firmware constants (see pru/pingerFinderLib.h)
+DEFAULT_TO_TIME = 0x3B9ACA00  # PRU cycles before a timeout
+DB_LIMIT_MASK = 0xFFFF  # the deadband limit register is 16 bits wide
+SUPER_SAMPLES = 4  # length of the PRU's super sample counter
+STREAM_CHUNK = 2**16  # samples scanned at a time while waiting on a trigger
+
 PLUSMINUS = u'\xb1'.encode('utf-8')
 DIFF_PAIR_1 = "CHA0" + PLUSMINUS
 DIFF_PAIR_2 = "CHA1" + PLUSMINUS
@@ -47,6 +54,44 @@ CODE_READSEQ = 0x106
 CODE_WRITEDAC = 0x101
 
 # Global Functions
+def find_trigger(above, db_limit, counter, dbovf):
+    """Runs the PRU's trigger logic (PROCESS block of ADS7865_sample.p)
+    over a chunk of samples. Each sample below threshold increments the
+    deadband counter. A sample above threshold triggers if the counter has
+    ever reached db_limit (DBOVF, which is sticky), and otherwise zeroes
+    the counter.
+
+    ARGS:
+        * above: bool array, |sample| >= threshold.
+        * db_limit: deadband limit (samples).
+        * counter, dbovf: deadband counter and DBOVF bit carried over from
+        the previous chunk.
+
+    Returns (index of the triggering sample or None, counter, dbovf).
+    """
+    n = above.size
+    idx = np.arange(n)
+
+    # run[k]: consecutive samples below threshold, up to and including k
+    last_above = np.maximum.accumulate(np.where(above, idx, -1))
+    run = idx - last_above
+    run[last_above < 0] += counter
+    before = np.concatenate(([counter], run[:-1]))  # counter before sample k
+
+    if not dbovf:
+        sets = (~above & (before + 1 >= db_limit)) | (above & (before >= db_limit))
+        first_set = np.argmax(sets) if np.any(sets) else n
+        dbovf = first_set < n
+    else:
+        first_set = 0
+
+    hits = np.nonzero(above[first_set:])[0]
+    if dbovf and hits.size:
+        return (first_set + hits[0], 0, True)
+
+    return (None, int(run[-1]) if n else counter, dbovf)
+
+
 
 
 class ADS7865(object):
@@ -158,10 +203,67 @@ class ADS7865(object):
         self.y = None
         self.y = None
 
+        # Synthetic data sources (see sim_load_frames, sim_attach and
+        # sim_load_stream)
+        self.frames = []
+        self.generator = None
+        self.stream = None
+        self.stream_filt = None
+        self.stream_loop = False
+        self.stream_channels = 0
+        self.stream_pos = 0
+
+        # Time cost of the emulated bursts
+        self.burst_time = 0  # sec. last burst
+        self.sim_clock = 0  # sec. all bursts
+        self.sim_realtime = False  # sleep for the duration of each burst
+        self.DBOVF = None
+
 
     def sim_load_data(self, input_data):
         self.y = input_data
 
+    def sim_load_frames(self, frames):
+        """Queues a batch of captures, eg. from
+        environment.acousimtools.Capture_Generator.generate(). Each call to
+        get_data() consumes the next frame.
+        """
+        self.frames.extend(list(frame) for frame in frames)
+
+    def sim_load_stream(self, stream, filt=None, loop=False):
+        """Loads a continuous recording of the ADC's inputs, eg. from
+        environment.acousimtools.Capture_Generator.stream() or recorded
+        pings stitched together. get_data() then emulates the PRU firmware
+        on it: waiting on the threshold and deadband, timing out, and
+        recording sample_length samples after the trigger.
+
+        ARGS:
+            * stream: n_channels arrays of volts, sampled at sample_rate.
+            * filt: LTC1564 (sim) whose filter response (in its current
+            mode, applied once here) and gain (applied as samples are read,
+            so gain changes take effect) are applied to the stream. The
+            stream is taken as is if None.
+            * loop: Whether to wrap around at the end of the stream.
+            Otherwise, running out of data raises an IOError.
+        """
+        stream = np.asarray(stream, dtype=float)
+        if hasattr(filt, 'filter'):
+            stream = filt.filter(stream, self.sample_rate)
+
+        # interleave the channels the way the ADC hands them to the PRU
+        self.stream = stream.T.ravel()
+        self.stream_channels = stream.shape[0]
+        self.stream_filt = filt
+        self.stream_loop = loop
+        self.stream_pos = 0
+
+    def sim_attach(self, generator):
+        """Attaches a Capture_Generator. Once the queued frames run out,
+        get_data() generates a fresh capture with the current gain and
+        sampling settings. Pass None to detach.
+        """
+        self.generator = generator
+
     ############################
     #### GPIO Commands  #######
     ############################
@@ -558,13 +660,127 @@ class ADS7865(object):
     ############################
     #### PRUSS Commands  #######
     ############################
+    def _read_stream(self, start, n):
+        """Returns n interleaved samples of the stream, starting at start,
+        as 12 bit codes."""
+        idx = np.arange(start, start + n)
+        if self.stream_loop:
+            v = np.take(self.stream, idx, mode='wrap')
+        elif start + n > self.stream.size:
+            raise IOError("ADS7865: the simulated input stream ran out of samples.")
+        else:
+            v = self.stream[start:start + n]
+
+        if hasattr(self.stream_filt, 'amplify'):
+            v = self.stream_filt.amplify(v)
+        elif self.stream_filt is not None:
+            v = v * (self.stream_filt.Gval + 1)
+
+        code = np.round(v / self.lsb)
+        return np.clip(code, -2**(WORD_SIZE - 1), 2**(WORD_SIZE - 1) - 1)
+
+    def burst(self, length=None, n_channels=None, raw=None, fmt_volts=1):
+        """Emulates ADS7865_sample.p on the stream loaded with
+        sim_load_stream(). See ADC.py's burst() for ARGS. Returns (y, TOF).
+        """
+        if length is None:  # Optional argument for sample length
+            length = self.sample_length
+        else:
+            self.sample_length = int(length)
+
+        if n_channels is None:
+            n_channels = self.n_channels
+        else:
+            self.n_channels = n_channels
+
+        if self.stream_channels != n_channels:
+            raise IOError("ADS7865: stream has %d channels, but the ADC is "
+                          % self.stream_channels
+                          + "configured for %d." % n_channels)
+
+        # Firmware parameters, as burst() hands them to the PRU
+        rate = self.sample_rate * n_channels  # interleaved samples/sec
+        db_limit = int(round(self.deadband_ms / 1000.0 * F_CLK * 2.0)) & DB_LIMIT_MASK
+        thr = int(round(self.corrected_threshold / self.lsb))
+        timeout = int(DEFAULT_TO_TIME / F_CLK * rate)  # samples
+
+        # Every burst restarts the super sample counter on channel 0
+        start = -(-self.stream_pos // n_channels) * n_channels
+
+        # Wait for a trigger, or time out
+        trg = None
+        counter = 0
+        dbovf = False
+        k = 0
+        while trg is None and k < timeout:
+            n = min(STREAM_CHUNK, timeout - k)
+            above = np.abs(self._read_stream(start + k, n)) >= thr
+            (hit, counter, dbovf) = find_trigger(above, db_limit, counter, dbovf)
+            if hit is not None:
+                trg = k + hit
+            k += n
+
+        TOF = trg is None
+        if TOF:
+            trg = timeout
+            self.TRG_CH = 0
+        else:
+            super_sample = trg % SUPER_SAMPLES
+            self.TRG_CH = super_sample & 1
+            if n_channels != 2:
+                self.TRG_CH += 2 * (super_sample >> 1)
+        self.TOF = TOF
+        self.DBOVF = dbovf
+
+        # Recording arms on the next super sample 0, then collects one
+        # block less than SL (the status block), and the PRU writes a 0 at
+        # the end.
+        arm = -(-trg // SUPER_SAMPLES) * SUPER_SAMPLES
+        raw_data = np.append(self._read_stream(start + arm, length - 1), 0)
+        end = arm + length - 1
+        self.stream_pos = start + end
+
+        # Time cost
+        self.burst_time = end / float(rate)
+        self.sim_clock += self.burst_time
+        if self.sim_realtime:
+            time.sleep(self.burst_time)
+
+        y_orig = [0] * n_channels
+        y = [0] * n_channels
+        for chan in range(n_channels):
+            y[chan] = raw_data[chan::n_channels]
+
+            if fmt_volts and not raw:
+                y_orig[chan] = y[chan] * self.lsb
+                y[chan] = y_orig[chan] * self.digital_gain
+
+        # Storing collected samples internally
+        self.y = y
+        self.y_orig = y_orig
+
+        return (y, TOF)
+
     def get_data(self):
         """Simplifies the process of getting data when it's requested. This
         method will typically replace any use of "self.burst()" and deciding
         whether or not you have to arm the ADC or not.
         """
 
+        if self.stream is not None:
+            y, TOF = self.burst()
+
+            if TOF == False:
+                return y
+            else:
+                return None
+
         #y, TOF = self.burst()
+        if self.frames:
+            self.y = self.frames.pop(0)
+        elif self.generator is not None:
+            self.y = self.generator.burst(self)
+
         self.TOF    = False
         self.TRG_CH = 0
         y           = self.y
@@ -1,3 +1,11 @@
+import numpy as np
+
+try:
+    from scipy.signal import ellip, sosfilt
+except ImportError:
+    print("WARNING: scipy.signal unavailable. LTC1564 sim will apply gain only, without its filter response")
+    ellip = None
+
 CS_PIN = ''
 F_PINS = ['P9_18', 'P9_17', 'P9_16', 'P9_15'] # [lsb,...,msb]
 G_PINS = ['P9_14','P9_13','P9_12','P9_11'] # [lsb,...,msb]
@@ -6,6 +14,16 @@ DEFAULT_F = 0
 DEFAULT_G = 0
 DEFAULT_CS = 1
 
+# Filter response (LTC1564 datasheet): 8th order elliptic lowpass,
+# fc = F * 10kHz. F = 0 shuts the filter down (no output).
+FC_STEP = 10e3  # Hz
+FILT_ORDER = 8
+PASSBAND_RIPPLE = 0.1  # dB
+STOPBAND_ATTEN = 100  # dB
+MAX_FC_RATIO = 0.45  # fc above this fraction of fs can't be modelled; bypassed
+OUTPUT_SWING = 2.45  # volts, about mid supply
+DEFAULT_FC_TOLERANCE = 0.01  # per channel fc error (1 sigma), from the RC parts
+
 class LTC1564(object):
     def __init__(self):
 
@@ -17,6 +35,13 @@ class LTC1564(object):
 
         # Metadata attributes
 
+        # Response emulation. Each channel has its own filter chip, so each
+        # gets its own fc error, drawn once.
+        self.fc_tolerance = DEFAULT_FC_TOLERANCE
+        self.fc_error = np.zeros(0)
+        self.rng = np.random.RandomState()
+        self.sos_cache = {}
+
     def gain_mode(self, mode=None):
         """ Configures gain of the input stage.
 
@@ -71,4 +96,67 @@ class LTC1564(object):
         just remove the level shifters pins from the board whenever this
         subsystem is not in use
         """
-        pass
\ No newline at end of file
+        pass
+
+    ############################
+    #### Response emulation ####
+    ############################
+    def get_fc(self, mode=None):
+        """Returns the nominal cutoff frequency (Hz) of filter mode."""
+        if mode is None:
+            mode = self.Fval
+        return mode * FC_STEP
+
+    def get_fc_error(self, n_channels):
+        """Returns the relative fc error of each channel."""
+        while self.fc_error.size < n_channels:
+            self.fc_error = np.append(self.fc_error, self.rng.randn() * self.fc_tolerance)
+        return self.fc_error[:n_channels]
+
+    def get_sos(self, fs, n_channels):
+        """Returns a list holding the second order sections of each
+        channel's filter for the current mode at sample rate fs. None marks
+        a channel whose fc is too close to Nyquist to model (bypassed).
+        Coefficients are cached per mode and sample rate.
+        """
+        key = (self.Fval, float(fs), n_channels, self.fc_tolerance)
+        if key not in self.sos_cache:
+            sos = []
+            for err in self.get_fc_error(n_channels):
+                fc = self.get_fc() * (1 + err)
+                if ellip is None or fc >= MAX_FC_RATIO * fs:
+                    sos.append(None)
+                else:
+                    sos.append(ellip(FILT_ORDER, PASSBAND_RIPPLE, STOPBAND_ATTEN,
+                                     fc / (fs / 2.0), output='sos'))
+            self.sos_cache[key] = sos
+
+        return self.sos_cache[key]
+
+    def filter(self, y, fs):
+        """Applies the filter response of the current mode to y, an array
+        of shape (..., n_channels, n) sampled at fs. Every frame of a
+        channel is filtered in one call, starting from rest.
+        """
+        y = np.asarray(y, dtype=float)
+        if self.Fval == 0:
+            return np.zeros(y.shape)
+
+        out = np.empty(y.shape)
+        for (ch, sos) in enumerate(self.get_sos(fs, y.shape[-2])):
+            if sos is None:
+                out[..., ch, :] = y[..., ch, :]
+            else:
+                out[..., ch, :] = sosfilt(sos, y[..., ch, :], axis=-1)
+
+        return out
+
+    def amplify(self, y):
+        """Applies the gain of the current mode, and clips at the output
+        swing."""
+        return np.clip(np.asarray(y) * (self.Gval + 1), -OUTPUT_SWING, OUTPUT_SWING)
+
+    def apply(self, y, fs):
+        """Passes y through the LTC1564 (filter, then gain and clipping).
+        See filter() for ARGS."""
+        return self.amplify(self.filter(y, fs))
@@ -0,0 +1,199 @@
+"""Narrowband beamforming of ADS7865 captures.
+
+Each capture gets split into short blocks, and every block is reduced to
+one complex amplitude (snapshot) per channel at the pinger frequency. The
+snapshots are averaged into the array's spatial covariance matrix R, from
+which a power map over a grid of directions is formed:
+
+    * delay-and-sum (das): P = a^H R a / n^2. The power received by the
+    array steered towards each direction.
+    * mvdr (Capon): P = 1 / (a^H R^-1 a). The power left after passing
+    everything from that direction and suppressing everything else as much
+    as possible. Sharper peaks than das, and far less sensitive to noise
+    and reflections arriving from other directions.
+
+where a is the steering vector of each direction (see
+environment/steering.py, whose cache the coarse grid comes from). The peak
+of the map is then refined on finer local grids.
+
+Unlike the per-pair phase measurement of get_heading, every element and
+every block of the capture contributes to each direction's power.
+"""
+import time
+import numpy as np
+
+from environment import steering
+
+METHODS = ('das', 'mvdr')
+
+# Length of a snapshot block, in periods of the pinger frequency
+SNAPSHOT_CYCLES = 4
+
+# Diagonal loading of R for mvdr, as a fraction of the mean element power.
+# Keeps R invertible when there are few snapshots or one dominant source.
+LOADING = 1e-2
+
+
+class Beamformer(object):
+    """Delay-and-sum and MVDR beamformer over a direction grid.
+
+    Parameters:
+        * array: hydrophones.Array. Element n is on ADC channel n.
+        * freq: pinger frequency (Hz).
+        * c: speed of sound (m/s).
+        * step: spacing (degrees) of the coarse direction grid.
+        * levels: refinement levels of the peak (see steering.search).
+        * loading: diagonal loading for mvdr (see LOADING).
+
+    The time spent in each stage of the last call to process() is kept in
+    self.timing (seconds).
+    """
+
+    def __init__(self, array, freq, c, step=steering.COARSE_STEP, levels=steering.LEVELS,
+                 loading=LOADING):
+        self.array = array
+        self.freq = freq
+        self.c = c
+        self.step = step
+        self.levels = levels
+        self.loading = loading
+
+        self.timing = {}
+
+    def matches(self, array, freq, c):
+        return ((self.array is array) and (self.freq == freq) and (self.c == c))
+
+    # ####################################
+    # ### Stages #########################
+    # ####################################
+    def get_snapshots(self, frames, fs, skew=None):
+        """Returns the snapshots of frames, as an (n_frames, n_blocks,
+        n_elements) complex array.
+
+        ARGS:
+            * frames: (n_channels, n) samples of one capture (eg. adc.y),
+            or an (n_frames, n_channels, n) batch (eg. from
+            Capture_Generator.generate()).
+            * fs: sample rate (Hz).
+            * skew: sampling delay of each channel (sec), eg. adc.delay.
+        """
+        n_el = self.array.n_elements
+        frames = np.asarray(frames, dtype=float)
+        if frames.ndim == 2:
+            frames = frames[np.newaxis]
+        if frames.shape[1] < n_el:
+            raise ValueError("Beamformer: %d channels were captured, but the array has %d elements."
+                             % (frames.shape[1], n_el))
+
+        block = max(1, int(round(SNAPSHOT_CYCLES * fs / self.freq)))
+        n_blocks = max(1, frames.shape[2] // block)
+        block = min(block, frames.shape[2])
+        y = frames[:, 0:n_el, 0:n_blocks * block].reshape(frames.shape[0], n_el, n_blocks, block)
+
+        # Single DFT bin per block. Time is counted from the start of the
+        # capture, so the snapshots share one phase reference.
+        t = np.arange(n_blocks * block).reshape(n_blocks, block) / float(fs)
+        snapshots = np.einsum('febk,bk->fbe', y, np.exp(-2j * np.pi * self.freq * t))
+
+        if skew is not None:
+            skew = np.array([d or 0 for d in skew[0:n_el]], dtype=float)
+            snapshots *= np.exp(-2j * np.pi * self.freq * skew)
+
+        return snapshots
+
+    def get_covariance(self, snapshots):
+        """Returns the (n_frames, n_elements, n_elements) spatial covariance
+        of each frame's snapshots."""
+        return np.einsum('fbi,fbj->fij', snapshots, snapshots.conj()) / snapshots.shape[1]
+
+    def get_power(self, R, a, method):
+        """Returns the power of method towards each steering vector in a
+        (shape (n_directions, n_elements), shared by every frame, or
+        (n_frames, n_directions, n_elements)). R is the covariance, or its
+        loaded inverse for mvdr (see get_inverse)."""
+        if a.ndim == 2:
+            # one matrix product for the whole batch
+            quad = np.real(np.sum(a.T.conj() * np.dot(R, a.T), axis=1))
+        else:
+            quad = np.real(np.einsum('fdi,fij,fdj->fd', a.conj(), R, a))
+
+        if method == 'das':
+            return quad / self.array.n_elements**2
+        else:
+            return 1.0 / np.maximum(quad, 1e-300)
+
+    def get_inverse(self, R):
+        n_el = R.shape[-1]
+        power = np.real(np.trace(R, axis1=1, axis2=2)) / n_el
+        loaded = R + (self.loading * power)[:, np.newaxis, np.newaxis] * np.eye(n_el)
+
+        return np.linalg.inv(loaded)
+
+    # ####################################
+    # ### Pipeline #######################
+    # ####################################
+    def process(self, frames, fs, skew=None, method='mvdr'):
+        """Finds the direction of the pinger in each frame.
+
+        ARGS: see get_snapshots(), and
+            * method: 'das' or 'mvdr'.
+
+        Returns (u, az, el, quality, ambiguity), each with one entry per
+        frame, as in steering.search(). quality is the delay-and-sum power
+        towards u over the total power of the elements: 1 when all of it
+        arrives from u. ambiguity is that of the coarse delay-and-sum power
+        map (see steering.get_ambiguity), whatever the method.
+        """
+        if method not in METHODS:
+            raise ValueError("Beamformer: unknown method (%s)." % method)
+        self.timing = {}
+
+        start = time.time()
+        snapshots = self.get_snapshots(frames, fs, skew)
+        self.timing['snapshots'] = time.time() - start
+
+        start = time.time()
+        R = self.get_covariance(snapshots)
+        W = self.get_inverse(R) if method == 'mvdr' else R
+        self.timing['covariance'] = time.time() - start
+
+        # Coarse power map over the cached grid
+        start = time.time()
+        (az, el, A) = steering.get_steering(self.array, self.freq, self.c, self.step)
+        power = self.get_power(W, A, method)
+        best = np.argmax(power, axis=1)
+        (best_az, best_el) = (az[best], el[best])
+
+        # mvdr peaks are too sharp for the coarse grid to catch every
+        # alias, so ambiguity always comes from the smoother das map
+        if method != 'das':
+            power = self.get_power(R, A, 'das')
+        ambiguity = steering.get_ambiguity(power, az, el, best, self.array, self.freq, self.c)
+        self.timing['power_map'] = time.time() - start
+
+        # Refine the peak
+        start = time.time()
+        frames = np.arange(len(best))
+        rank = self.array.get_bearing_solver()[2]
+        for level in range(self.levels):
+            (az, el) = steering.local_grid(best_az, best_el, self.step / float(steering.REFINE)**level,
+                                           steering.REFINE, rank)
+            a = steering.steering_vectors(self.array.element_pos, steering.unit_vectors(az, el),
+                                          self.freq, self.c)
+            best = np.argmax(self.get_power(W, a, method), axis=1)
+            (best_az, best_el) = (az[frames, best], el[frames, best])
+
+        u = steering.fold(steering.unit_vectors(best_az, best_el), self.array)
+        (az, el) = steering.to_az_el(u)
+        a = steering.steering_vectors(self.array.element_pos, u, self.freq, self.c)
+        total = np.real(np.trace(R, axis1=1, axis2=2)) / self.array.n_elements
+        quality = self.get_power(R, a[:, np.newaxis], 'das')[:, 0] / np.maximum(total, 1e-300)
+        self.timing['refine'] = time.time() - start
+
+        return (u, az, el, quality, ambiguity)
+
+    def process_adc(self, adc, method='mvdr'):
+        """process() the last capture of an ADS7865. Returns single values."""
+        (u, az, el, quality, ambiguity) = self.process(adc.y, adc.sample_rate, adc.delay, method)
+
+        return (u[0], az[0], el[0], quality[0], ambiguity[0])
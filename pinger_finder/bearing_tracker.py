@@ -0,0 +1,168 @@
+"""Tracks the bearing to the pinger across measurements.
+
+A single capture gives a noisy bearing, and now and then a wild one (a
+reflection, a ping clipped by the trigger, ...). Bearing_Tracker fuses the
+stream of measurements with a Kalman filter, so the heading that gets
+served is smoothed, comes with an uncertainty, and isn't thrown around by
+a single outlier.
+
+The filter tracks the bearing in the world frame: measurements are relative
+to the robot, so the robot's yaw (if it gets reported, see update_yaw) is
+added to them on the way in and subtracted again on the way out. Turning
+the robot then doesn't disturb the estimate, and between pings the served
+heading follows the reported yaw rate. Without yaw updates, the yaw stays
+at 0 and the filter simply smooths the relative bearing.
+
+All angles are in degrees, clockwise (from the array's y axis towards its x
+axis, and likewise for the robot's yaw), as the 'az' of Acoustics results.
+Note that 'ab' is counterclockwise: see measured_heading.
+"""
+import math
+import time
+
+# How fast the bearing is expected to wander, as the std (deg) of its
+# random walk after one second. Covers the robot's own motion when no yaw
+# gets reported.
+PROCESS_STD = 5.0
+
+# Std (deg) of a measurement of quality 1 (see measurement_std)
+MEAS_STD = 3.0
+
+# Measurements further than GATE standard deviations from the prediction are
+# rejected as outliers. After MAX_REJECTS of them in a row, the track is
+# assumed lost and restarts on the next measurement.
+GATE = 3.0
+MAX_REJECTS = 3
+
+
+def wrap_angle(angle):
+    """Wraps an angle (deg) into [-180, 180)."""
+    return (angle + 180.0) % 360.0 - 180.0
+
+
+def measured_heading(result):
+    """Clockwise heading (deg) of an Acoustics result: its 'az', or minus
+    its 'ab' if it has no 'az' ('ab' is counterclockwise)."""
+    if 'az' in result:
+        return result['az']
+
+    return -result['ab']
+
+
+class Bearing_Tracker(object):
+    """Kalman filter over the world frame bearing (deg) of the pinger. See
+    the module docstring.
+
+    Parameters: see the module level constants of the same name.
+    """
+
+    def __init__(self, process_std=PROCESS_STD, meas_std=MEAS_STD, gate=GATE,
+                 max_rejects=MAX_REJECTS):
+        self.process_std = process_std
+        self.meas_std = meas_std
+        self.gate = gate
+        self.max_rejects = max_rejects
+
+        self.reset()
+
+        # Robot yaw (see update_yaw)
+        self.yaw = 0.0
+        self.yaw_rate = 0.0
+        self.yaw_time = None
+
+    def reset(self):
+        """Drops the track. Keeps the robot's yaw."""
+        self.bearing = None  # deg, world frame
+        self.var = None  # deg**2
+        self.time = None
+        self.n_rejected = 0
+
+    def is_tracking(self):
+        return self.bearing is not None
+
+    # ####################################
+    # ### Inputs #########################
+    # ####################################
+    def update_yaw(self, yaw, yaw_rate=0.0, t=None):
+        """Reports the robot's yaw (deg, clockwise) and yaw rate (deg/sec)
+        at time t (defaults to now)."""
+        self.yaw = float(yaw)
+        self.yaw_rate = float(yaw_rate)
+        self.yaw_time = time.time() if t is None else t
+
+    def get_yaw(self, t):
+        """Robot yaw at time t, extrapolated from the last update."""
+        if self.yaw_time is None:
+            return self.yaw
+
+        return self.yaw + self.yaw_rate * (t - self.yaw_time)
+
+    def measurement_std(self, quality=None):
+        """Std (deg) of a measurement. Scales MEAS_STD up as the quality
+        score of the measurement (see steering.search) goes down."""
+        if quality is None:
+            return self.meas_std
+
+        return self.meas_std / max(quality, 1e-3)
+
+    def predict(self, t):
+        """Moves the track forward to time t."""
+        if t > self.time:
+            self.var += self.process_std**2 * (t - self.time)
+            self.time = t
+
+    def update(self, heading, quality=None, t=None):
+        """Fuses a measured heading (deg, relative to the robot) taken at
+        time t (defaults to now). Returns False if it was rejected as an
+        outlier.
+        """
+        if t is None:
+            t = time.time()
+        bearing = wrap_angle(heading + self.get_yaw(t))
+        meas_var = self.measurement_std(quality)**2
+
+        # Start a new track
+        if not self.is_tracking():
+            self.bearing = bearing
+            self.var = meas_var
+            self.time = t
+            self.n_rejected = 0
+            return True
+
+        self.predict(t)
+        innovation = wrap_angle(bearing - self.bearing)
+        innovation_var = self.var + meas_var
+
+        # Outlier gating
+        if innovation**2 > self.gate**2 * innovation_var:
+            self.n_rejected += 1
+            if self.n_rejected >= self.max_rejects:
+                print("bearing_tracker: %d measurements in a row disagree with the track. "
+                      % self.n_rejected + "Restarting it.")
+                self.reset()
+            return False
+
+        gain = self.var / innovation_var
+        self.bearing = wrap_angle(self.bearing + gain * innovation)
+        self.var = (1 - gain) * self.var
+        self.n_rejected = 0
+
+        return True
+
+    # ####################################
+    # ### Output #########################
+    # ####################################
+    def get_heading(self, t=None):
+        """Returns (heading, std) in degrees: the tracked heading of the
+        pinger relative to the robot at time t (defaults to now), and its
+        uncertainty. Returns (None, None) if there's no track yet.
+        """
+        if not self.is_tracking():
+            return (None, None)
+        if t is None:
+            t = time.time()
+
+        var = self.var + self.process_std**2 * max(t - self.time, 0)
+        heading = wrap_angle(self.bearing - self.get_yaw(t))
+
+        return (heading, math.sqrt(var))
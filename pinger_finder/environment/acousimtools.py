@@ -0,0 +1,247 @@
+import numpy as np
+
+from tools3d import Environment, rotation_matrices
+
+# ADS7865 constants (see bbb/ADC.py)
+WORD_SIZE = 12
+DEFAULT_DAC_VOLTAGE = 2.49612  # volts
+
+
+class Capture_Generator(object):
+    """Generates synthetic captures of a pinger as seen by the hydrophone
+    array, in the exact format ADS7865.burst() produces: a list of
+    n_channels arrays of sample_length volts each, 12-bit quantized and
+    scaled by the LTC1564 and digital gain.
+
+    Hydrophone element n is wired to ADC channel n. Channel skew between
+    the two sample pairs (adc.delay) is applied, and the first arrival
+    lines up with the start of the capture (as if the ADC had just
+    triggered on it).
+
+    ARGS:
+        * array: hydrophones.Array. Its position (and optionally
+        rotation, see generate()) places the elements in the world.
+        * pinger: tools3d.Phys_Obj (eg. source.Pinger).
+        * filt: LTC1564 (sim) whose filter and gain modes are applied.
+        Assumes a unity gain, flat response if None.
+        * env: tools3d.Environment, for the speed of sound. Defaults to
+        Environment().
+        * seed: seed of the noise generator, for repeatable captures.
+
+    Attributes that can be tuned after construction:
+        * freq: pinger frequency (Hz).
+        * ping_length: duration of the ping (sec).
+        * onset: arrival time (sec) of the ping at the closest element.
+        * source_level: signal amplitude (volts) at the hydrophones for a
+        pinger 1m away. Decays as 1/r.
+        * snr_db: signal to noise ratio at the closest element, in dB.
+        * quantize: Whether to round samples to the ADC's 12bit codes.
+        * pool: pool.Pool for multipath. World coordinates are taken to
+        be pool coordinates. Direct path only if None.
+    """
+
+    def __init__(self, array, pinger, filt=None, env=None, seed=None):
+        self.array = array
+        self.pinger = pinger
+        self.filt = filt
+
+        if env is None:
+            env = Environment()
+        self.c = env.c
+
+        self.freq = 22e3  # Hz
+        self.ping_length = 4e-3  # sec
+        self.onset = 0  # sec. arrival time of the ping at the closest element
+        self.source_level = 0.5  # volts @ 1m
+        self.snr_db = 30.0
+        self.quantize = True
+        self.pool = None
+
+        self.rng = np.random.RandomState(seed)
+
+    # ####################################
+    # ### Geometry #######################
+    # ####################################
+    def element_positions(self, array_pos=None, array_rot=None):
+        """Returns the world coordinates of each hydrophone element as an
+        (n_frames, n_elements, 3) array.
+
+        ARGS:
+            * array_pos: (n_frames, 3) array positions. Defaults to
+            self.array.position.
+            * array_rot: (n_frames, 3) rotations (x, y, z) in radians.
+            Defaults to no rotation.
+        """
+        if array_pos is None:
+            array_pos = self.array.position
+        array_pos = np.atleast_2d(array_pos)
+
+        elements = self.array.element_pos  # (n_elements, 3)
+        if array_rot is None:
+            rotated = elements[np.newaxis]
+        else:
+            R = rotation_matrices(array_rot)
+            rotated = np.einsum('nij,ej->nei', R, elements)
+
+        return array_pos[:, np.newaxis, :] + rotated
+
+    def propagate(self, pinger_pos, elem_pos):
+        """Returns the (distance, gain) of every propagation path from the
+        pinger to each element, both shaped (n_frames, n_paths,
+        n_elements). The direct path comes first.
+        """
+        if self.pool is not None:
+            return self.pool.paths(pinger_pos, elem_pos)
+
+        dist = np.linalg.norm(elem_pos - pinger_pos[:, np.newaxis, :], axis=2)
+        gain = 1.0 / np.maximum(dist, 1.0)
+
+        return (dist[:, np.newaxis, :], gain[:, np.newaxis, :])
+
+    # ####################################
+    # ### Signal generation ##############
+    # ####################################
+    def generate(self, adc, n_frames=1, pinger_pos=None, array_pos=None, array_rot=None):
+        """Generates a batch of captures with the current adc and filt
+        settings. Returns an (n_frames, n_channels, n) array of volts, where
+        n = sample_length / n_channels (sample_length counts the samples of
+        all channels, as in burst()). Use list(frames[i]) to get the burst()
+        layout.
+
+        ARGS:
+            * adc: ADS7865 (sim). Supplies sample_rate, sample_length,
+            n_channels, delay, lsb and digital_gain.
+            * n_frames: number of frames. Ignored if any of the poses are
+            given per frame.
+            * pinger_pos, array_pos, array_rot: (n_frames, 3) poses.
+            Default to the poses of self.pinger and self.array.
+        """
+        n_samples = adc.sample_length // adc.n_channels
+        (y, noise_rms) = self.synthesize(adc, n_samples, n_frames, pinger_pos, array_pos, array_rot)
+
+        return self.digitize(y, adc)
+
+    def stream(self, adc, duration, interval=2.0, pinger_pos=None, array_pos=None, array_rot=None):
+        """Generates a continuous recording of the analog inputs of the ADC
+        (before the LTC1564 gain), with a ping every interval seconds. Meant
+        for ADS7865.sim_load_stream(). Returns an (n_channels, n) array of
+        volts.
+
+        ARGS:
+            * adc: ADS7865 (sim). Supplies sample_rate, n_channels and delay.
+            * duration: length of the recording (sec).
+            * interval: time between pings (sec). The first ping arrives
+            at self.onset.
+            * pinger_pos, array_pos, array_rot: pose of each ping, as in
+            generate(). A single pose is used for every ping.
+        """
+        fs = float(adc.sample_rate)
+        n_total = int(duration * fs)
+        starts = np.arange(self.onset, duration, interval)
+        n_pings = starts.size
+
+        # Each ping lasts for ping_length plus the spread of its arrivals
+        (pinger_pos, elem_pos) = self.get_poses(n_pings, pinger_pos, array_pos, array_rot)
+        dist = self.propagate(pinger_pos, elem_pos)[0]
+        spread = np.max(dist.max(axis=(1, 2)) - dist.min(axis=(1, 2))) / self.c
+        n_ping = int(np.ceil((self.ping_length + spread) * fs)) + 1
+
+        # Synthesize the pings noise free, then drop them into the record
+        onset = self.onset
+        self.onset = 0
+        try:
+            (pings, noise_rms) = self.synthesize(adc, n_ping, n_pings, pinger_pos, elem_pos=elem_pos,
+                                                 noise=False)
+        finally:
+            self.onset = onset
+
+        y = self.rng.randn(adc.n_channels, n_total) * np.mean(noise_rms)
+        for (i, t0) in enumerate(starts):
+            m = int(round(t0 * fs))
+            n = min(n_ping, n_total - m)
+            y[:, m:m + n] += pings[i, :, :n]
+
+        return y
+
+    def get_poses(self, n_frames=1, pinger_pos=None, array_pos=None, array_rot=None, elem_pos=None):
+        """Returns (pinger_pos, elem_pos) broadcast to (n_frames, 3) and
+        (n_frames, n_elements, 3). See generate() for ARGS.
+        """
+        if pinger_pos is None:
+            pinger_pos = self.pinger.position
+        pinger_pos = np.atleast_2d(pinger_pos)
+
+        if elem_pos is None:
+            elem_pos = self.element_positions(array_pos, array_rot)
+        n_frames = max(n_frames, pinger_pos.shape[0], elem_pos.shape[0])
+        pinger_pos = np.broadcast_to(pinger_pos, (n_frames, 3))
+        elem_pos = np.broadcast_to(elem_pos, (n_frames,) + elem_pos.shape[1:])
+
+        return (pinger_pos, elem_pos)
+
+    def synthesize(self, adc, n_samples, n_frames=1, pinger_pos=None, array_pos=None,
+                   array_rot=None, elem_pos=None, noise=True):
+        """Synthesizes n_frames captures of n_samples per channel at the
+        inputs of the ADC (before the LTC1564 gain). Returns the (n_frames,
+        n_channels, n_samples) array of volts, and the rms noise level of
+        each frame. See generate() for ARGS.
+        """
+        (pinger_pos, elem_pos) = self.get_poses(n_frames, pinger_pos, array_pos, array_rot, elem_pos)
+        n_frames = pinger_pos.shape[0]
+
+        # Propagation: (n_frames, n_paths, n_elements)
+        (dist, path_gain) = self.propagate(pinger_pos, elem_pos)
+        tau = dist / self.c
+        tau = tau - tau.min(axis=(1, 2), keepdims=True) + self.onset
+
+        # Map elements onto ADC channels
+        n_ch = adc.n_channels
+        n_el = min(n_ch, tau.shape[2])
+        amp = np.zeros(path_gain.shape[:2] + (n_ch,))
+        amp[:, :, :n_el] = self.source_level * path_gain[:, :, :n_el]
+        delays = np.zeros(tau.shape[:2] + (n_ch,))
+        delays[:, :, :n_el] = tau[:, :, :n_el]
+
+        # Sample times for each channel, including channel skew
+        skew = np.array([d or 0 for d in adc.delay[:n_ch]], dtype=float)
+        t = np.arange(n_samples) / float(adc.sample_rate)
+        t = t[np.newaxis, :] + skew[:, np.newaxis]  # (n_ch, n)
+
+        # Sum the gated tone over each path. Random phase per frame.
+        phi = self.rng.uniform(0, 2 * np.pi, n_frames)[:, np.newaxis, np.newaxis]
+        y = np.zeros((n_frames, n_ch, n_samples))
+        for p in range(tau.shape[1]):
+            t_rel = t[np.newaxis] - delays[:, p, :, np.newaxis]
+            gate = (t_rel >= 0) & (t_rel < self.ping_length)
+            y += (amp[:, p, :, np.newaxis] * gate
+                  * np.sin(2 * np.pi * self.freq * t_rel + phi))
+
+        # Additive noise, referred to the closest element
+        sig_rms = amp[:, 0, :n_el].max(axis=1) / np.sqrt(2)
+        noise_rms = sig_rms / 10**(self.snr_db / 20.0)
+        if noise:
+            y += self.rng.randn(*y.shape) * noise_rms[:, np.newaxis, np.newaxis]
+
+        return (y, noise_rms)
+
+    def digitize(self, y, adc):
+        """Passes y through the LTC1564 (its filter response and gain, if the
+        sim supports them), then applies the ADC's 12bit quantization (with
+        clipping), and the digital gain.
+        """
+        if hasattr(self.filt, 'apply'):
+            y = self.filt.apply(y, adc.sample_rate)
+        elif self.filt is not None:
+            y = y * (self.filt.Gval + 1)
+
+        lsb = getattr(adc, 'lsb', DEFAULT_DAC_VOLTAGE / 2**(WORD_SIZE - 1))
+        code = y / lsb
+        if self.quantize:
+            code = np.round(code)
+        code = np.clip(code, -2**(WORD_SIZE - 1), 2**(WORD_SIZE - 1) - 1)
+
+        return code * lsb * adc.digital_gain
+
+    def burst(self, adc, **kwargs):
+        """Generates a single capture in the burst() layout."""
+        return list(self.generate(adc, n_frames=1, **kwargs)[0])
@@ -0,0 +1,227 @@
+import os
+import json
+import hashlib
+import itertools
+import zipfile
+import numpy as np
+
+# Bump whenever a change here would change the contents of a table, so that
+# stale tables on disk aren't reused.
+LUT_VERSION = 2
+
+
+def wrap_phase(phase):
+    return (phase + np.pi) % (2 * np.pi) - np.pi
+
+
+def lut_key(array, freq, c, size, step):
+    """Hash identifying a table: array geometry, pinger frequency, speed of
+    sound and table resolution."""
+    text = json.dumps([LUT_VERSION, np.round(array.element_pos, 9).tolist(),
+                       float(freq), float(c), int(size), float(step)])
+    return hashlib.md5(text.encode('utf-8')).hexdigest()[:16]
+
+
+class Bearing_LUT(object):
+    """Lookup table from the phase lead of each element over element 0 (at
+    the pinger frequency) to a 3D bearing.
+
+    The table is a periodic grid over the (n_elements - 1) wrapped phases.
+    Every node is solved once: a search over a grid of directions picks the
+    bearing whose phases best match the node's, then
+    Array.compute_bearing() refines it on the phases unwrapped around that
+    bearing. See lookup() for how queries between nodes are handled.
+
+    Once elements are over half a wavelength apart, distinct directions
+    can have exactly the same wrapped phases. No table can tell those
+    apart: lookup() returns one of them, with a residual just as low.
+    build() warns about such arrays. Use the 'ml' direction method on them,
+    whose ambiguity says when a bearing can't be trusted.
+
+    Same conventions as Array.compute_bearing(), and it needs a geometry
+    compute_bearing() can handle.
+
+    Parameters:
+        * array: hydrophones.Array.
+        * freq: pinger frequency (Hz).
+        * c: speed of sound (m/s).
+        * size: number of nodes along each phase axis.
+        * step: spacing (degrees) of the direction search grid.
+    """
+
+    def __init__(self, array, freq, c, size=32, step=2.0):
+        self.array = array
+        self.freq = freq
+        self.c = c
+        self.size = size
+        self.step = step
+
+        self.key = lut_key(array, freq, c, size, step)
+        self.table = None  # (size,)*n_phases + (3,): u_x, u_y, u_z
+
+    # ####################################
+    # ### Building #######################
+    # ####################################
+    def phases_of(self, u, wrap=True):
+        """Returns the phase lead of each element over element 0 for sources
+        in the directions u (shape (..., 3)), wrapped into [-pi, pi) unless
+        wrap is False."""
+        lead = np.einsum('ij,...j->...i', self.array.element_pos[1:] - self.array.element_pos[0], u)
+        phases = 2 * np.pi * self.freq / self.c * lead
+
+        return wrap_phase(phases) if wrap else phases
+
+    def get_directions(self):
+        """Direction search grid. Only covers the side of the array that
+        compute_bearing() reports for planar arrays."""
+        (pinv, null, rank) = self.array.get_bearing_solver()
+
+        az = np.radians(np.arange(-180, 180, self.step))
+        el = np.radians(np.arange(-90, 90 + self.step / 2.0, self.step))
+        (az, el) = [m.ravel() for m in np.meshgrid(az, el)]
+        u = np.column_stack((np.cos(el) * np.sin(az), np.cos(el) * np.cos(az), np.sin(el)))
+
+        if null is not None:
+            u = u[np.dot(u, null) >= -1e-9]
+
+        return u
+
+    def get_max_spacing(self):
+        """Largest distance (m) between two elements of the array."""
+        pos = self.array.element_pos
+        return np.max(np.linalg.norm(pos[:, None] - pos[None], axis=-1))
+
+    def build(self, chunk=1024):
+        half_wavelength = self.c / self.freq / 2.0
+        if self.get_max_spacing() > half_wavelength:
+            print("bearing_lut: Warning! Array elements are up to %.2f cm apart,"
+                  % (self.get_max_spacing() * 100)
+                  + " more than half a wavelength (%.2f cm)." % (half_wavelength * 100)
+                  + " Some bearings may be aliases of the true one.")
+
+        n_phases = self.array.n_elements - 1
+        axis = -np.pi + 2 * np.pi * np.arange(self.size) / self.size
+        nodes = np.array(list(itertools.product(axis, repeat=n_phases)))
+
+        dirs = self.get_directions()
+        dir_phases = self.phases_of(dirs)
+
+        # Best direction for every node, by wrapped phase error. The cost
+        # sum(1 - cos(node - dir)) is minimized by maximizing
+        # sum(cos(node)cos(dir) + sin(node)sin(dir)), a matrix product.
+        dir_cs = np.hstack((np.cos(dir_phases), np.sin(dir_phases))).T
+        best = np.empty(len(nodes), dtype=int)
+        for start in range(0, len(nodes), chunk):
+            node = nodes[start:start + chunk]
+            node_cs = np.hstack((np.cos(node), np.sin(node)))
+            best[start:start + chunk] = np.argmax(np.dot(node_cs, dir_cs), axis=1)
+
+        # Refine each node's direction with the closed-form fit. Only the
+        # direction is kept: lookup() fits the residual of each query.
+        (u, az, el, residual) = self.solve(nodes, dirs[best])
+
+        self.table = u.reshape(self.get_shape())
+
+    # ####################################
+    # ### Persistence ####################
+    # ####################################
+    def get_shape(self):
+        return (self.size,) * (self.array.n_elements - 1) + (3,)
+
+    def get_filepath(self, cache_dir):
+        return os.path.join(cache_dir, 'bearing_lut_%s.npz' % self.key)
+
+    def load(self, cache_dir):
+        """Loads the table from cache_dir. Returns False if it isn't there,
+        or can't be read (eg. truncated or corrupt)."""
+        fp = self.get_filepath(cache_dir)
+        if not os.path.isfile(fp):
+            return False
+
+        try:
+            with np.load(fp) as data:
+                table = data['table']
+            if table.shape != self.get_shape():
+                raise ValueError("table has shape %s, expected %s" % (table.shape, self.get_shape()))
+        except (IOError, EOFError, ValueError, KeyError, zipfile.BadZipfile) as e:
+            print("bearing_lut: can't read %s (%s)." % (fp, e))
+            return False
+
+        self.table = table
+        return True
+
+    def save(self, cache_dir):
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+        # write to a temp file first, so a killed build never leaves a
+        # truncated table behind
+        fp = self.get_filepath(cache_dir)
+        with open(fp + '.tmp', 'wb') as f:
+            np.savez(f, table=self.table)
+        os.rename(fp + '.tmp', fp)
+
+    def load_or_build(self, cache_dir=None):
+        if cache_dir is not None and self.load(cache_dir):
+            return
+
+        print("bearing_lut: building table %s. This takes a few seconds." % self.key)
+        self.build()
+        if cache_dir is not None:
+            self.save(cache_dir)
+
+    def matches(self, array, freq, c):
+        return self.key == lut_key(array, freq, c, self.size, self.step)
+
+    # ####################################
+    # ### Lookup #########################
+    # ####################################
+    def lookup(self, phases):
+        """Returns (u, az, el, residual) for the phase leads (radians) of
+        elements 1..n over element 0, as an (n_elements - 1,) array or an
+        (n_frames, n_elements - 1) batch. See Array.compute_bearing() for
+        the outputs.
+
+        Bearings of neighboring nodes can't be averaged where they unwrap
+        differently (they may point in unrelated directions). Instead, each
+        of the 2^(n_elements - 1) nodes around the query says how to unwrap
+        the phases, the closed-form fit interpolates from there, and the
+        fit with the lowest residual wins.
+        """
+        phases = np.asarray(phases, dtype=float)
+        n_phases = phases.shape[-1]
+
+        # Nodes around the query
+        pos = (wrap_phase(phases) + np.pi) / (2 * np.pi) * self.size
+        low = np.floor(pos).astype(int)
+
+        best = None
+        for corner in itertools.product((0, 1), repeat=n_phases):
+            idx = (low + corner) % self.size
+            node_u = self.table[tuple(idx[..., k] for k in range(n_phases))]
+            (u, az, el, residual) = self.solve(phases, node_u)
+
+            if best is None:
+                best = (u, az, el, residual)
+            else:
+                keep = residual < best[3]
+                best = (np.where(keep[..., None], u, best[0]), np.where(keep, az, best[1]),
+                        np.where(keep, el, best[2]), np.where(keep, residual, best[3]))
+
+        return best
+
+    def solve(self, phases, u_guess):
+        """Unwraps phases around the ones of u_guess, and fits a bearing to
+        them. Returns (u, az, el, residual), where the residual includes
+        the phase error left after unwrapping."""
+        model = self.phases_of(u_guess, wrap=False)
+        unwrapped = model + wrap_phase(phases - model)
+        Dx = np.zeros(phases.shape[:-1] + (phases.shape[-1] + 1,))
+        Dx[..., 1:] = -unwrapped * self.c / (2 * np.pi * self.freq)
+        (u, az, el, residual) = self.array.compute_bearing(Dx)
+
+        phase_err = wrap_phase(phases - self.phases_of(u))
+        residual = np.sqrt(residual**2 + np.mean(phase_err**2, axis=-1)
+                           * (self.c / (2 * np.pi * self.freq))**2)
+
+        return (u, az, el, residual)
@@ -7,6 +7,10 @@ from tools3d import Phys_Obj
 K_HAT = np.array([[0, 0, 1]])
 DIM1 = 0
 
+# Singular values below this fraction of the largest one are treated as 0
+# when fitting a bearing (see Array.get_bearing_solver)
+RANK_TOL = 1e-6
+
 
 class Array(Phys_Obj):
     # Always mind the coordinate axes!
@@ -37,6 +41,10 @@ class Array(Phys_Obj):
         self.last_known_pinger_location = None
         self.last_known_pinger_direction = None
 
+        # Bearing solver cache (see get_bearing_solver)
+        self._bearing_key = None
+        self._bearing_solver = None
+
     def define(self, locations):
         """Specify the hydrophone configuration by passing an Nx3 numpy
         array, where each row is an XYZ coordinate representing a coordinate
@@ -54,69 +62,164 @@ class Array(Phys_Obj):
         self.pairs = [
             ID for ID in itertools.combinations(range(self.n_elements), 2)
         ]
+        self.pair_idx = np.array(self.pairs, dtype=int).reshape(-1, 2)
+
+        # compute pair properties, one row per pair
+        l0 = self.element_pos[self.pair_idx[:, 0]]
+        l1 = self.element_pos[self.pair_idx[:, 1]]
+
+        # vectorized distance between pairs, and absolute distance
+        self.d_vect = l1 - l0
+        self.d = np.linalg.norm(self.d_vect, axis=1)
+
+        # determine center of mass for each pair
+        self.COM = l0 + self.d_vect / 2
+
+        # Get normal for each pair (assuming each pair rests on
+        # the z = 0 plane).
+        zero = np.zeros(len(self.pairs))
+        norm_vect = np.column_stack((-self.d_vect[:, 1], self.d_vect[:, 0], zero))
+        norm_len = np.linalg.norm(norm_vect, axis=1)
+        self.norm_uvect = norm_vect / norm_len[:, np.newaxis]
+
+        # Get y_based rotation
+        abs_y_rot = np.arccos(np.dot(norm_vect, K_HAT[0]) / norm_len)
+        self.pair_y_rot = np.where(self.norm_uvect[:, 0] < 0, -abs_y_rot, abs_y_rot)
+
+        # Last computed coefficients, and the pairs they belong to
+        self.ddoa = None
+        self.ab = None
+        self.ab_pairs = None
+
+    def select_pairs(self, pairs=None):
+        """Returns the indices (into self.pairs) of the requested pairs. pairs
+        is a list of pair indices or of (ID0, ID1) element tuples. All pairs
+        if None.
+        """
+        if pairs is None:
+            return np.arange(len(self.pairs))
+
+        return np.array([p if np.isscalar(p) else self.pairs.index(tuple(p))
+                         for p in pairs], dtype=int)
+
+    def compute_ddoa(self, Dx, pairs=None):
+        """Returns the difference in distance of arrival (D_ID0 - D_ID1) of
+        each selected pair.
+
+        ARGS:
+            * Dx: distance of arrival at each element, as an (n_elements,)
+            array or an (n_frames, n_elements) batch.
+            * pairs: pairs to compute (see select_pairs()). All if None.
+
+        Returns an (n_pairs,) or (n_frames, n_pairs) array.
+        """
+        Dx = np.asarray(Dx, dtype=float)
+        sel = self.pair_idx[self.select_pairs(pairs)]
+
+        return Dx[..., sel[:, 0]] - Dx[..., sel[:, 1]]
 
-        # compute pair properties
-        self.d = []
-        self.COM = []
-        self.d_vect = []
-        self.norm_uvect = []
-        self.pair_y_rot = []
-        for (ID0, ID1) in self.pairs:
-            # General basic paremeters
-            l0 = self.element_pos[ID0]
-            l1 = self.element_pos[ID1]
-
-            # compute vectorized distance between pairs
-            d_vect = l1 - l0
-            self.d_vect.append(d_vect)
-
-            # absolute distance between each pair
-            self.d.append(np.linalg.norm(l0 - l1))
-
-            # determine center of mass for each pair
-            self.COM.append(l0 + (l1 - l0) / 2)
-
-            # Get nNormal for each pair (assuming each pair rests on
-            # the z = 0 plane).
-            norm_vect = np.array([[-d_vect[1], d_vect[0], 0]])
-            norm_uvect = norm_vect / np.linalg.norm(norm_vect)
-            self.norm_uvect.append(norm_uvect)
-
-            # Get y_based rotation
-            abs_y_rot = np.arccos(np.dot(norm_vect[0], K_HAT[0]) / np.linalg.norm(norm_vect)) # [0] is ugly syntax to yield a 1D vector
-            if (norm_uvect[DIM1, 0] < 0):
-                y_rot = -abs_y_rot
-            else:
-                y_rot = abs_y_rot
-
-            self.pair_y_rot.append(y_rot)
-
-    def compute_D1minusD2(self, Dx):
-        self.ddoa = []
-        for (ID_a, ID_b) in self.pairs:
-            ddoa = Dx[ID_a] - Dx[ID_b]
-            (self.ddoa).append(ddoa)
-
-    def compute_ab_coefficients(self):
-        n_pairs = len(self.pairs)
-
-        i = 0
-        self.ab = []
-        for i in range(n_pairs):
-            ab = dd_to_hyperboloid_coe(self.ddoa[i], self.d[i])
-            (self.ab).append(ab)
-
-    def bulk_compute_ab_from_distances(self, Dx):
-        self.compute_D1minusD2(Dx)
-        self.compute_ab_coefficients()
-
-    def get_direction(self, doa):
+    def compute_ab(self, Dx, pairs=None):
+        """Returns the (a, b) hyperboloid coefficients of each selected pair,
+        as two arrays shaped like compute_ddoa()'s output. See compute_ddoa()
+        for ARGS.
+        """
+        ddoa = self.compute_ddoa(Dx, pairs)
+        return dd_to_hyperboloid_coe(ddoa, self.d[self.select_pairs(pairs)])
+
+    def compute_D1minusD2(self, Dx, pairs=None):
+        self.ddoa = self.compute_ddoa(Dx, pairs)
+
+    def compute_ab_coefficients(self, pairs=None):
+        self.ab_pairs = self.select_pairs(pairs)
+        (a, b) = dd_to_hyperboloid_coe(self.ddoa, self.d[self.ab_pairs])
+
+        # rows of (a, b), one per pair (and frame)
+        self.ab = np.stack((a, b), axis=-1)
+
+    def bulk_compute_ab_from_distances(self, Dx, pairs=None):
+        """Updates self.ddoa and self.ab for the selected pairs (all of them
+        by default). Dx may hold a single frame or a batch, see
+        compute_ddoa().
+        """
+        self.compute_D1minusD2(Dx, pairs)
+        self.compute_ab_coefficients(pairs)
+
+    def get_bearing_solver(self):
+        """Returns (pinv, null, rank) for the far-field least-squares bearing
+        fit. In the far field, the ddoa of every pair is d_vect.u, where u
+        is the unit vector pointing at the source, so u = pinv.ddoa. null
+        is the direction the fit can't see when the elements all lie in a
+        plane (rank 2), else None. Only depends on the geometry, so it is
+        computed once per geometry.
+        """
+        key = (self.element_pos.tobytes(), self.element_pos.shape)
+        if self._bearing_key == key:
+            return self._bearing_solver
+
+        (U, s, Vt) = np.linalg.svd(self.d_vect)
+        rank = int(np.sum(s > s[0] * RANK_TOL)) if s.size else 0
+        pinv = np.linalg.pinv(self.d_vect, rcond=RANK_TOL)
+
+        null = None
+        if rank == 2:
+            # Pick the side below the array (pingers sit below it). Fall back
+            # to the front of it for vertical arrays.
+            null = Vt[2]
+            if (null[2] > 0) or (null[2] == 0 and null[1] < 0):
+                null = -null
+
+        self._bearing_solver = (pinv, null, rank)
+        self._bearing_key = key
+
+        return self._bearing_solver
+
+    def compute_bearing(self, Dx):
+        """Fits a 3D bearing to the distances of arrival at every element,
+        using all pairs.
+
+        ARGS:
+            * Dx: distance of arrival at each element, as an (n_elements,)
+            array or an (n_frames, n_elements) batch. Only differences
+            matter, so any common offset is fine.
+
+        Returns (u, az, el, residual): the unit vector pointing from the
+        array at the source (shape (..., 3)), its azimuth (degrees clockwise
+        from the y axis, towards x), its elevation (degrees above the x-y
+        plane), and the rms misfit of the pair ddoas (meters). Planar arrays
+        can't tell above from below, so they always return a bearing below
+        the array.
+        """
+        (pinv, null, rank) = self.get_bearing_solver()
+        if rank < 2:
+            raise ValueError("hydrophones: a 3D bearing needs at least 3 elements, not all in a line.")
+
+        # Least-squares fit
+        ddoa = self.compute_ddoa(Dx)
+        u = np.einsum('ij,...j->...i', pinv, ddoa)
+        if null is not None:
+            # The ddoas say nothing along null. Use whatever it takes to
+            # make u a unit vector.
+            horiz = np.sum(u**2, axis=-1)
+            u = u + np.sqrt(np.clip(1 - horiz, 0, None))[..., np.newaxis] * null
+        u = u / np.linalg.norm(u, axis=-1)[..., np.newaxis]
+
+        # How well does the unit bearing explain the measurements?
+        err = np.einsum('ij,...j->...i', self.d_vect, u) - ddoa
+        residual = np.sqrt(np.mean(err**2, axis=-1))
+
+        az = np.degrees(np.arctan2(u[..., 0], u[..., 1]))
+        el = np.degrees(np.arcsin(np.clip(u[..., 2], -1, 1)))
+
+        return (u, az, el, residual)
+
+    def get_direction(self, doa, pairs=None):
         """
         Takes a list of distances of arrival (doa) values corresponding to each
         hydrophone element and uses
-        such information to generate a pinger location
+        such information to generate a pinger location. Only the selected
+        pairs are computed (see select_pairs()).
         """
-        self.bulk_compute_ab_from_distances(doa)
+        self.bulk_compute_ab_from_distances(doa, pairs)
         # ^^ Updates self.ddoa and self.ab
 
         self.last_known_pinger_direction = 0
@@ -153,17 +256,18 @@ def generate_yaw_pitch_dual_array_definition(yaw_d, pitch_d):
 
 
 def dd_to_hyperboloid_coe(D1minusD2, element_spacing):
-    d = element_spacing / 2
+    """Works on scalars, or element-wise on arrays of pairs (and frames)."""
+    d = np.asarray(element_spacing) / 2.0
 
     # Get "a" coefficient
-    a = D1minusD2 / 2
+    a = np.asarray(D1minusD2) / 2.0
 
     #
-    if (abs(a) > d):
+    if np.any(np.abs(a) > d):
         # Limit given the spacing of the hydrophone elements has been
         # exceed. To prevent error in the next step, we'll clip purposely
         # clip the signal
-        a = d * (-1 * (a < 0) + 1 * (a >= 0))
+        a = np.clip(a, -d, d)
         print("get_heading: Warning, Angle is Clipped at max/min value. "
               + "Pay attention to this a make sure you're not running into "
               + "spatial aliasing territory.")
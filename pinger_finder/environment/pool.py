@@ -0,0 +1,124 @@
+import itertools
+import numpy as np
+
+# Surface indices, in the order used by Pool.reflection_coe
+X_LOW = 0
+X_HIGH = 1
+Y_LOW = 2
+Y_HIGH = 3
+FLOOR = 4
+SURFACE = 5
+
+
+class Pool(object):
+    """Rectangular pool for the image-source multipath model. Walls run from
+    x = 0 to length and y = 0 to width. The water surface is at z = 0 and the
+    floor at z = -depth, which matches the convention of pingers sitting at
+    negative z below the array.
+
+    Every reflection off a surface is replaced by a mirrored (image) copy of
+    the source, so that each propagation path becomes a straight line from
+    an image to the receiver, scaled by the reflection coefficients of the
+    surfaces it bounced off.
+
+    Parameters:
+        * length, width, depth: pool dimensions (meters).
+        * reflection_coe: pressure reflection coefficients of the 6
+        surfaces (see X_LOW...SURFACE). The water/air surface defaults to
+        -1 (pressure release); walls and floor to 0.5.
+        * order: maximum number of reflections per path.
+    """
+
+    def __init__(self, length=25.0, width=15.0, depth=5.0, order=2):
+        self.length = length
+        self.width = width
+        self.depth = depth
+        self.reflection_coe = np.array([0.5, 0.5, 0.5, 0.5, 0.5, -1.0])
+        self.order = order
+
+        self._images = None
+        self._images_key = None
+
+    # ####################################
+    # ### Images #########################
+    # ####################################
+    def get_images(self):
+        """Returns the image-source table as (sign, shift, gain, order):
+        image = sign * source + shift, for arrays of shape (n_images, 3),
+        (n_images, 3), (n_images,) and (n_images,). The table does not
+        depend on the source position, so it is built once per
+        geometry. The direct path is always first.
+        """
+        key = (self.length, self.width, self.depth, self.order,
+               tuple(self.reflection_coe))
+        if self._images_key == key:
+            return self._images
+
+        # Per axis, image index (n, q) sits at 2*n*L + (1 - 2q)*x in a box
+        # spanning [0, L]. It bounces |n - q| times off the low wall and
+        # |n| times off the high wall.
+        N = (self.order + 1) // 2
+        per_axis = [(n, q) for n in range(-N, N + 1) for q in (0, 1)]
+        L = np.array([self.length, self.width, self.depth])
+        coe = self.reflection_coe
+
+        sign = []
+        shift = []
+        gain = []
+        order = []
+        for combo in itertools.product(per_axis, repeat=3):
+            n = np.array([c[0] for c in combo])
+            q = np.array([c[1] for c in combo])
+            n_low = np.abs(n - q)
+            n_high = np.abs(n)
+            if np.sum(n_low + n_high) > self.order:
+                continue
+
+            sign.append(1 - 2 * q)
+            shift.append(2 * n * L)
+            gain.append(np.prod(coe[0::2]**n_low * coe[1::2]**n_high))
+            order.append(np.sum(n_low + n_high))
+
+        # direct path first, then by increasing order
+        idx = np.argsort(order, kind='mergesort')
+        self._images = (np.array(sign)[idx], np.array(shift)[idx],
+                        np.array(gain)[idx], np.array(order)[idx])
+        self._images_key = key
+
+        return self._images
+
+    def image_sources(self, src_pos):
+        """Returns the positions of every image of each source, as an
+        (n_sources, n_images, 3) array.
+
+        ARGS:
+            * src_pos: (n_sources, 3) source positions in pool coordinates.
+        """
+        (sign, shift, gain, order) = self.get_images()
+        src_pos = np.atleast_2d(src_pos)
+
+        # the floor is the "low" z wall, so work with z measured from it
+        offset = np.array([0, 0, self.depth])
+        images = sign[np.newaxis] * (src_pos + offset)[:, np.newaxis, :] + shift[np.newaxis]
+
+        return images - offset
+
+    def paths(self, src_pos, rx_pos):
+        """Returns (distance, gain) for every path from each source to each
+        receiver, as (n_sources, n_images, n_receivers) arrays. Gains
+        include the reflection coefficients and 1/r spreading.
+
+        ARGS:
+            * src_pos: (n_sources, 3) source positions.
+            * rx_pos: (n_sources, n_receivers, 3) receiver positions, or
+            (n_receivers, 3) if the receivers are the same for every source.
+        """
+        images = self.image_sources(src_pos)
+        rx_pos = np.asarray(rx_pos)
+        if rx_pos.ndim == 2:
+            rx_pos = rx_pos[np.newaxis]
+
+        dist = np.linalg.norm(rx_pos[:, np.newaxis, :, :] - images[:, :, np.newaxis, :], axis=3)
+        gain = self.get_images()[2][np.newaxis, :, np.newaxis] / np.maximum(dist, 1.0)
+
+        return (dist, gain)
@@ -1,5 +1,9 @@
 import numpy as np
-from tools3d import Phys_Obj
+from tools3d import Phys_Obj, rotation_matrices
+
+# Y/Z base meshes of the contours, keyed by (max_distance, pts). They only
+# depend on the mesh settings, so every contour shares them.
+_base_meshes = {}
 
 
 class Pinger(Phys_Obj):
@@ -28,41 +32,74 @@ class Pinger_Contour(Phys_Obj):
         This function also takes care of aligning/orienting the contour data to the
         orientation of the hydrophone pair (using data contained in the array object).
         """
-        a = ab[0]
-        b = ab[1]
-
-        # Generate Y and Z meshgrid
-        lim = self.max_distance
-        Y = np.linspace(-lim, lim, self.pts)
-        Z = Y
-        Y, Z = np.meshgrid(Y, Z)
-
-        # Generate X
-        temp = a
-        a = abs(a)
-        X = np.sqrt((2 * a + (Z / b)**2 + (Y / b)**2)) * a
-
-        # get "a" back
-        a = temp
-
-        # Save values to internal attributes
-        if a < 0:
-            self.X = -X
-        else:
-            self.X = X
-        self.Y = Y
-        self.Z = Z
-
-        # Final step is to orient the contour to the hydrophone pair
-        self.match_contour_to_pair(array_pair_idx, array)
-
-    def match_contour_to_pair(self, array_pair_idx, array):
-        # vector param
-        j = 1
-        idx = array_pair_idx
-
-        # Rotate accordingly
-        self.xform_rotate(np.array([[0, array.pair_y_rot[idx], 0]]))
-
-        # Move accordingly
-        self.xform_translate(array.COM[idx])
+        meshes = generate_contour_meshes([ab], [array_pair_idx], array, self.max_distance, self.pts)
+        self.set_mesh(meshes[0], array.COM[array_pair_idx])
+
+    def set_mesh(self, mesh, position):
+        """Takes a (3, pts, pts) XYZ mesh that is already oriented and placed
+        in the world, and the position it was moved to."""
+        (self.X, self.Y, self.Z) = mesh
+        self.position = np.reshape(position, (1, 3))
+
+
+def get_base_mesh(max_distance, pts):
+    """Returns the (Y, Z) meshgrid that every contour is drawn over."""
+    key = (max_distance, pts)
+    if key not in _base_meshes:
+        lim = max_distance
+        Y = np.linspace(-lim, lim, pts)
+        _base_meshes[key] = np.meshgrid(Y, Y)
+
+    return _base_meshes[key]
+
+
+def generate_contour_meshes(ab, pair_idx, array, max_distance=50, pts=20):
+    """Generates the contours of several hydrophone pairs at once. Each is
+    drawn in its pair's frame, then turned by one composed rotation and
+    moved onto the pair's center, same as Pinger_Contour.coe_generate_contour.
+
+    ARGS:
+        * ab: (a, b) coefficients of each pair, as an (n_pairs, 2) array.
+        * pair_idx: index of each pair in array.pairs.
+        * array: hydrophones.Array.
+        * max_distance, pts: mesh settings (see Pinger_Contour).
+
+    Returns an (n_pairs, 3, pts, pts) array of XYZ meshes.
+    """
+    ab = np.asarray(ab, dtype=float).reshape(-1, 2)
+    pair_idx = np.asarray(pair_idx, dtype=int)
+    (Y, Z) = get_base_mesh(max_distance, pts)
+
+    # Generate X in each pair's frame
+    a = ab[:, 0, np.newaxis, np.newaxis]
+    b = ab[:, 1, np.newaxis, np.newaxis]
+    X = np.sqrt(2 * np.abs(a) + (Z / b)**2 + (Y / b)**2) * np.abs(a)
+    X = np.where(a < 0, -X, X)
+
+    xyz = np.empty((len(ab), 3) + Y.shape)
+    xyz[:, 0] = X
+    xyz[:, 1] = Y
+    xyz[:, 2] = Z
+
+    # Orient and place each contour
+    rot = np.zeros((len(ab), 3))
+    rot[:, 1] = np.asarray(array.pair_y_rot)[pair_idx]
+    R = rotation_matrices(rot)
+    xyz = np.einsum('nij,nj...->ni...', R, xyz)
+
+    return xyz + np.asarray(array.COM)[pair_idx][:, :, np.newaxis, np.newaxis]
+
+
+def generate_contours(contours, ab, array, pair_idx=None):
+    """Regenerates a list of Pinger_Contours (one per pair, in the order of
+    pair_idx, or of array.pairs if None) in one batched call. They must all
+    share the same mesh settings.
+    """
+    if pair_idx is None:
+        pair_idx = range(len(contours))
+    pair_idx = list(pair_idx)
+
+    c0 = contours[0]
+    meshes = generate_contour_meshes(ab, pair_idx, array, c0.max_distance, c0.pts)
+    for (contour, mesh, idx) in zip(contours, meshes, pair_idx):
+        contour.set_mesh(mesh, array.COM[idx])
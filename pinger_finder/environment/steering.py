@@ -0,0 +1,200 @@
+import numpy as np
+from collections import OrderedDict
+
+# Number of (geometry, frequency, grid) steering matrices kept around
+CACHE_SIZE = 8
+
+# Direction search defaults (see search()): coarse grid spacing (degrees),
+# number of refinement levels, and how many times finer each level gets
+COARSE_STEP = 5.0
+LEVELS = 2
+REFINE = 5
+
+# Ambiguity (see get_ambiguity) over which a bearing can't be told apart
+# from an alias of it
+MAX_AMBIGUITY = 0.9
+
+_cache = OrderedDict()
+
+
+def unit_vectors(az, el):
+    """Returns unit vectors (shape (..., 3)) for azimuths and elevations in
+    degrees. Azimuth is clockwise from the y axis (towards x), elevation is
+    above the x-y plane, same as Array.compute_bearing().
+    """
+    az = np.radians(az)
+    el = np.radians(el)
+    return np.stack((np.cos(el) * np.sin(az), np.cos(el) * np.cos(az), np.sin(el)), axis=-1)
+
+
+def to_az_el(u):
+    az = np.degrees(np.arctan2(u[..., 0], u[..., 1]))
+    el = np.degrees(np.arcsin(np.clip(u[..., 2], -1, 1)))
+    return (az, el)
+
+
+def fold(u, array):
+    """Mirrors directions onto the side of the array that can be told apart.
+    Planar arrays see a source and its mirror image across their plane the
+    same way, and report the one below (see Array.compute_bearing()). Line
+    arrays can't tell any rotation about their axis apart, and report the
+    one in the front half of the horizontal plane.
+    """
+    (pinv, null, rank) = array.get_bearing_solver()
+    if rank == 2:
+        side = np.sum(u * null, axis=-1)[..., np.newaxis]
+        u = np.where(side < 0, u - 2 * side * null, u)
+    elif rank == 1:
+        axis = array.d_vect[0] / np.linalg.norm(array.d_vect[0])
+        along = np.sum(u * axis, axis=-1)[..., np.newaxis]
+        perp = np.cross(np.array([0, 0, 1.0]), axis)
+        if perp[1] < 0:
+            perp = -perp
+        u = along * axis + np.sqrt(np.clip(1 - along**2, 0, None)) * perp
+
+    return u
+
+
+def candidate_directions(array, step):
+    """Returns (az, el) in degrees of a grid of step degrees that covers every
+    direction the array can tell apart (see fold())."""
+    (pinv, null, rank) = array.get_bearing_solver()
+
+    az = np.arange(-180, 180, step)
+    el = np.arange(-90, 90 + step / 2.0, step) if rank > 1 else np.array([0.0])
+    (az, el) = [m.ravel() for m in np.meshgrid(az, el)]
+
+    # drop the mirror images, and the duplicate azimuths at the poles
+    u = unit_vectors(az, el)
+    keep = np.all(np.isclose(fold(u, array), u), axis=-1) & ((np.abs(el) < 90) | (az == -180))
+
+    return (az[keep], el[keep])
+
+
+def steering_vectors(element_pos, u, freq, c):
+    """Returns the phasor each element sees, relative to the array origin,
+    from a unit plane wave arriving from each direction u (shape (..., 3)).
+    Shape (..., n_elements). Elements closer to the source lead.
+    """
+    lead = np.einsum('...j,ej->...e', u, element_pos)
+    return np.exp(2j * np.pi * freq / c * lead)
+
+
+def get_steering(array, freq, c, step):
+    """Returns (az, el, A) for the candidate directions of array (see
+    candidate_directions()), where A is the (n_directions, n_elements)
+    steering matrix. Kept in a small cache keyed by geometry, frequency,
+    sound speed and grid step, so it's only built once per combination.
+    """
+    key = (array.element_pos.tobytes(), array.element_pos.shape, float(freq), float(c), float(step))
+    if key in _cache:
+        _cache[key] = _cache.pop(key)  # most recently used goes last
+        return _cache[key]
+
+    (az, el) = candidate_directions(array, step)
+    A = steering_vectors(array.element_pos, unit_vectors(az, el), freq, c)
+
+    _cache[key] = (az, el, A)
+    while len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+
+    return _cache[key]
+
+
+def get_ambiguity(power, az, el, best, array, freq, c):
+    """Returns how strongly each frame's power map peaks somewhere other
+    than around its best direction: the power of the strongest alias over
+    the power of the peak. 0 when there's no other peak, and close to 1 when
+    a grating lobe matches the frame as well as the peak does, in which case
+    the bearing could just as well be the alias.
+
+    A direction counts as an alias once the phase of some pair of elements
+    differs by at least half a cycle from what it is at the peak. Closer
+    directions are on the main lobe. Arrays whose elements are all within
+    half a wavelength of each other never have one.
+
+    ARGS:
+        * power: (n_frames, n_directions) power map over the directions
+        (az, el) (see get_steering).
+        * best: index of the peak of each frame.
+        * array, freq, c: as in search().
+    """
+    frames = np.arange(len(best))
+    phase = 2 * np.pi * freq / c * np.dot(unit_vectors(az, el), array.element_pos.T)
+    offset = phase[np.newaxis] - phase[best][:, np.newaxis]
+    alias = np.ptp(offset, axis=-1) >= np.pi
+
+    alias_power = np.max(np.where(alias, power, 0), axis=1)
+    return alias_power / np.maximum(power[frames, best], 1e-300)
+
+
+def local_grid(az, el, span, refine, rank):
+    """Returns (az, el), shaped (n, n_points), of a grid spanning +/- span
+    degrees around each of the n directions (az, el) with a step of
+    span/refine. Elevation is held at 0 for line arrays (rank 1)."""
+    offsets = np.linspace(-1, 1, 2 * refine + 1) * span
+    (d_az, d_el) = [m.ravel() for m in np.meshgrid(offsets, offsets if rank > 1 else [0.0])]
+
+    return (az[:, np.newaxis] + d_az, np.clip(el[:, np.newaxis] + d_el, -90, 90))
+
+
+def search(phasors, array, freq, c, step=COARSE_STEP, levels=LEVELS, refine=REFINE):
+    """Maximum likelihood direction of a single plane wave, given the
+    narrowband phasors of every element (eg. from get_heading.get_phasors()).
+
+    Scores every direction of the coarse grid against all the phasors in one
+    matrix product, by the power a beam steered that way would receive,
+    |a^H x|^2. Each level of refinement then searches a grid refine times
+    finer, spanning one step of the previous level around the best direction
+    so far.
+
+    Phase wrapping is accounted for by the steering vectors, but once
+    elements are over half a wavelength apart, the array has grating lobes:
+    directions whose steering vectors match the true one's, some of them
+    exactly. Those score as high as the true direction (with a quality just
+    as good), and the search may well return one. The ambiguity of the
+    coarse power map (see get_ambiguity) says when that's possible.
+
+    ARGS:
+        * phasors: (n_elements,) complex phasors, or an (n_frames,
+        n_elements) batch.
+        * array: hydrophones.Array.
+        * freq: pinger frequency (Hz).
+        * c: speed of sound (m/s).
+        * step: spacing (degrees) of the coarse grid.
+        * levels: number of refinement levels.
+        * refine: ratio between the step of successive levels.
+
+    Returns (u, az, el, quality, ambiguity), with u, az and el as in
+    Array.compute_bearing(). quality is the fraction of the phasors' power
+    explained by a plane wave from u: 1 for a perfect match, down to about
+    1/n_elements for phasors with no relation to each other. ambiguity is
+    described in get_ambiguity().
+    """
+    x = np.asarray(phasors, dtype=complex)
+    shape = x.shape[:-1]
+    x = x.reshape(-1, x.shape[-1])
+    frames = np.arange(len(x))
+    rank = array.get_bearing_solver()[2]
+
+    # Coarse search
+    (az, el, A) = get_steering(array, freq, c, step)
+    power = np.abs(np.dot(x, A.conj().T))**2
+    best = np.argmax(power, axis=1)
+    ambiguity = get_ambiguity(power, az, el, best, array, freq, c)
+    (best_az, best_el, best_power) = (az[best], el[best], power[frames, best])
+
+    # Refinement
+    for level in range(levels):
+        (az, el) = local_grid(best_az, best_el, step / float(refine)**level, refine, rank)
+        a = steering_vectors(array.element_pos, unit_vectors(az, el), freq, c)
+        power = np.abs(np.einsum('fke,fe->fk', a.conj(), x))**2
+        best = np.argmax(power, axis=1)
+        (best_az, best_el, best_power) = (az[frames, best], el[frames, best], power[frames, best])
+
+    u = fold(unit_vectors(best_az, best_el), array)
+    (az, el) = to_az_el(u)
+    quality = best_power / (x.shape[1] * np.sum(np.abs(x)**2, axis=1))
+
+    return (u.reshape(shape + (3,)), az.reshape(shape), el.reshape(shape), quality.reshape(shape),
+            ambiguity.reshape(shape))
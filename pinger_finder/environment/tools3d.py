@@ -1,6 +1,36 @@
 import numpy as np
 
 
+def rotation_matrices(rot_values):
+    """Takes an Nx3 array of (x, y, z) rotations in radians and returns the
+    Nx3x3 stack of rotation matrices that apply them in the same order as
+    Phys_Obj.xform_rotate (x axis first, then y, then z).
+    """
+    rot_values = np.atleast_2d(rot_values)
+    (cx, cy, cz) = np.cos(rot_values).T
+    (sx, sy, sz) = np.sin(rot_values).T
+    zero = np.zeros(cx.shape)
+    one = np.ones(cx.shape)
+
+    mat_xrot = np.array([[one, zero, zero],
+                         [zero, cx, -sx],
+                         [zero, sx, cx]])
+
+    mat_yrot = np.array([[cy, zero, sy],
+                         [zero, one, zero],
+                         [-sy, zero, cy]])
+
+    mat_zrot = np.array([[cz, -sz, zero],
+                         [sz, cz, zero],
+                         [zero, zero, one]])
+
+    # (3, 3, N) -> (N, 3, 3), then compose Rz.Ry.Rx
+    mat_xrot = mat_xrot.transpose(2, 0, 1)
+    mat_yrot = mat_yrot.transpose(2, 0, 1)
+    mat_zrot = mat_zrot.transpose(2, 0, 1)
+    return np.einsum('nij,njk,nkl->nil', mat_zrot, mat_yrot, mat_xrot)
+
+
 class Environment():
 
     def __init__(self):
@@ -76,50 +106,14 @@ class Phys_Obj(object):
         self.move(new_location)
 
     def xform_rotate(self, rot_values):
-        rot_x = rot_values[0, 0]
-        rot_y = rot_values[0, 1]
-        rot_z = rot_values[0, 2]
-
-        mat_xrot = np.array([[1, 0, 0],
-                             [0, np.cos(rot_x), -np.sin(rot_x)],
-                             [0, np.sin(rot_x), np.cos(rot_x)]])
-
-        mat_yrot = np.array([[np.cos(rot_y), 0, np.sin(rot_y)],
-                             [0, 1, 0],
-                             [-np.sin(rot_y), 0, np.cos(rot_y)]])
-
-        mat_zrot = np.array([[np.cos(rot_z), -np.sin(rot_z), 0],
-                             [np.sin(rot_z), np.cos(rot_z), 0],
-                             [0, 0, 1]])
-
-        # Do X axis rotation
-        old_xyz = np.array([self.X, self.Y, self.Z])
-        new_xyz = [0] * 3
-        for r in range(3):
-            for c in range(3):
-                new_xyz[r] = new_xyz[r] + mat_xrot[r][c] * old_xyz[c]
-
-        self.X = new_xyz[0]
-        self.Y = new_xyz[1]
-        self.Z = new_xyz[2]
-
-        # Do Y axis rotation
-        old_xyz = np.array([self.X, self.Y, self.Z])
-        new_xyz = [0] * 3
-        for r in range(3):
-            for c in range(3):
-                new_xyz[r] = new_xyz[r] + mat_yrot[r][c] * old_xyz[c]
-
-        self.X = new_xyz[0]
-        self.Y = new_xyz[1]
-        self.Z = new_xyz[2]
+        """Rotates the object's X, Y, Z points about the origin, by
+        rot_values[0] = (x, y, z) radians (x axis first, then y, then z).
+        """
+        R = rotation_matrices(rot_values)[0]
 
-        # Do Z axis rotation
-        old_xyz = np.array([self.X, self.Y, self.Z])
-        new_xyz = [0] * 3
-        for r in range(3):
-            for c in range(3):
-                new_xyz[r] = new_xyz[r] + mat_zrot[r][c] * old_xyz[c]
+        # One composed rotation over the stacked coordinates
+        old_xyz = np.array([self.X, self.Y, self.Z], dtype=float)
+        new_xyz = np.einsum('ij,j...->i...', R, old_xyz)
 
         self.X = new_xyz[0]
         self.Y = new_xyz[1]
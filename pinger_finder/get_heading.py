@@ -164,6 +164,27 @@ def compute_time_diff(target_freq, fs, a, b):
 
     return tb_minus_ta
 
+
+def get_phasors(adc, target_freq, n_channels=None):
+    """
+    Returns the complex amplitude of target_freq on each ADC channel (the
+    first n_channels of them, or all), as an (n_channels,) array.
+
+    Evaluates a single DFT bin at exactly target_freq, rather than the
+    nearest bin of a full fft, and undoes the sampling skew between channels
+    (adc.delay), so the phases of all channels can be compared directly.
+    """
+    if n_channels is None:
+        n_channels = adc.n_channels
+
+    y = np.array(adc.y[0:n_channels], dtype=float)
+    t = np.arange(y.shape[1]) / float(adc.sample_rate)
+    phasors = np.dot(y, np.exp(-2j * np.pi * target_freq * t))
+
+    # A channel sampled late sees the signal further along
+    skew = np.array([d or 0 for d in adc.delay[0:n_channels]], dtype=float)
+    return phasors * np.exp(-2j * np.pi * target_freq * skew)
+
 # ############################
 ### System level function ####
 ##############################
@@ -294,7 +315,8 @@ def compute_relative_delay_times(adc, target_freq, array, c, pattern=None, elem2
             adc.y[cha],
             adc.y[chb])
 
-        toa[el_b] = tdoa - toa[el_a]
+        # climb the ladder: b leads element 0 by a's lead plus b's lead on a
+        toa[el_b] = toa[el_a] + tdoa
 
     # print delay for debugging purposes
     #import pdb; pdb.set_trace()
@@ -4,6 +4,7 @@ matplotlib.use('TKAgg')
 import numpy as np
 import acoustics
 from environment import hydrophones, tools3d, source 
+import solve_contour_simulation
 from matplotlib import animation
 from mpl_toolkits.mplot3d.art3d import juggle_axes
 
@@ -107,15 +108,12 @@ def generate_contours(env, array, pinger, pinger_contour, ax):
     # Measure channel length for each hydrophone
     time_vals = generate_arrival_times(env, array, pinger)
     
-    # plot something
+    # Regenerate every pair's contour in one go, then plot them
     array.bulk_compute_ab_from_distances(time_vals*env.c)
-    
-    for idx in range(array.n_elements):
-            ab = (array.ab[idx][0], array.ab[idx][1])
-            pinger_contour[idx].coe_generate_contour(ab, idx, array)
-            
-            
-            plot_contour(pinger_contour[idx], ax)
+    source.generate_contours(pinger_contour, array.ab, array)
+
+    for contour in pinger_contour:
+        plot_contour(contour, ax)
     
 # #############################
 ##### Time Functions #########
@@ -180,9 +178,9 @@ class World(object):
     array = hydrophones.Array()
     array.define(HYDROPHONE_DEFAULT_LOCATIONS)
     
-    # Initialize grouped objects
+    # Initialize grouped objects (one contour per pair)
     pinger_contour = []
-    for i in range(array.n_elements):
+    for i in range(len(array.pairs)):
         pinger_contour.append(source.Pinger_Contour())
         
     
@@ -237,37 +235,8 @@ class World(object):
         
         # Print for analytical purposes
         if i == 20:
-            print("Printing data")
-            with open("./saved_data/ArrayData.txt", 'w') as f:
-                f.write("AX = np.array(")
-                print_like_nparray(f,self.pinger_contour[0].X)
-                f.write(")\n\n")
-                f.write("AY = np.array(")
-                print_like_nparray(f,self.pinger_contour[0].Y)
-                f.write(")\n\n")
-                f.write("AZ = np.array(")
-                print_like_nparray(f,self.pinger_contour[0].Z)
-                f.write(")\n\n")
-                
-                f.write("BX = np.array(")
-                print_like_nparray(f,self.pinger_contour[1].X)
-                f.write(")\n\n")
-                f.write("BY = np.array(")
-                print_like_nparray(f,self.pinger_contour[1].Y)
-                f.write(")\n\n")
-                f.write("BZ = np.array(")
-                print_like_nparray(f,self.pinger_contour[1].Z)
-                f.write(")\n\n")
-                
-                f.write("CX = np.array(")
-                print_like_nparray(f,self.pinger_contour[2].X)
-                f.write(")\n\n")
-                f.write("CY = np.array(")
-                print_like_nparray(f,self.pinger_contour[2].Y)
-                f.write(")\n\n")
-                f.write("CZ = np.array(")
-                print_like_nparray(f,self.pinger_contour[2].Z)
-                f.write(")")
+            print("Saving contours")
+            solve_contour_simulation.save_contours("./saved_data/contours.npz", self.pinger_contour)
                 
                 
      
@@ -275,25 +244,6 @@ class World(object):
         #return self.pinger.pdata
         
         
-def print_like_nparray(f, data):
-    shape = data.shape
-    f.write('[')
-    for r in range(shape[0]):
-        f.write('[') 
-        
-        for c in range(shape[1]):
-            f.write('%.3f' % data[r,c])
-            if c < (shape[1]-1):
-                f.write(', ')
-            else:
-                f.write(']')
-            
-        if r < (shape[0]-1):
-            f.write(',\n')
-        else:
-            f.write(']')
-                
-
 class Worldmember(object):
     pass
     
@@ -0,0 +1,278 @@
+"""Monte Carlo sweep of the acoustics pipeline over synthetic captures.
+
+Runs every point of a parameter grid (array spacing, pinger frequency,
+SNR, sample rate, sample length) through the full Acoustics pipeline in
+sim mode. Each trial places the pinger at a random bearing, synthesizes a
+capture (environment.acousimtools.Capture_Generator), and runs
+update_measurement() on it. Trials are aggregated into one row per point:
+heading bias/std/rms for each pair, detection rate, and the mean CPU time
+of each pipeline stage.
+
+usage:
+    python sweep_acoustics.py --spacing 0.0193 0.03 --snr 10 20 30 -n 200
+
+Points are spread across a process pool. Every finished point is cached
+under --cache, keyed by a hash of its parameters, so an interrupted sweep
+picks up where it left off and repeated points cost nothing.
+"""
+import os
+import sys
+import csv
+import json
+import time
+import hashlib
+import argparse
+import itertools
+import multiprocessing
+
+import numpy as np
+
+import acoustics
+import get_heading
+from environment import hydrophones
+from environment import source
+from environment.acousimtools import Capture_Generator
+
+# Bump whenever a change to this harness or to the pipeline would change
+# the results, so that stale cache entries aren't reused.
+SWEEP_VERSION = 2
+
+PARAM_NAMES = ['array_spacing', 'pinger_frequency', 'snr_db', 'sample_rate',
+               'sample_length']
+STAGES = ['synth', 'capture', 'tdoa', 'direction', 'total']
+RESULT_HEADER = (['key'] + PARAM_NAMES + ['trials', 'detection_rate']
+                 + ['ab_bias', 'ab_std', 'ab_rms', 'cd_bias', 'cd_std', 'cd_rms']
+                 + ['%s_ms' % stage for stage in STAGES])
+
+PAIR_AB = 0
+PAIR_CD = 5
+
+
+class Stage_Timer(object):
+    """Accumulates CPU time spent in wrapped functions, per stage."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.totals = dict((stage, 0.0) for stage in STAGES)
+
+    def wrap(self, stage, func):
+        def timed(*args, **kwargs):
+            start = time.clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.totals[stage] += time.clock() - start
+        return timed
+
+
+def point_key(point):
+    """Hash identifying a sweep point (parameters, trial count, seed and
+    harness version)."""
+    text = json.dumps([SWEEP_VERSION, sorted(point.items())])
+    return hashlib.md5(text).hexdigest()[:16]
+
+
+def reference_headings(array, elem_dist):
+    """Headings the pipeline would report for a perfect capture. Delays are
+    fed to the array in the same form compute_relative_delay_times reports
+    them (each element's lead over element 0), then converted to angles with
+    the same formula as compute_pinger_direction3.
+    """
+    toa_dists = elem_dist[0] - elem_dist
+    (a, b) = array.compute_ab(toa_dists, pairs=[PAIR_AB, PAIR_CD])
+    angles = -np.arctan2(b, a) * 180 / np.pi + 90
+
+    return (angles[0], angles[1])
+
+
+def wrap_error(measured, expected):
+    return (measured - expected + 180) % 360 - 180
+
+
+def run_point(point):
+    """Runs one sweep point. Returns a result row (see RESULT_HEADER)."""
+    rng = np.random.RandomState(point['seed'])
+    timer = Stage_Timer()
+
+    # Fresh pipeline, configured for this point
+    config = acoustics.config
+    config.set('Acoustics', 'pinger_frequency', repr(point['pinger_frequency']))
+
+    # Start from the competition preset, then apply the point's settings
+    ac = acoustics.Acoustics()
+    ac.preset(0)
+    ac.adc.update_sample_rate(point['sample_rate'])
+    ac.adc.set_sample_len(point['sample_length'])
+    ac.pinger_freq = point['pinger_frequency']
+    ac.max_captures = 1
+    d = point['array_spacing']
+    ac.array.define(hydrophones.generate_yaw_pitch_dual_array_definition(d, d))
+
+    # Synthetic captures, closed loop with the pipeline's gain control
+    pinger = source.Pinger()
+    gen = Capture_Generator(ac.array, pinger, filt=ac.filt, seed=point['seed'])
+    gen.freq = point['pinger_frequency']
+    gen.snr_db = point['snr_db']
+    gen.burst = timer.wrap('synth', gen.burst)
+    ac.adc.sim_attach(gen)
+
+    # Stage instrumentation
+    ac.get_data = timer.wrap('capture', ac.get_data)
+    ac.array.get_direction = timer.wrap('direction', ac.array.get_direction)
+    update_measurement = timer.wrap('total', ac.update_measurement)
+    compute_relative_delay_times = get_heading.compute_relative_delay_times
+    get_heading.compute_relative_delay_times = timer.wrap('tdoa', compute_relative_delay_times)
+
+    reference = hydrophones.Array()
+    reference.define(ac.array.element_pos)
+
+    errors = {'ab': [], 'cd': []}
+    detections = 0
+    try:
+        for trial in range(-point['warmup'], point['trials']):
+            if trial == 0:
+                # the first few trials just let the gain control settle
+                timer.reset()
+
+            # Pinger at a random bearing in front of the array, slightly below
+            az = rng.uniform(-np.radians(point['max_bearing']), np.radians(point['max_bearing']))
+            r = point['range']
+            pinger.position = np.array([[r * np.sin(az), r * np.cos(az), -point['depth']]])
+
+            update_occured = update_measurement()
+            if trial < 0 or not update_occured:
+                continue
+            detections += 1
+
+            result = ac.get_last_measurement()[0]
+            elem_dist = np.linalg.norm(gen.element_positions()[0] - pinger.position, axis=1)
+            (ref_ab, ref_cd) = reference_headings(reference, elem_dist)
+
+            errors['ab'].append(wrap_error(result['ab'], ref_ab))
+            if result.get('cd', None) is not None:
+                errors['cd'].append(wrap_error(result['cd'], ref_cd))
+    finally:
+        get_heading.compute_relative_delay_times = compute_relative_delay_times
+
+    # Aggregate
+    row = [point_key(point)] + [point[name] for name in PARAM_NAMES]
+    row += [point['trials'], detections / float(point['trials'])]
+    for pair in ['ab', 'cd']:
+        e = np.array(errors[pair])
+        if e.size:
+            row += [np.mean(e), np.std(e), np.sqrt(np.mean(e**2))]
+        else:
+            row += [np.nan] * 3
+    row += [1000 * timer.totals[stage] / point['trials'] for stage in STAGES]
+
+    return row
+
+
+def init_worker(verbose):
+    # The pipeline is very chatty. Keep the sweep's own output readable.
+    if not verbose:
+        sys.stdout = open(os.devnull, 'w')
+
+
+def run_and_cache(task):
+    (point, cache_fp) = task
+    row = run_point(point)
+
+    # write to a temp file first, so a killed sweep never leaves a
+    # truncated entry behind
+    with open(cache_fp + '.tmp', 'w') as f:
+        json.dump(row, f)
+    os.rename(cache_fp + '.tmp', cache_fp)
+
+    return row
+
+
+def load_cached(cache_fp):
+    try:
+        with open(cache_fp, 'r') as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return None
+
+
+def make_points(args):
+    points = []
+    for values in itertools.product(args.spacing, args.freq, args.snr, args.fs, args.length):
+        point = dict(zip(PARAM_NAMES, values))
+        point['sample_length'] = int(point['sample_length'])
+        point['trials'] = args.trials
+        point['seed'] = args.seed
+        point['range'] = args.range
+        point['depth'] = args.depth
+        point['max_bearing'] = args.max_bearing
+        point['warmup'] = args.warmup
+        points.append(point)
+
+    return points
+
+
+def main(argv=None):
+    config = acoustics.config
+    parser = argparse.ArgumentParser(description="Monte Carlo sweep of the acoustics pipeline.")
+    parser.add_argument('--spacing', type=float, nargs='+',
+                        default=[config.getfloat('Acoustics', 'array_spacing')], help="array spacing (m)")
+    parser.add_argument('--freq', type=float, nargs='+',
+                        default=[config.getfloat('Acoustics', 'pinger_frequency')], help="pinger frequency (Hz)")
+    parser.add_argument('--snr', type=float, nargs='+', default=[20.0], help="SNR (dB)")
+    parser.add_argument('--fs', type=float, nargs='+', default=[300e3], help="sample rate (Hz)")
+    parser.add_argument('--length', type=float, nargs='+', default=[1000], help="sample length")
+    parser.add_argument('-n', '--trials', type=int, default=100, help="trials per point")
+    parser.add_argument('--range', type=float, default=10.0, help="pinger range (m)")
+    parser.add_argument('--depth', type=float, default=1.0, help="pinger depth below the array (m)")
+    parser.add_argument('--max-bearing', type=float, default=60.0, help="max pinger bearing (deg)")
+    parser.add_argument('--warmup', type=int, default=5, help="uncounted trials to settle the gain")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--out', default='sweep_results.csv', help="results table")
+    parser.add_argument('--cache', default=os.path.join(acoustics.LOG_DIR, 'sweep_cache'))
+    parser.add_argument('-w', '--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('-v', '--verbose', action='store_true', help="show pipeline output")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.cache):
+        os.makedirs(args.cache)
+
+    # Split the grid into cached and outstanding points
+    points = make_points(args)
+    rows = {}
+    tasks = []
+    for point in points:
+        key = point_key(point)
+        cache_fp = os.path.join(args.cache, key + '.json')
+        row = load_cached(cache_fp)
+        if row is None:
+            tasks.append((point, cache_fp))
+        else:
+            rows[key] = row
+
+    print("sweep: %d points, %d cached, %d to run across %d workers"
+          % (len(points), len(rows), len(tasks), args.workers))
+
+    start = time.time()
+    if tasks:
+        pool = multiprocessing.Pool(args.workers, initializer=init_worker, initargs=(args.verbose,))
+        try:
+            for (i, row) in enumerate(pool.imap_unordered(run_and_cache, tasks)):
+                rows[row[0]] = row
+                print("sweep: %d/%d points done (%.1fs)" % (i + 1, len(tasks), time.time() - start))
+        finally:
+            pool.close()
+            pool.join()
+
+    # Results table, in grid order
+    with open(args.out, 'wb') as f:
+        writer = csv.writer(f)
+        writer.writerow(RESULT_HEADER)
+        for point in points:
+            writer.writerow(rows[point_key(point)])
+
+    print("sweep: done in %.1fs. Results written to %s" % (time.time() - start, args.out))
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 import logging
 
 import get_heading
+import bearing_tracker
 from bbb import boot
 
 #20 = info logging level
@@ -14,6 +15,7 @@ def main(adc, plt=None):
 
     # Establish various parameters
     fs = adc.sample_rate
+    tracker = bearing_tracker.Bearing_Tracker()
 
     # Arm the ADC
     adc.ready_pruss_for_burst()
@@ -28,8 +30,14 @@ def main(adc, plt=None):
             # process simultaneous channels
             angle = get_heading.calculate_heading(TARGET_FREQ, fs, y[0], y[1])
 
+            # fuse it with the previous ones
+            if not tracker.update(angle):
+                logging.info("measured %d degrees right, an outlier" % angle)
+                continue
+
             # print computation to the user
-            logging.info("pinger is %d degrees right" % angle)
+            (heading, std) = tracker.get_heading()
+            logging.info("pinger is %d +/- %d degrees right (measured %d)" % (heading, std, angle))
 
         except KeyboardInterrupt:
             print("Quitting program")
@@ -0,0 +1,118 @@
+"""Locates the pinger from bearings taken at different robot positions.
+
+Every bearing says the pinger sits somewhere on a ray from the robot's
+position p along the world frame direction u. The pinger position x that
+best fits all of the rays (least squares on the distance of x to each ray)
+solves
+
+    sum(w (I - u u^T)) x = sum(w (I - u u^T) p)
+
+(I - u u^T removes the part of a vector along u). The two sums, the
+information matrix and vector, are all that needs to be kept: adding a
+bearing is a rank one update, and solving for the position is a 3x3 solve,
+no matter how many bearings came before.
+
+Each ray is weighted by the inverse variance of its bearing (rad**-2). A
+bearing error moves the ray by range * error at the pinger, so the inverse
+of the information matrix, scaled by the squared range, is the covariance
+of the position (m**2). The range is taken from the weighted centroid of
+the robot positions, which is kept alongside the sums.
+
+Like any least squares fit to rays, the estimate is pulled towards the
+robot when the rays meet at a shallow angle. It's only as good as the
+spread of the bearings, which the covariance reflects.
+
+Bearings without an elevation only constrain x and y. Until some bearing
+has an elevation, depth is left out of the estimate.
+"""
+import numpy as np
+
+# Closest range (m) used to scale the covariance
+MIN_RANGE = 1.0
+
+# Minimum angle (deg) between bearings for them to pin down a position.
+# Parallel rays (eg. all taken along the line towards the pinger) only give
+# a direction.
+MIN_SPREAD = 5.0
+
+
+class Pinger_Triangulator(object):
+    """Incremental least squares fit of the pinger position to bearings.
+    See the module docstring.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.info = np.zeros((3, 3))  # information matrix
+        self.info_vect = np.zeros(3)  # information vector
+        self.weight_sum = 0.0
+        self.weighted_pos = np.zeros(3)  # for the centroid of the robot positions
+        self.n_bearings = 0
+
+    # ####################################
+    # ### Inputs #########################
+    # ####################################
+    def add_bearing(self, position, az, el=None, std=1.0):
+        """Adds a bearing taken at position (world frame, meters).
+
+        ARGS:
+            * position: (x, y, z) of the array.
+            * az: world frame azimuth of the pinger (deg, clockwise from
+            the y axis).
+            * el: elevation of the pinger (deg, above the horizon). If
+            None, only x and y are constrained.
+            * std: uncertainty of the bearing (deg).
+        """
+        p = np.asarray(position, dtype=float)
+        az = np.radians(az)
+        if el is None:
+            u = np.array([np.sin(az), np.cos(az), 0.0])
+            proj = np.diag([1.0, 1.0, 0.0]) - np.outer(u, u)
+        else:
+            el = np.radians(el)
+            u = np.array([np.cos(el) * np.sin(az), np.cos(el) * np.cos(az), np.sin(el)])
+            proj = np.eye(3) - np.outer(u, u)
+
+        w = 1.0 / np.radians(std)**2
+        self.info += w * proj
+        self.info_vect += w * np.dot(proj, p)
+        self.weight_sum += w
+        self.weighted_pos += w * p
+        self.n_bearings += 1
+
+    # ####################################
+    # ### Output #########################
+    # ####################################
+    def get_position(self):
+        """Returns (position, covariance): the pinger position (meters) and
+        its 3x3 covariance (m**2). Depth is nan (and its variance inf)
+        until a bearing with an elevation comes in. Returns (None, None)
+        until the bearings spread out enough to locate the pinger.
+        """
+        # Depth is only observable once something constrains it
+        if self.info[2, 2] > 0:
+            axes = [0, 1, 2]
+        else:
+            axes = [0, 1]
+        info = self.info[np.ix_(axes, axes)]
+
+        # The information matrix is the weighted sum of projections across
+        # the rays. Its smallest eigenvalue relative to the largest stays
+        # near 0 while the rays are close to parallel (for two equally
+        # weighted rays theta apart, the ratio is about tan(theta/2)**2).
+        eig = np.linalg.eigvalsh(info)
+        if eig[-1] <= 0 or eig[0] / eig[-1] < np.tan(np.radians(MIN_SPREAD) / 2)**2:
+            return (None, None)
+
+        position = np.full(3, np.nan)
+        inv = np.linalg.inv(info)
+        position[axes] = np.dot(inv, self.info_vect[axes])
+
+        centroid = self.weighted_pos / self.weight_sum
+        r = max(np.linalg.norm(position[axes] - centroid[axes]), MIN_RANGE)
+        covariance = np.diag([np.inf] * 3)
+        covariance[np.ix_(axes, axes)] = r**2 * inv
+
+        return (position, covariance)
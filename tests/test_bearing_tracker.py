@@ -0,0 +1,48 @@
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../pinger_finder'))
+
+import bearing_tracker
+
+# Pinger bearing in the world frame (deg, clockwise)
+PINGER = 30.0
+
+
+def measure(yaw):
+    """Result of a 2 element capture (only 'ab', which is counterclockwise)
+    with the robot at yaw (deg, clockwise)."""
+    return {'ab': -bearing_tracker.wrap_angle(PINGER - yaw)}
+
+
+def test_turn():
+    # Robot turns right by 5 degrees between pings, for 60 degrees
+    tracker = bearing_tracker.Bearing_Tracker()
+    for n in range(13):
+        (yaw, t) = (5.0 * n, float(n))
+        tracker.update_yaw(yaw, t=t)
+        heading = bearing_tracker.measured_heading(measure(yaw))
+        assert tracker.update(heading, t=t)
+
+        # the tracked heading follows the turn
+        (heading, std) = tracker.get_heading(t)
+        assert abs(heading - (PINGER - yaw)) < 1e-6
+
+    # Pinger is now 30 degrees to the left
+    assert abs(heading + 30.0) < 1e-6
+
+
+def test_turn_between_pings():
+    # The served heading follows the yaw rate with no new measurement
+    tracker = bearing_tracker.Bearing_Tracker()
+    tracker.update_yaw(0.0, t=0.0)
+    tracker.update(bearing_tracker.measured_heading(measure(0.0)), t=0.0)
+
+    tracker.update_yaw(10.0, yaw_rate=20.0, t=1.0)
+    (heading, std) = tracker.get_heading(2.0)
+    assert abs(heading - (PINGER - 30.0)) < 1e-6
+
+
+if __name__ == '__main__':
+    test_turn()
+    test_turn_between_pings()
+    print("test_bearing_tracker: passed")
@@ -19,8 +19,6 @@ class ADS7865:
         m = np.arange(new_len)
 
         # sample the signals
-        y_adc = np.zeros((len(y), samp_sel.size))
-        for i in range(len(y)):
-            y_adc[i] = y[i][samp_sel]
+        y_adc = np.asarray(y)[:, samp_sel]
 
         return y_adc
@@ -7,43 +7,22 @@ def Isolate(y):
     buf = 0
     thr = 0.02
 
-    # Initialize parameters for start point
-    v = 0
-    m = -1
-
-    # Compute start point
-    while v < thr:
-        m += 1
-        v = y[m]
-    start = m - buf
-
-    # Initialize parameters for end point
-    v = 0
-    m = y.size
-
-    # Compute endpoint
-    while v < thr:
-        m -= 1
-        v = y[m]
-    end = m + buf
+    # Find the first and last samples that reach the threshold
+    above = np.nonzero(y >= thr)[0]
+    if above.size == 0:
+        raise ValueError("Isolate: signal never reaches the %g threshold" % thr)
+
+    start = above[0] - buf
+    end = above[-1] + buf
 
     return (start, end)
 
 
 def FFT(x, fs):
-    # Initialize parameters
-    M = x.size
-    Theta_s = 2 * np.pi / M
-    X = [0] * M
-    for k in range(M):
-        DFT = 0
-        for m in range(M):
-            a = x[m] * np.exp(1j * m * Theta_s * k)
-            DFT += a
-
-        X[k] = DFT / M
-
-    return X
+    """DFT of x, scaled by 1/M. Uses the exp(+j...) kernel of the original
+    O(M^2) implementation, which is exactly numpy's inverse FFT.
+    """
+    return np.fft.ifft(x)
 
 
 class BBB:
@@ -51,16 +30,14 @@ class BBB:
     def __init__(self):
         pass
 
-    def Vectorize1(self, y, fs, target_freq):
-        n = y.shape[0]  # n elements/channels
-        y_slice = [0] * n
-        Y = [0] * n
-
-        # Let's see if we can get the ball rolling by obtaining the phase of just one channel
+    def Vectorize1(self, y, fs, target_freq, plot=True):
+        """Measures the phase of every channel at target_freq. Channels are
+        sliced to the pulse (as detected on channel 0) and transformed in
+        one call. Returns the phases in degrees."""
         # Slice channels to particular length based on pulse length
         (start, end) = Isolate(y[0])
-        y_slice[0] = y[0][start:end]
-        M = y_slice[0].size
+        y_slice = np.asarray(y)[:, start:end]
+        M = y_slice.shape[1]
 
         # Generate dft related parameters
         f_delta = fs / M
@@ -70,17 +47,18 @@ class BBB:
         print("bin size is %dHz. That means that the you can inspect the component from %gHz to %gHz."
               % (f_delta, f_start, f_stop))
 
-        # Compute Freq spectrum
-        Y[0] = FFT(y_slice[0], fs)
+        # Compute Freq spectrum of every channel
+        Y = FFT(y_slice, fs)
 
         # Plot Freq spectrum
-        f, ax = plt.subplots(1, sharex=True)
-        ax.plot(np.arange(M) * f_delta, np.absolute(Y[0]))
-        ax.set_title('Freq Spec for sliced pulse')
+        if plot:
+            f, ax = plt.subplots(1, sharex=True)
+            ax.plot(np.arange(M) * f_delta, np.absolute(Y[0]))
+            ax.set_title('Freq Spec for sliced pulse')
 
         # measure phase
-        theta = np.angle(Y[0][fbin_target], deg=True)
+        theta = np.angle(Y[:, fbin_target], deg=True)
 
-        print("Phase = %d degrees." % theta)
+        print("Phase = %s degrees." % theta)
 
-        # Determine phase of 22khz signal
+        return theta
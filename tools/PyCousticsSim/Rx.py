@@ -1,6 +1,34 @@
 import numpy as np
 
 
+def FracDelay(x, fs, delay, taps=32):
+    """ Delays the sampled signal x by delay seconds, which need not be a
+    whole number of samples. The fractional part is applied with a
+    Blackman windowed-sinc interpolator of length taps, the integer part
+    with a shift. Samples shifted in from before the start are zero.
+    """
+    # Split delay into whole and fractional samples
+    D = delay * fs
+    n = int(np.floor(D))
+    frac = D - n
+
+    # Build the interpolator, centered on the fractional delay
+    k = np.arange(-(taps // 2) + 1, taps // 2 + 1)
+    u = (k - frac) / taps
+    window = 0.42 + 0.5 * np.cos(2 * np.pi * u) + 0.08 * np.cos(4 * np.pi * u)
+    h = np.sinc(k - frac) * window
+
+    # Apply the fractional part, keeping y aligned with x
+    y_frac = np.convolve(x, h)[-k[0]:-k[0] + x.size]
+
+    # Apply the integer part
+    y = np.zeros(x.size)
+    if n < x.size:
+        y[n:] = y_frac[:x.size - n]
+
+    return y
+
+
 class BiHydrophoneArray:
 
     def __init__(self):
@@ -30,22 +58,45 @@ class BiHydrophoneArray:
             print("BuildArray: Something went wrong")
             exit(1)
 
+    def Delays(self):
+        """ Returns the propagation delay (sec) from the source to each
+        hydrophone.
+        """
+        dist = np.linalg.norm(np.array(self.Hyd_loc) - self.src_loc, axis=1)  # meters
+        return dist / self.mediumModel.c
+
+    def CaptureDirect(self, x, t, channelModel):
+        """ Like Capture, but t is the ADC's own time base, so there is no
+        need for a fine analog time base. Delays keep their sub-sample
+        accuracy. x is either:
+            * a function of time (eg. lambda t: SG.Sin(f, t)), which is
+            evaluated in closed form at the delayed sample times. Best
+            for narrowband pulses.
+            * an arbitrary waveform sampled on t, which is delayed with a
+            windowed-sinc interpolator (see FracDelay).
+        """
+        tau = self.Delays()  # sec
+
+        # Check for fold-over... for diagnostic purposes
+        if tau[0] - tau[1] > self.maxSpread:
+            print("Rx: Warning! Fold-over has occured!")
+
+        if callable(x):
+            return x(t[np.newaxis, :] - tau[:, np.newaxis])
+
+        fs = 1 / (t[1] - t[0])
+        return np.array([FracDelay(x, fs, d) for d in tau])
+
     def Capture(self, x, t, channelModel):
         # Initialize placeholders
-        coor_system = 2
         n = self.n_elements
-        dist = [0] * n  # meters
-        DM = [0] * n  # samples
-        y = [0] * n
-        for i in range(n):
-            y[i] = np.zeros(t.size)  # [placeholder]
+        y = np.zeros((n, t.size))
 
         # Initialize constants
         dt = t[1] - t[0]  # sec
 
         # Compute distance of pinger to hydrophone
-        for i in range(n):
-            dist[i] = np.linalg.norm(self.Hyd_loc[i] - self.src_loc)
+        dist = self.Delays() * self.mediumModel.c  # meters
 
         # Compute TDOA just for diagnostic purposes
         timeDiff = (dist[0] - dist[1]) / self.mediumModel.c
@@ -59,14 +110,12 @@ class BiHydrophoneArray:
                   % dm)
 
         # Check is delay is too long
-        if (4 * dist[0] / self.mediumModel.c > t[-1] - t[0]) or (4 * dist[1] / self.mediumModel.c > t[-1] - t[0]):
+        if np.any(4 * dist / self.mediumModel.c > t[-1] - t[0]):
             print("Rx: Warning! Delay may be too large and may clip time. please increase time span or reduce delay.")
 
+        # Delay each channel by a whole number of samples
+        DM = (dist / self.mediumModel.c / dt).astype(int)  # samples
         for el in range(n):
-            # compute data for hydrophone 0
-            DM[el] = int(dist[el] / self.mediumModel.c / dt)
-            for i in range(DM[el], t.size):
-                m = t.size - i
-                y[el][m] = x[m - DM[el]]
+            y[el][DM[el]:] = x[:t.size - DM[el]]
 
         return y
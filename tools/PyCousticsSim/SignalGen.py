@@ -11,21 +11,16 @@ class SG:
 
     def Sin(self, f, t):
         """ Delivers a sinusoidal pulse of set length based on a starting time
-        and an end time.
+        and an end time. t may be of any shape, so a delayed copy of the
+        pulse can be evaluated directly on a sample grid, eg:
+        SG.Sin(f, t[np.newaxis, :] - delays[:, np.newaxis]).
         """
         # Initialize constants
         pi = np.pi
         w = 2 * pi * f
 
         # Initialize base array [0,0,0...1,1,1...0,0,0]
-        base = np.ones(t.size)
-        for i in range(t.size):
-            if t[i] < self.tstart:
-                base[i] = 0
-            elif t[i] > self.tend:
-                base[i] = 0
-            else:
-                pass
+        base = ((t >= self.tstart) & (t <= self.tend)).astype(float)
 
         # Create pulse by masking sinusoid with base array.
         y = np.sin(w * t - pi) * base
@@ -2,6 +2,9 @@
 Major data structs:
     * env: Contains data about the environment... primarily anything related
     to time. list of variables include
+        mode - 'analog' simulates a fine analog time base and decimates
+        it in the ADC. 'direct' synthesizes samples at the ADC rate with
+        fractional delays (much cheaper, see Rx.CaptureDirect).
         df -
         dt -
         t_start -
@@ -45,7 +48,9 @@ print('-' * 50)
 env = {}
 sig = {}
 
-env['df'] = 30e6  # Hz
+env['mode'] = 'direct'
+env['fs_adc'] = 400e3  # Hz
+env['df'] = 30e6 if env['mode'] == 'analog' else env['fs_adc']  # Hz
 env['dt'] = 1 / env['df']
 env['t_start'] = -1e-3  # seconds
 env['t_end'] = 40e-3  # seconds
@@ -70,7 +75,6 @@ SG.tstart = 0  # sec
 SG.tend = 1e-3  # sec
 
 # Generate the test signal
-import pdb; pdb.set_trace()
 sig['x'] = SG.Sin(sig['f'], env['t'])
 print("Diagnostics: %gkHz test signal. Current config yields %g samples per period."
       % (sig['f'] / 1000, env['df'] / sig['f']))
@@ -111,7 +115,10 @@ print("""Rx: There are %d hydrophones in this array. Hydrophone0 is located
 
 
 # Compute the data capture for each channel
-sig['group'] = HY.Capture(sig['x'], env['t'], MD)
+if env['mode'] == 'analog':
+    sig['group'] = HY.Capture(sig['x'], env['t'], MD)
+else:
+    sig['group'] = HY.CaptureDirect(lambda t: SG.Sin(sig['f'], t), env['t'], MD)
 
 # Plot the data so far
 f1, ax = plt.subplots(2, sharex=True)
@@ -126,8 +133,12 @@ ax[1].plot(env['t'], sig['group'][1])
 #################################################
 ADC = ADC.ADS7865()
 
-ADC.fs = 400e3  # Sample Rate Hz
-sig['group_adc'] = ADC.Sample(sig['group'], env['t'])
+ADC.fs = env['fs_adc']  # Sample Rate Hz
+if env['mode'] == 'analog':
+    sig['group_adc'] = ADC.Sample(sig['group'], env['t'])
+else:
+    # already synthesized at the ADC rate
+    sig['group_adc'] = sig['group']
 
 f2, ax = plt.subplots()
 ax.plot(sig['group_adc'][0])
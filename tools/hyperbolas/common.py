@@ -13,23 +13,23 @@ def hyperbola(a, b):
     return (x, y)
 
 
-def hyperbolaCOE(c, del_t, v_medium):
+def hyperbolaCOE(c, del_t, v_medium, verbose=True):
     # Compute a
     del_d = del_t * v_medium
     a = del_d / 2
 
     # check for error
     if a > c:
-        print("hyperbolaCOE: ERROR. Your a, --%.1fcm--, is greater than c, --%.1fcm--. Please reduce time delay or increase element spacing."
-              % (a * 100, c * 100))
-        exit(1)
+        raise ValueError("hyperbolaCOE: Your a, --%.1fcm--, is greater than c, --%.1fcm--. Please reduce time delay or increase element spacing."
+                         % (a * 100, c * 100))
 
     # Compute b
     b = np.sqrt(c**2 - a**2)
 
     # Explain and return
-    print("""hyperbolaCOE: I see you have a measured time delay of %.1f microseconds and the speed of sound in your medium is %d m/s. Given that your elements are %.1f cm appart, then a = %.1fcm, and b = %.1fcm."""
-          % (del_t * 1e6, v_medium, 2 * c * 100, a * 100, b * 100))
+    if verbose:
+        print("""hyperbolaCOE: I see you have a measured time delay of %.1f microseconds and the speed of sound in your medium is %d m/s. Given that your elements are %.1f cm appart, then a = %.1fcm, and b = %.1fcm."""
+              % (del_t * 1e6, v_medium, 2 * c * 100, a * 100, b * 100))
     return (a, b)
 
 
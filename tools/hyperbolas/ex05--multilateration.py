@@ -0,0 +1,84 @@
+import time
+import numpy as np
+
+from .common import get_focii, hyperbola, hyperbolaCOE, xform_rotate, xform_translate
+from .multilateration import locate, range_differences
+
+v = 1473  # Speed of sound in the medium (m/s)
+noise = 0.1e-6  # std of the tdoa measurements (seconds)
+
+
+def hyperbola_locate(bs, tdoa, v):
+    """The approach of the other examples, taken to a position: build the
+    hyperbola of the (0, 1) station pair, like go() in ex04, and pick its
+    point that agrees best with the TDOAs of the other stations.
+    """
+    x = 0
+    y = 1
+
+    # Pair geometry
+    el = [bs[0], bs[1]]
+    COM_i = (el[0] + el[1]) / 2
+    tangent_i = el[1] - el[0]
+    rot_i = np.arctan2(tangent_i[y], tangent_i[x])
+    d = np.linalg.norm(el[1] - el[0])
+    c = get_focii(d)
+
+    positions = []
+    for row in tdoa:
+        # D1 - D2 of ex04 is minus the lead of station 1 over station 0
+        del_t = -row[0]
+        r_bit = 1 if del_t >= 0 else -1
+        try:
+            (a, b) = hyperbolaCOE(c, abs(del_t), v, verbose=False)
+        except ValueError:
+            # noise pushed the range difference past the station spacing
+            positions.append([np.nan, np.nan])
+            continue
+
+        hbla_o = np.vstack(hyperbola(a, b)) * np.array([[r_bit], [1]])
+        hbla_o = xform_rotate(hbla_o, rot_i)
+        hbla_i = xform_translate(hbla_o, COM_i[x], COM_i[y])
+
+        # Point that fits every tdoa best
+        misfit = np.sum((range_differences(bs, hbla_i.T) - row * v)**2, axis=1)
+        positions.append(hbla_i[:, np.argmin(misfit)])
+
+    return np.array(positions)
+
+
+def report(name, src, positions, seconds):
+    err = np.linalg.norm(positions - src, axis=1)
+    print("%-22s %8.3f ms/source   median error %6.2f cm   p90 %6.2f cm   failed %d"
+          % (name, seconds * 1e3 / len(src), np.nanmedian(err) * 100,
+             np.nanpercentile(err, 90) * 100, np.sum(np.isnan(err))))
+
+
+def main():
+    rng = np.random.RandomState(0)
+
+    # 4 base stations on a 50cm circle, sources within the 2m zoom of ex04
+    rot = np.pi / 2
+    Hyd = [np.array([0, 50e-2])]  # Hydrophone #1 location (meters)
+    for i in range(3):
+        Hyd.append(xform_rotate(Hyd[-1], rot))
+    bs = np.array(Hyd)
+
+    n_slow = 20
+    n_fast = 10000
+    src = rng.uniform(-2, 2, (n_fast, 2))
+    tdoa = range_differences(bs, src) / v + rng.randn(n_fast, len(bs) - 1) * noise
+
+    # Hyperbolas: a few sources is plenty to time it
+    start = time.time()
+    positions = hyperbola_locate(bs, tdoa[:n_slow], v)
+    report("sampled hyperbola", src[:n_slow], positions, time.time() - start)
+
+    # Closed form, batched over every source at once
+    start = time.time()
+    (positions, residuals) = locate(bs, tdoa, v, noise)
+    report("closed form (batched)", src, positions, time.time() - start)
+    print("median residual: %.2f mm" % (np.median(residuals) * 1000))
+
+print("-" * 50)
+main()
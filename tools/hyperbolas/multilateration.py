@@ -0,0 +1,190 @@
+"""Closed form TDOA multilateration.
+
+Locates sources from the time differences of arrival (TDOA) of their
+signal at a set of base stations, relative to station 0. Each TDOA puts
+the source on one of the hyperbolas the other examples plot; rather than
+sampling them and looking for where they cross, the position is solved for
+directly, following Chan & Ho ("A simple and efficient estimator for
+hyperbolic location", 1994):
+
+    1. With d0 the (unknown) distance from the source to station 0, and
+    coordinates relative to station 0, the squared range equations become
+    linear in (x, d0):
+
+        -2 s_i.x - 2 r_i d0 = r_i^2 - |s_i|^2
+
+    where s_i is station i and r_i = v * tdoa_i its range difference. This
+    is solved by weighted least squares, twice: the second time weighted by
+    the ranges the first pass found.
+
+    2. x and d0 aren't independent (d0 = |x|). A second, small weighted
+    least squares on the squares of the first step's unknowns enforces it.
+
+With as many equations as unknowns in step 1 (eg. 3 stations in 2D),
+there's no room for least squares: x is solved as a linear function of d0
+instead, and d0 as the root of d0 = |x(d0)|.
+
+Everything is batched: TDOAs come in as (n, n_stations - 1) arrays, one
+row per source position (or time step), and each step is a stack of small
+linear solves. Nothing raises on bad geometry or data either; instead every
+source gets a residual (rms misfit of its range differences, meters), and
+sources that couldn't be solved get nan.
+"""
+import numpy as np
+
+
+def range_differences(stations, sources):
+    """Returns the range differences (m) between each station and station
+    0, for each source: an (n, n_stations - 1) array. Divide by the speed
+    of sound for TDOAs.
+
+    ARGS:
+        * stations: (n_stations, dim) base station positions.
+        * sources: (n, dim) source positions.
+    """
+    stations = np.asarray(stations, dtype=float)
+    sources = np.atleast_2d(np.asarray(sources, dtype=float))
+    d = np.linalg.norm(sources[:, np.newaxis, :] - stations[np.newaxis], axis=2)
+
+    return d[:, 1:] - d[:, 0:1]
+
+
+def get_residuals(stations, positions, r):
+    """Returns the rms misfit (m) between the range differences r and the
+    ones of positions. nan where a position is nan."""
+    return np.sqrt(np.mean((range_differences(stations, positions) - r)**2, axis=1))
+
+
+def locate(stations, tdoa, v, sigma=1.0):
+    """Locates a batch of sources from their TDOAs. See the module
+    docstring.
+
+    ARGS:
+        * stations: (n_stations, dim) base station positions (m), dim 2 or 3.
+        * tdoa: (n, n_stations - 1) arrival time of each station minus the
+        one of station 0 (sec), for n sources. A single (n_stations - 1,)
+        row works as well.
+        * v: propagation speed (m/s).
+        * sigma: std of the tdoa measurements. Only matters relative to
+        each other if given per station (shape (n_stations - 1,)).
+
+    Returns (positions, residuals): (n, dim) positions and their (n,) rms
+    range difference misfit (m).
+    """
+    stations = np.asarray(stations, dtype=float)
+    (n_stations, dim) = stations.shape
+    tdoa = np.asarray(tdoa, dtype=float)
+    single = (tdoa.ndim == 1)
+    r = np.atleast_2d(tdoa) * v
+    if r.shape[1] != n_stations - 1:
+        raise ValueError("locate: expected %d tdoas per source, got %d."
+                         % (n_stations - 1, r.shape[1]))
+    if n_stations < dim + 1:
+        raise ValueError("locate: %d stations can't locate a source in %dD."
+                         % (n_stations, dim))
+
+    # Coordinates relative to station 0
+    s = stations[1:] - stations[0]
+
+    # Noise of range differences that share the same reference
+    sigma = np.broadcast_to(np.asarray(sigma, dtype=float) * v, (n_stations - 1,))
+    Q = np.diag(sigma**2) / 2.0 + np.outer(sigma, sigma) / 2.0
+
+    if n_stations == dim + 1:
+        x = solve_minimal(s, r)
+    else:
+        x = solve_chan(s, r, Q)
+
+    positions = x + stations[0]
+    residuals = get_residuals(stations, positions, r)
+
+    if single:
+        return (positions[0], residuals[0])
+    return (positions, residuals)
+
+
+def solve_minimal(s, r):
+    """Exactly determined case: dim range difference equations for the dim
+    coordinates of each source (relative to station 0). x = p + q * d0 from
+    the linear system, then d0 from |x|^2 = d0^2."""
+    (n, m) = r.shape
+    G = -2 * s  # (m, dim), the same for every source
+    h = r**2 - np.sum(s**2, axis=1)  # (n, m)
+
+    try:
+        G_inv = np.linalg.inv(G)
+    except np.linalg.LinAlgError:
+        return np.full((n, s.shape[1]), np.nan)
+    p = np.dot(h, G_inv.T)  # (n, dim)
+    q = np.dot(2 * r, G_inv.T)
+
+    # |p + q d0|^2 = d0^2
+    a = np.sum(q**2, axis=1) - 1
+    b = 2 * np.sum(p * q, axis=1)
+    c = np.sum(p**2, axis=1)
+    disc = np.sqrt(np.maximum(b**2 - 4 * a * c, 0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        roots = np.column_stack(((-b + disc) / (2 * a), (-b - disc) / (2 * a)))
+        roots = np.where(np.abs(a)[:, np.newaxis] < 1e-12, (-c / b)[:, np.newaxis], roots)
+
+    # Only a positive distance makes sense. If both are, the data can't
+    # tell them apart; take the closer source.
+    roots = np.where(roots >= 0, roots, np.inf)
+    d0 = np.min(roots, axis=1)
+    d0 = np.where(np.isfinite(d0), d0, np.nan)
+
+    return p + q * d0[:, np.newaxis]
+
+
+def solve_chan(s, r, Q):
+    """Over determined case: Chan's two step weighted least squares. Returns
+    (n, dim) positions relative to station 0."""
+    (n, m) = r.shape
+    dim = s.shape[1]
+    Q_inv = np.linalg.inv(Q)
+
+    # Step 1: theta = (x, d0). G differs per source through r.
+    G = np.concatenate((np.broadcast_to(-2 * s, (n, m, dim)), -2 * r[:, :, np.newaxis]), axis=2)
+    h = r**2 - np.sum(s**2, axis=1)
+
+    W = np.broadcast_to(Q_inv, (n, m, m))
+    theta = wls(G, h, W)
+    if np.any(np.isfinite(theta)):
+        # Reweight by the ranges to each station (other than station 0)
+        d = np.linalg.norm(theta[:, np.newaxis, :dim] - s[np.newaxis], axis=2)
+        B_inv = 1.0 / np.maximum(d, 1e-9)
+        W = B_inv[:, :, np.newaxis] * Q_inv * B_inv[:, np.newaxis, :]
+        theta = wls(G, h, W)
+    step1 = theta[:, :dim]
+
+    # Step 2: the squares of theta, constrained so that d0^2 = |x|^2
+    cov_inv = np.einsum('nmi,nmk,nkj->nij', G, W, G)
+    B2_inv = 1.0 / np.where(np.abs(theta) > 1e-9, theta, 1e-9)
+    W2 = B2_inv[:, :, np.newaxis] * cov_inv * B2_inv[:, np.newaxis, :]
+    G2 = np.broadcast_to(np.vstack((np.eye(dim), np.ones(dim))), (n, dim + 1, dim))
+    z = wls(G2, theta**2, W2)
+    step2 = np.sign(step1) * np.sqrt(np.abs(z))
+
+    # Step 2 can't recover from a step 1 that got the sign of a coordinate
+    # wrong (or left it near 0). Keep whichever fits the data better.
+    res1 = get_residuals(np.vstack((np.zeros(dim), s)), step1, r)
+    res2 = get_residuals(np.vstack((np.zeros(dim), s)), step2, r)
+    better = np.isfinite(res2) & ~(res2 > res1)
+
+    return np.where(better[:, np.newaxis], step2, step1)
+
+
+def wls(G, h, W):
+    """Batched weighted least squares: solves (G^T W G) x = G^T W h for each
+    stacked G (n, m, k), h (n, m) and W (n, m, m). Rows that can't be
+    solved come back nan."""
+    GtW = np.einsum('nmi,nmk->nik', G, W)
+    A = np.einsum('nik,nkj->nij', GtW, G)
+    b = np.einsum('nik,nk->ni', GtW, h)
+
+    x = np.full(b.shape, np.nan)
+    ok = np.abs(np.linalg.det(A)) > 1e-300
+    if np.any(ok):
+        x[ok] = np.linalg.solve(A[ok], b[ok][..., np.newaxis])[..., 0]
+
+    return x
@@ -0,0 +1,329 @@
+import os
+import csv
+import ast
+import numpy as np
+
+N = 4 # the number of input channels recorded
+CACHE_EXT = '.cache.npz'
+SAMPLES_EXT = '.samples.npy'
+CHUNK_ROWS = 65536 # rows converted at a time when building the cache
+LSB = 2.49612 / 2**11 # volts per ADC code (ADS7865 DEFAULT_DAC_VOLTAGE)
+
+# Columns of the ping index. 'start' is the row of the first sample of a
+# ping in the recording (see Mission_Recording).
+NUMERIC_COLUMNS = ['start', 'n_samples', 'AGain', 'DGain', 'sample rate',
+                   'heading', 'vpp0', 'vpp1', 'vpp2', 'vpp3', 'peak_freq']
+TEXT_COLUMNS = ['timestamp', 'ping_loc']
+
+
+def get_file_key(fp):
+    """Returns a (size, mtime) tuple identifying the current version of
+    the file at fp. Sidecar files built from fp store this key so that
+    they can tell when they have gone stale.
+    """
+    st = os.stat(fp)
+    return (st.st_size, int(st.st_mtime))
+
+
+def parse_field(item):
+    """Converts a metadata field from a sig file into a python value
+    without running eval() on it. Fields that are not python literals
+    (timestamps for instance) are returned untouched.
+    """
+    try:
+        return ast.literal_eval(item)
+    except (ValueError, SyntaxError):
+        return item
+
+
+def to_float(val):
+    try:
+        return float(val)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def heading_value(ping_loc):
+    """Reduces the ping_loc field to a single number so that it may be
+    stored and filtered on in the index. Returns nan if no heading was
+    recorded for the ping.
+    """
+    if isinstance(ping_loc, dict):
+        ping_loc = ping_loc.get('ab', None)
+
+    if isinstance(ping_loc, (int, float)):
+        return float(ping_loc)
+    else:
+        return np.nan
+
+
+def ping_stats(y, fs):
+    """Computes the summary stats stored in the index for one ping.
+    ARGS:
+      * y: (M, N) array of samples.
+      * fs: sample rate (Hz).
+    Returns a tuple of (vpp per channel, peak frequency)."""
+    vpp = np.ptp(y, axis=0)
+
+    # peak frequency on ch1, ignoring the DC bin
+    M = y.shape[0]
+    if M > 2 and fs > 0:
+        Y = abs(np.fft.rfft(y[:, 0]))
+        peak_freq = (np.argmax(Y[1:]) + 1) * fs / float(M)
+    else:
+        peak_freq = np.nan
+
+    return (vpp, peak_freq)
+
+
+class Ping_Index(object):
+    """Metadata and summary stats of each ping of a mission, for filtering
+    pings. Built from a Mission_Recording, so it holds the same pings as
+    the recording, numbered the same way. The stats that need the samples
+    are computed once, along with the recording's cache (see Sig_Cache).
+    """
+    def __init__(self, recording):
+        self.recording = recording
+        self.headers = recording.headers
+        self.columns = {}
+        self.build()
+
+    def __len__(self):
+        return len(self.columns.get('start', []))
+
+    def build(self):
+        rec = self.recording
+        meta_names = self.headers[N:]
+
+        rows = []
+        for n in range(len(rec)):
+            entry = dict(zip(meta_names, rec.meta[n]))
+
+            row = {}
+            row['start'] = rec.start[n]
+            row['n_samples'] = rec.end[n] - rec.start[n]
+            row['timestamp'] = entry.get('timestamp', '')
+            row['ping_loc'] = entry.get('ping_loc', '')
+            row['AGain'] = entry.get('AGain', np.nan)
+            row['DGain'] = entry.get('DGain', np.nan)
+            row['sample rate'] = parse_field(entry.get('sample rate', 'None'))
+            row['heading'] = heading_value(parse_field(row['ping_loc']))
+            for ch in range(N):
+                row['vpp%d' % ch] = rec.stats[n, ch]
+            row['peak_freq'] = rec.stats[n, N]
+            rows.append(row)
+
+        self.columns = {}
+        for name in NUMERIC_COLUMNS:
+            self.columns[name] = np.array([to_float(row[name]) for row in rows])
+        for name in TEXT_COLUMNS:
+            self.columns[name] = [row[name] for row in rows]
+
+        self.columns['start'] = self.columns['start'].astype(np.int64)
+        self.columns['n_samples'] = self.columns['n_samples'].astype(np.int64)
+
+    def where(self, **criteria):
+        """Returns the ping numbers that satisfy every criterion. Each
+        keyword is the name of a numeric column, and each value is a
+        (min, max) tuple. Use None for an open bound. Example:
+          index.where(peak_freq=(20e3, 24e3), vpp0=(0.1, None))
+        """
+        mask = np.ones(len(self), dtype=bool)
+        for name, (lo, hi) in criteria.items():
+            col = self.columns[name]
+            if lo is not None:
+                mask &= (col >= lo)
+            if hi is not None:
+                mask &= (col <= hi)
+
+        return np.nonzero(mask)[0]
+
+
+# ##################################
+#### Bulk loading ##################
+####################################
+
+def read_sig_file(fp, samples_fp):
+    """Parses an entire sig file in bulk. Samples are converted in chunks
+    and streamed into a float32 .npy file at samples_fp, so the mission
+    never has to fit in memory. Returns a tuple containing the header row,
+    a read-only memory map of the (rows, N) samples, the start and end row
+    of each ping, and a list holding the raw metadata fields of each ping.
+    """
+    # first pass: size the samples file
+    with open(fp, 'rb') as f:
+        headers = next(csv.reader([f.readline()]))
+        n_rows = sum(1 for line in f if line.strip())
+
+    if 'DGainsample rate' in headers:
+        raise ValueError("You forgot to split 'DGainsample rate' in this file!! ({})".format(fp))
+
+    input = np.lib.format.open_memmap(samples_fp, mode='w+', dtype=np.float32, shape=(n_rows, N))
+
+    # second pass: split each row once. Rows with more than N fields open
+    # a new ping.
+    start = []
+    meta_fields = []
+    chunk = []
+    row = 0
+    with open(fp, 'rb') as f:
+        f.readline()
+        for line in f:
+            if not line.strip():
+                continue
+
+            fields = line.rstrip('\r\n').split(',', N)
+            if len(fields) > N:
+                start.append(row + len(chunk))
+                meta_fields.append(fields[N])
+
+            chunk.append(fields[0:N])
+            if len(chunk) == CHUNK_ROWS:
+                # convert the whole chunk in one go
+                input[row:row + len(chunk)] = np.array(chunk, dtype=float)
+                row += len(chunk)
+                chunk = []
+
+        if chunk:
+            input[row:row + len(chunk)] = np.array(chunk, dtype=float)
+
+    input.flush()
+    del input
+
+    start = np.array(start, dtype=np.int64)
+    end = np.append(start[1:], n_rows).astype(np.int64)
+
+    # one pass over the metadata rows
+    meta = list(csv.reader(meta_fields))
+
+    input = np.load(samples_fp, mmap_mode='r')
+    return (headers, input, start, end, meta)
+
+
+def read_stats(headers, input, start, end, meta):
+    """Computes the summary stats of each ping (see ping_stats) out of the
+    memory mapped samples. Returns an (n_pings, N + 1) array holding the
+    vpp of each channel, followed by the peak frequency.
+    """
+    meta_names = headers[N:]
+    stats = np.full((len(start), N + 1), np.nan)
+    for n in range(len(start)):
+        entry = dict(zip(meta_names, meta[n]))
+        fs = to_float(parse_field(entry.get('sample rate', 'None')))
+        (vpp, peak_freq) = ping_stats(np.asarray(input[start[n]:end[n]], dtype=float), fs)
+        stats[n, 0:N] = vpp
+        stats[n, N] = peak_freq
+
+    return stats
+
+
+class Sig_Cache(object):
+    """Binary sidecars holding the bulk parsed contents of a sig file. The
+    samples live in <log>.samples.npy and are memory mapped on load. The
+    rest, along with the summary stats of each ping (see read_stats),
+    lives in <log>.cache.npz, which is keyed by the size and mtime of the
+    log so that both are rebuilt whenever the log changes.
+    """
+    def __init__(self, fp):
+        self.fp = fp
+        self.cache_fp = fp + CACHE_EXT
+        self.samples_fp = fp + SAMPLES_EXT
+
+    def load(self):
+        """Returns the cached (headers, input, start, end, meta, stats)
+        tuple, or None if the cache is missing or stale.
+        """
+        if not (os.path.isfile(self.cache_fp) and os.path.isfile(self.samples_fp)):
+            return None
+
+        try:
+            with np.load(self.cache_fp) as cache:
+                if tuple(cache['key']) != get_file_key(self.fp):
+                    return None
+
+                headers = [str(head) for head in cache['headers']]
+                meta = [[str(item) for item in row] for row in cache['meta']]
+                start = cache['start']
+                end = cache['end']
+                stats = cache['stats']
+
+            input = np.load(self.samples_fp, mmap_mode='r')
+            if len(end) and input.shape[0] != end[-1]:
+                return None
+
+            return (headers, input, start, end, meta, stats)
+
+        except (IOError, ValueError, EOFError, KeyError):
+            # cache is unreadable (e.g. half written). Rebuild it.
+            return None
+
+    def save(self, headers, start, end, meta, stats):
+        # pad the metadata so that it can be stored as one string array
+        width = max([len(row) for row in meta] + [0])
+        meta = [row + [''] * (width - len(row)) for row in meta]
+
+        with open(self.cache_fp, 'wb') as f:
+            np.savez(f,
+                     key=np.array(get_file_key(self.fp)),
+                     headers=np.array(headers),
+                     start=start,
+                     end=end,
+                     stats=stats,
+                     meta=np.array(meta, dtype=str).reshape(len(meta), width))
+
+    def load_or_build(self):
+        contents = self.load()
+        if contents is None:
+            # samples are written first, so a half built cache never
+            # passes the key check above.
+            if os.path.isfile(self.cache_fp):
+                os.remove(self.cache_fp)
+
+            (headers, input, start, end, meta) = read_sig_file(self.fp, self.samples_fp)
+            stats = read_stats(headers, input, start, end, meta)
+            self.save(headers, start, end, meta, stats)
+            contents = (headers, input, start, end, meta, stats)
+
+        return contents
+
+
+class Mission_Recording(object):
+    """Lazy access to the pings of a mission. Samples stay in the memory
+    mapped sidecar, so only the pings that are sliced out get paged in.
+    The summary stats of each ping are in stats (see read_stats).
+    """
+    def __init__(self, fp):
+        self.fp = fp
+        (self.headers, self.samples, self.start, self.end, self.meta,
+         self.stats) = Sig_Cache(fp).load_or_build()
+
+    def __len__(self):
+        return len(self.start)
+
+    def get_meta(self, n):
+        """Returns a dictionary of the metadata recorded with the nth ping."""
+        meta = {}
+        for head, item in zip(self.headers[N:], self.meta[n]):
+            meta[head] = parse_field(item)
+
+        return meta
+
+    def get_ping(self, n, fmt='float32'):
+        """Returns the (M, N) samples of the nth ping.
+        ARGS:
+          * fmt: 'float32' returns a view into the memory map (volts,
+          digital gain applied). 'int16' returns the raw 12 bit ADC codes,
+          recovered from the volts into a new array on every call (the
+          cache only stores volts).
+        """
+        y = self.samples[self.start[n]:self.end[n]]
+
+        if fmt == 'float32':
+            return y
+
+        elif fmt == 'int16':
+            dgain = parse_field(self.meta[n][self.headers[N:].index('DGain')])
+            return np.round(y / (LSB * dgain)).astype(np.int16)
+
+        else:
+            raise ValueError("Unknown sample format '%s'" % fmt)
@@ -1,70 +1,78 @@
 import csv
 import numpy as np
 
+from acoustics_data_manager import Ping_Index, Sig_Cache, Mission_Recording, parse_field
+
 N = 4 # the number of input channels recorded
 
 class Data(object):
     def __init__(self):
         self.data = None
         self.fp = None
+        self.index = None
+
+    def open_file(self, fp):
+        """Opens a sig file for random access. The log is bulk parsed into
+        binary sidecars on the first open only (see Sig_Cache), and the
+        ping index is built out of them.
+        """
+        self.fp = fp
+        self.recording = Mission_Recording(fp)
+        self.index = Ping_Index(self.recording)
+
+        headers = self.recording.headers
+        self.mapping = [head[0:N] for head in headers[0:N]]
+
+    def n_pings(self):
+        return len(self.index)
+
+    def get_ping(self, n, fmt='float32'):
+        """Returns a dictionary containing the samples ('input') and the
+        recorded metadata for the nth ping. float32 samples are a lazy view
+        into the memory mapped recording, int16 ones a copy (see
+        Mission_Recording.get_ping).
+        """
+        ping = self.recording.get_meta(n)
+        ping['input'] = self.recording.get_ping(n, fmt)
+        ping['mapping'] = self.mapping
+        return ping
+
+    def select(self, **criteria):
+        """Returns the ping numbers whose index stats fall within the
+        given (min, max) ranges. See Ping_Index.where().
+        """
+        return self.index.where(**criteria)
 
     def import_file(self, fp):
+        """Loads an entire sig file. The bulk parsed contents are cached in
+        binary sidecars, so reopening an unchanged log skips parsing. The
+        samples ('input') are memory mapped rather than read into memory.
+        """
         self.fp = fp
-        with open(fp, 'rb') as csvfile:
-            self.read1(csvfile)
-            
+        contents = Sig_Cache(fp).load_or_build()
+        self.read1(*contents)
 
-    def read1(self, csvfile):
-        csv_data = csv.reader(csvfile, delimiter=',')
+    def read1(self, headers, input, start, end, meta, stats):
+        """Arranges the bulk parsed contents of a sig file into the data
+        dictionary served by get_data().
+        """
+        print "headers: {}".format(headers)
 
         # data place holders
         data = {}
-        data['input'] = np.empty((0,N), float)
-        data['start'] = []
-        data['end'] = []
-        data['mapping'] = ['']*N
-        headers = []
-        
-        for i,row in enumerate(csv_data):
-
-            if i == 0:
-                # if on first row, just collect the header information
-                headers = [head for head in row]
-                print "headers: {}".format(headers)
-
-                if 'DGainsample rate' in headers:
-                    raise ValueError("You forgot to split 'DGainsample rate' in this file!! ({})".format(self.fp))
-
-                data['mapping'][0] = headers[0][0:N]
-                data['mapping'][1] = headers[1][0:N]
-                data['mapping'][2] = headers[2][0:N]
-                data['mapping'][3] = headers[3][0:N]
-
-                # make a place holder for the rest of the data (dynamically)
-                for head,item in zip(headers[N:],row[N:]):
-                    data[head] = []
-
-                continue
-
-            m = i-1
-            # record data head
-            #TODO: sense how many inputs there are just from the csv file
-            if len(row) > N:
-                data['start'].append(m)
-                data['end'].append(i)
-            else:
-                data['end'][-1] = i
-
-            # stack data to array 
-            input = [float(val) for val in row[0:N]]
-            data['input'] = np.append(data['input'], np.array([input]), axis=0)
-
-            if len(row) > N:
-                for head,item in zip(headers[N:],row[N:]):
-                    try:
-                        data[head].append( eval(item) )
-                    except SyntaxError:
-                        data[head].append( item )
+        data['input'] = input
+        data['start'] = list(start)
+        data['end'] = list(end)
+        data['stats'] = stats
+        data['mapping'] = [head[0:N] for head in headers[0:N]]
+
+        # metadata, one list per header
+        for head in headers[N:]:
+            data[head] = []
+
+        for row in meta:
+            for head, item in zip(headers[N:], row):
+                data[head].append( parse_field(item) )
 
         self.data = data
         return data
@@ -0,0 +1,146 @@
+"""Headless batch replay of recorded missions.
+
+Streams every ping of one or more sig logs through the full acoustics
+pipeline (detection + heading, sim mode) using a pool of worker processes,
+and writes a results table comparing the re-simulated headings against the
+ones recorded during the mission.
+
+usage:
+    python batch_replay.py [-w WORKERS] [-o RESULTS_CSV] LOG [LOG ...]
+
+Each worker owns its own Acoustics object. Pings are handed out in
+contiguous blocks (see --block) and processed in order within a block, so
+gain conditioning carries over from ping to ping the same way it does on
+the robot, except at block boundaries.
+"""
+from os import path
+import sys
+import csv
+import time
+import argparse
+import multiprocessing
+
+root_directory = path.dirname(path.dirname(path.dirname(path.realpath(__file__))))
+sys.path.insert(0, path.join(root_directory, "host_communication"))
+
+import numpy as np
+
+from acoustics_data_manager import Mission_Recording, heading_value
+
+RESULT_HEADER = ['log', 'ping', 'timestamp', 'recorded_heading', 'sim_ab',
+                 'sim_cd', 'heading_error', 'detected', 'TOF', 'TRG_CH',
+                 'rec_AGain', 'rec_DGain', 'AGain', 'DGain', 'process_time']
+
+# worker process globals
+api = None
+recordings = {}
+
+
+def init_worker():
+    """Runs once in each worker. Loads the acoustics pipeline in sim mode."""
+    global api
+    from acoustics_terminal2 import API
+    api = API()
+
+
+def replay_block(task):
+    """Replays pings [first, last) of the log at fp. Returns a list of
+    result rows (see RESULT_HEADER).
+    """
+    (fp, first, last) = task
+
+    if fp not in recordings:
+        recordings[fp] = Mission_Recording(fp)
+    recording = recordings[fp]
+
+    rows = []
+    for n in range(first, last):
+        meta = recording.get_meta(n)
+        y = np.asarray(recording.get_ping(n), dtype=float)
+
+        out = api.process(y, sample_rate=meta['sample rate'])
+
+        recorded = heading_value(meta.get('ping_loc', None))
+        result = out['result'] or {}
+        sim_ab = result.get('ab', None)
+        if sim_ab is None:
+            sim_ab = np.nan
+        sim_cd = result.get('cd', None)
+        if sim_cd is None:
+            sim_cd = np.nan
+
+        # wrap the heading error into [-180, 180)
+        error = (sim_ab - recorded + 180) % 360 - 180
+
+        rows.append([fp, n, meta.get('timestamp', ''), recorded, sim_ab,
+                     sim_cd, error, int(out['update']), out['TOF'],
+                     out['TRG_CH'], meta.get('AGain', ''),
+                     meta.get('DGain', ''), out['AGain'], out['DGain'],
+                     out['process_time']])
+
+    return rows
+
+
+def make_tasks(fps, block):
+    """Splits every log into blocks of consecutive pings."""
+    tasks = []
+    for fp in fps:
+        # build the sidecar caches here, so that the workers don't race
+        # each other to do it.
+        n_pings = len(Mission_Recording(fp))
+
+        for first in range(0, n_pings, block):
+            tasks.append((fp, first, min(first + block, n_pings)))
+
+    return tasks
+
+
+def summarize(rows):
+    errors = np.array([row[6] for row in rows], dtype=float)
+    detected = np.array([row[7] for row in rows], dtype=bool)
+    times = np.array([row[14] for row in rows], dtype=float)
+    valid = ~np.isnan(errors)
+
+    print("batch_replay: %d pings replayed" % len(rows))
+    if len(rows):
+        print("batch_replay: detection rate = %.1f%%" % (100.0 * np.mean(detected)))
+        print("batch_replay: mean process time = %.1fms" % (1000 * np.mean(times)))
+    if np.any(valid):
+        print("batch_replay: heading error vs recorded (%d pings): " % np.sum(valid)
+              + "mean = %.2f deg, " % np.mean(errors[valid])
+              + "rms = %.2f deg" % np.sqrt(np.mean(errors[valid]**2)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded missions through the acoustics pipeline.")
+    parser.add_argument('logs', nargs='+', help="sig csv files to replay")
+    parser.add_argument('-o', '--out', default='batch_replay_results.csv', help="results table")
+    parser.add_argument('-w', '--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('-b', '--block', type=int, default=50, help="pings per work unit")
+    args = parser.parse_args(argv)
+
+    tasks = make_tasks(args.logs, args.block)
+    print("batch_replay: %d blocks of work across %d workers" % (len(tasks), args.workers))
+
+    start = time.time()
+    pool = multiprocessing.Pool(args.workers, initializer=init_worker)
+
+    rows = []
+    try:
+        with open(args.out, 'wb') as f:
+            writer = csv.writer(f)
+            writer.writerow(RESULT_HEADER)
+
+            # imap keeps results in log/ping order
+            for block_rows in pool.imap(replay_block, tasks):
+                writer.writerows(block_rows)
+                rows.extend(block_rows)
+    finally:
+        pool.close()
+        pool.join()
+
+    print("batch_replay: done in %.1fs. Results written to %s" % (time.time() - start, args.out))
+    summarize(rows)
+
+if __name__ == '__main__':
+    main()
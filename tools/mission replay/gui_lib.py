@@ -123,7 +123,15 @@ class Window(object):
             # save canvas data for later access
             self.mpl_data[name] = {'axes':a,
                                    'figure':f,
-                                   'canvas':canvas}
+                                   'canvas':canvas,
+                                   'background':None,
+                                   'traces':[]}
+
+            # recapture the blitting background after every full draw
+            canvas.mpl_connect('draw_event', lambda event, name=name: self._on_draw(name))
+
+            # crop and decimate the traces again whenever the view moves
+            a.callbacks.connect('xlim_changed', lambda axes, name=name: self._on_xlim_changed(name))
                                    
             self.frame_data['plot'] = {'mpl_canvas':canvas}
 
@@ -133,6 +141,99 @@ class Window(object):
     def get_mpl_data(self, frame_name):
         return self.mpl_data[frame_name]
 
+    def update_trace(self, frame_name, trace, x, y, name=None):
+        """Updates the data of a trace in place without drawing anything.
+        If the x axis autoscales, it's rescaled to the new data. What gets
+        drawn is cropped and decimated to the view (see _fit_trace). Call
+        redraw() once all traces are updated.
+        ARGS:
+          * trace: index of the line in the axes. Passing the next unused
+          index creates a new line.
+          * x: monotonic x values of the trace."""
+        mpl_data = self.get_mpl_data(frame_name)
+        axes = mpl_data['axes']
+        traces = mpl_data['traces']
+
+        if trace < len(axes.lines):
+            traces[trace] = (x, y)
+
+        elif trace == len(axes.lines):
+            # animated lines are left out of full draws and blitted instead
+            traces.append((x, y))
+            axes.plot([], [], label=name, animated=True)
+
+            # add to legend
+            if name is not None:
+                axes.legend()
+
+            # layout changed, so the background must be redrawn
+            self.invalidate(frame_name)
+
+        else:
+            raise IndexError("Invalid trace selection: trace{}".format(trace))
+
+        # Rescale to the extent of every trace. The view moving refits
+        # all of them (see _on_xlim_changed).
+        if axes.get_autoscalex_on() and len(x):
+            xlim = (min(t[0][0] for t in traces if len(t[0])),
+                    max(t[0][-1] for t in traces if len(t[0])))
+            if xlim != tuple(axes.get_xlim()) and xlim[0] < xlim[1]:
+                axes.set_xlim(xlim, auto=True)
+
+        self._fit_trace(frame_name, trace)
+
+    def _fit_trace(self, frame_name, trace):
+        """Sets the line of a trace to what can actually be seen on the
+        screen: the trace is cropped to the x range of the view (unless it
+        autoscales, in which case all of it is in view), and decimated to
+        the pixel width of the axes."""
+        mpl_data = self.get_mpl_data(frame_name)
+        axes = mpl_data['axes']
+        (x, y) = mpl_data['traces'][trace]
+
+        if not axes.get_autoscalex_on():
+            (x, y) = crop(x, y, axes.get_xlim())
+        (x, y) = decimate(x, y, int(axes.bbox.width))
+
+        axes.lines[trace].set_data(x, y)
+
+    def _on_xlim_changed(self, frame_name):
+        # zooming in brings back the detail that decimation dropped
+        for trace in range(len(self.mpl_data[frame_name]['traces'])):
+            self._fit_trace(frame_name, trace)
+
+        # ticks moved, so the background must be redrawn
+        self.invalidate(frame_name)
+
+    def invalidate(self, frame_name):
+        """Forces the next redraw() to be a full draw. Use this after
+        changing axes limits, labels, legends and so on."""
+        self.mpl_data[frame_name]['background'] = None
+
+    def redraw(self, frame_name):
+        """Draws the traces of a plot frame. Blits them over the saved
+        background when possible, which is much cheaper than a full draw."""
+        mpl_data = self.get_mpl_data(frame_name)
+        axes = mpl_data['axes']
+        canvas = mpl_data['canvas']
+
+        if mpl_data['background'] is None:
+            canvas.draw()   # _on_draw draws the traces
+        else:
+            canvas.restore_region(mpl_data['background'])
+            for line in axes.lines:
+                axes.draw_artist(line)
+            canvas.blit(axes.bbox)
+
+    def _on_draw(self, frame_name):
+        mpl_data = self.get_mpl_data(frame_name)
+        axes = mpl_data['axes']
+        canvas = mpl_data['canvas']
+
+        mpl_data['background'] = canvas.copy_from_bbox(axes.bbox)
+        for line in axes.lines:
+            axes.draw_artist(line)
+
     def insert_frame(self, name, parent_frame_name, idx, frame_type=None, **kwargs):
         parent_frame = self.frames[parent_frame_name]
         frame = Frame(parent_frame)
@@ -259,3 +360,38 @@ class Window(object):
     def _generate_figure(self):
         f = Figure(figsize=(5, 4), dpi=100)
         a = f.add_subplot(111)
+
+
+# ##################################
+############# Functions ##########
+##################################
+
+def crop(x, y, xlim):
+    """Drops the points of a monotonic (x, y) trace that fall outside of
+    xlim, keeping one extra point on each side so lines reach the edges."""
+    lo = max(np.searchsorted(x, min(xlim), side='left') - 1, 0)
+    hi = np.searchsorted(x, max(xlim), side='right') + 1
+    return (x[lo:hi], y[lo:hi])
+
+
+def decimate(x, y, n_bins):
+    """Reduces (x, y) to about 2*n_bins points by keeping the min and max
+    of each bin. Unlike plain subsampling, peaks and clipping survive."""
+    M = len(y)
+    if n_bins <= 0 or M <= 2 * n_bins:
+        return (x, y)
+
+    w = M // n_bins
+    m = w * n_bins
+    xb = np.reshape(x[0:m], (n_bins, w))
+    yb = np.reshape(y[0:m], (n_bins, w))
+
+    # keep the min and max of each bin in the order they occured
+    rows = np.arange(n_bins)
+    imin = np.argmin(yb, axis=1)
+    imax = np.argmax(yb, axis=1)
+    cols = np.column_stack((np.minimum(imin, imax), np.maximum(imin, imax)))
+
+    x_dec = np.append(xb[rows[:, None], cols].ravel(), x[m:])
+    y_dec = np.append(yb[rows[:, None], cols].ravel(), y[m:])
+    return (x_dec, y_dec)
@@ -2,14 +2,19 @@
 import sys
 sys.path.insert(0, '../../host_communication/')
 
+from collections import OrderedDict
+
 import numpy as np
-from numpy.fft import fft
+from numpy.fft import rfft
 
 import gui_lib
 import acoustics_sim as acoustics
-from acoustics_terminal2 import API
+from sim_worker import Sim_Worker
 
 ACOUSTICS_DATA_DIR = '/home/josh/Documents/URC-development/Raw_Footage/acoustics/'
+SPECTRUM_CACHE_SIZE = 64 # pings
+PREFETCH_PINGS = 2 # neighbors on each side pre-processed by the sim worker
+SIM_POLL_MS = 50
 
 class Main_Window(gui_lib.Window):
     def __init__(self, gui, parent, x, y):
@@ -77,6 +82,7 @@ class Mission_Window(gui_lib.Window):
         self.insert_checkbutton('adaptive_gain', frame_name='navigation', side='top', varname='tog_gain', stick='w', default=True, callback=self.refresh)
         self.insert_checkbutton('zoomY', frame_name='navigation', side='top', varname='zoomY', stick='w', callback=self.refresh)
         self.insert_checkbutton('zoomX', frame_name='navigation', side='top', varname='zoomX', stick='w', callback=self.refresh)
+        self.insert_checkbutton('located pings only', frame_name='navigation', side='top', varname='located_only', stick='w', callback=self.refilter)
 
         # add buttons for manipulatings processing
         #TODO: Empty plots when turning off replay mode.
@@ -94,120 +100,178 @@ class Mission_Window(gui_lib.Window):
         self.insert_dynamiclabel('Heading (reported)', frame_name='info', idx=(0,0), side='top', stick='e', units='deg')
         self.insert_dynamiclabel('Gain Applied', frame_name='info', idx=(1,0), side='top', stick='e', units='V/V')
         self.insert_dynamiclabel('Input Signal Strength (ch1)', frame_name='info', idx=(2,0), side='top', stick='e', units='dBm')
+        self.insert_dynamiclabel('Heading (simulated)', frame_name='info', idx=(3,0), side='top', stick='e', units='deg')
 
         # init plots
         self.data = acoustics.Data()
         self.sample_num = None
+        self.ping_list = []
+        self.spectra = OrderedDict()
+        self.zoomY = None
 
         # simulator placeholders
-        self.terminal = None
+        self.sim_worker = None
 
 
     def refresh(self):
         # Check if zoom option is enabled
         zoomY = self.get_checkbutton_status('navigation', 'zoomY')
-        if zoomY:
-            self.mpl_data['time1']['axes'].set_ylim(-0.3,0.3)
-            self.mpl_data['time2']['axes'].set_ylim(-0.3,0.3)
-        else:
-            self.mpl_data['time1']['axes'].set_ylim(-2.6,2.6)
-            self.mpl_data['time2']['axes'].set_ylim(-2.6,2.6)
+        if zoomY != self.zoomY:
+            self.zoomY = zoomY
+            for frame_name in ['time1', 'time2']:
+                if zoomY:
+                    self.mpl_data[frame_name]['axes'].set_ylim(-0.3,0.3)
+                else:
+                    self.mpl_data[frame_name]['axes'].set_ylim(-2.6,2.6)
+
+                # limits changed, so the background needs a full draw
+                self.invalidate(frame_name)
 
         # update all the plots and graphics
         self.auto_populate(self.data, self.sample_num)
 
         # simulate results if applicable
         if self.get_checkbutton_status('navigation2', 'live_mode') == True:
-            self.update_sim(self.data, self.sample_num) #TODO: make this function better
+            self.update_sim(self.data, self.sample_num)
         else:
-            pass # empty the sim box
-            
+            self.update_label('info', 'Heading (simulated)', ' ---')
+
     def update_sim(self, data, idx):
+        """Asks the sim worker for ping idx. Neighboring pings are queued
+        behind it so that stepping through the mission finds them ready.
+        Results are picked up by poll_sim()."""
         # check if sim is initialized
-        if self.terminal == None:
-            self.terminal = API()
+        if self.sim_worker == None:
+            self.sim_worker = Sim_Worker(data)
+            self.sim_worker.start()
+            self.window.after(SIM_POLL_MS, self.poll_sim, self.sim_worker)
+
+        self.update_label('info', 'Heading (simulated)', ' ...')
+
+        # neighbors, closest first
+        neighbors = []
+        if idx in self.ping_list:
+            pos = self.ping_list.index(idx)
+            for k in range(1, PREFETCH_PINGS + 1):
+                for n in [pos + k, pos - k]:
+                    if 0 <= n < len(self.ping_list):
+                        neighbors.append(self.ping_list[n])
+
+        self.sim_worker.request(idx, neighbors)
+
+    def poll_sim(self, worker):
+        """Runs on the Tk thread. Shows any sim result for the ping that
+        is currently on screen, then reschedules itself for as long as
+        worker is the current one."""
+        if worker is not self.sim_worker:
+            return
+
+        for (idx, sim_data) in worker.poll():
+            if idx != self.sample_num:
+                continue
+
+            if sim_data is None or sim_data['result'] is None:
+                self.update_label('info', 'Heading (simulated)', ' ---')
+            else:
+                self.update_label('info', 'Heading (simulated)', "{:.1f}".format(sim_data['result']['ab']))
 
-        idx = self.sample_num
-        sample = data.get_data()
+        self.window.after(SIM_POLL_MS, self.poll_sim, worker)
 
-        # time domain data
-        start   = sample['start'][idx]
-        end     = sample['end'][idx]
-        M       = end-start
-        dt      = 1.0/sample['sample rate'][idx]  #sample[]
-        t       = np.arange(0, M*dt, dt)
-        gain    = sample['AGain'][idx] * sample['DGain'][idx]
+    def refilter(self):
+        """Rebuilds the list of pings that the navigation buttons step
+        through, using the stats stored in the ping index.
+        """
+        if self.get_checkbutton_status('navigation', 'located_only') == True:
+            self.ping_list = list(self.data.select(heading=(-360, 360)))
+        else:
+            self.ping_list = range(self.data.n_pings())
 
-        sim_data = self.terminal.process( sample['input'][start:end,0:4] )
+        if self.ping_list and (self.sample_num not in self.ping_list):
+            self.sample_num = self.ping_list[0]
 
-    
-    def next_sample(self):
-        self.sample_num += 1
         self.refresh()
 
+    def step(self, n):
+        """Moves n pings forward (or backward) through the ping list."""
+        if not self.ping_list:
+            return
 
-    def prev_sample(self):
-        self.sample_num -= 1
+        if self.sample_num in self.ping_list:
+            pos = self.ping_list.index(self.sample_num) + n
+        else:
+            pos = 0
+
+        pos = min(max(pos, 0), len(self.ping_list) - 1)
+        self.sample_num = self.ping_list[pos]
         self.refresh()
 
+    def next_sample(self):
+        self.step(1)
+
+
+    def prev_sample(self):
+        self.step(-1)
+
     def import_data(self, fp):
-        self.data.import_file(fp)
+        # results of the old mission are meaningless now. The worker reads
+        # from self.data, so it has to be done with its ping before the
+        # file is swapped out from under it.
+        if self.sim_worker is not None:
+            self.sim_worker.stop()
+            self.sim_worker.join()
+            self.sim_worker = None
+
+        self.data.open_file(fp)
+        self.ping_list = range(self.data.n_pings())
+        self.spectra.clear()
         self.auto_populate(self.data, 0)
 
 
     def auto_populate(self, data, idx):
         print self.get_checkbutton_status('navigation', 'tog_gain')
         self.sample_num = idx
-        sample = data.get_data()
+        sample = data.get_ping(idx)
 
         # time domain data
-        start   = sample['start'][idx]
-        end     = sample['end'][idx]
-        M       = end-start
-        dt      = 1.0/sample['sample rate'][idx]  #sample[]
-        t       = np.arange(0, M*dt, dt)
-        gain    = sample['AGain'][idx] * sample['DGain'][idx]
+        M       = sample['input'].shape[0]
+        dt      = 1.0/sample['sample rate']
+        t       = np.arange(M)*dt
+        gain    = sample['AGain'] * sample['DGain']
 
         #TODO: add legends to plot
 
         if self.get_checkbutton_status('navigation', 'tog_gain') == True:
-            y1 = sample['input'][start:end,0]
-            y2 = sample['input'][start:end,1]
-            y3 = sample['input'][start:end,2]
-            y4 = sample['input'][start:end,3]
+            scale = 1.0
         else:
-            
-            y1 = sample['input'][start:end,0] / gain
-            y2 = sample['input'][start:end,1] / gain
-            y3 = sample['input'][start:end,2] / gain
-            y4 = sample['input'][start:end,3] / gain
+            scale = 1.0 / gain
 
+        y1 = sample['input'][:,0] * scale
+        y2 = sample['input'][:,1] * scale
+        y3 = sample['input'][:,2] * scale
+        y4 = sample['input'][:,3] * scale
 
-        self.plot('time1', y1, t, trace=0, name=sample['mapping'][0])
-        self.plot('time1', y2, t, trace=1, name=sample['mapping'][1])
+        self.update_trace('time1', 0, t, y1, name=sample['mapping'][0])
+        self.update_trace('time1', 1, t, y2, name=sample['mapping'][1])
 
-        self.plot('time2', y3, t, trace=0, name=sample['mapping'][2])
-        self.plot('time2', y4, t, trace=1, name=sample['mapping'][3])
+        self.update_trace('time2', 0, t, y3, name=sample['mapping'][2])
+        self.update_trace('time2', 1, t, y4, name=sample['mapping'][3])
 
         # frequency domain data
-        fs = sample['sample rate'][idx]
-        df = fs / M
-        f = np.arange(0, M*df, df)
-
-        #import pdb; pdb.set_trace()
-        Y1 = abs(fft(y1))
-        Y2 = abs(fft(y2))
-        Y3 = abs(fft(y3))
-        Y4 = abs(fft(y4))
+        fs = sample['sample rate']
+        (f, Y) = self.get_spectra(idx, sample['input'], fs)
 
         # Make FFT plots show frequency information
-        self.plot('fft1', Y1, f, trace=0)
-        self.plot('fft1', Y2, f, trace=1)
-        self.plot('fft2', Y3, f, trace=0)
-        self.plot('fft2', Y4, f, trace=1)
+        self.update_trace('fft1', 0, f, Y[:,0] * scale)
+        self.update_trace('fft1', 1, f, Y[:,1] * scale)
+        self.update_trace('fft2', 0, f, Y[:,2] * scale)
+        self.update_trace('fft2', 1, f, Y[:,3] * scale)
+
+        # draw each canvas once
+        for frame_name in ['time1', 'time2', 'fft1', 'fft2']:
+            self.redraw(frame_name)
 
         #TODO: print heading info on the gui
-        heading = sample['ping_loc'][idx]
+        heading = sample['ping_loc']
         if type(heading) != type(''):
             self.update_label('info', 'Heading (reported)', "{:.1f}".format(heading))
         else:
@@ -220,29 +284,24 @@ class Mission_Window(gui_lib.Window):
         sig_strength = np.log10(sig_strength*sig_strength/50.0*1000)*10
         self.update_label('info', 'Input Signal Strength (ch1)', "{:.1f}".format(sig_strength))
 
-    def plot(self, frame_name, y, x, trace=None, name=None):
-        # collect mpl data
-        mpl_data = self.get_mpl_data(frame_name)
-        axes = mpl_data['axes']
-        canvas = mpl_data['canvas']
-
-
-        try:
-            line = axes.lines[trace]
-            line.set_ydata(y)
-
-        except IndexError:
-            if trace==0 or len(axes.lines)==trace:
-                axes.plot(x, y, label=name)
-            else:
-                IndexError("Invalid trace selection: trace{}".format(trace))
+    def get_spectra(self, idx, y, fs):
+        """Returns the frequency axis and magnitude spectra of every channel
+        of ping idx. Spectra are cached, so stepping back and forth through
+        a mission doesn't recompute them."""
+        if idx in self.spectra:
+            # mark as most recently used
+            spectra = self.spectra.pop(idx)
+        else:
+            M = y.shape[0]
+            Y = abs(rfft(y, axis=0))
+            f = np.arange(Y.shape[0]) * (fs / float(M))
+            spectra = (f, Y)
 
-            # add to legend
-            if name is not None:
-                axes.legend()
+        self.spectra[idx] = spectra
+        while len(self.spectra) > SPECTRUM_CACHE_SIZE:
+            self.spectra.popitem(last=False)
 
-        # draw the update
-        canvas.draw()
+        return spectra
 
 def access_terminal_api(self):
     # TODO: code the check box detection
@@ -0,0 +1,105 @@
+import threading
+import traceback
+import Queue
+from collections import OrderedDict
+
+from acoustics_terminal2 import API
+
+
+class Sim_Worker(threading.Thread):
+    """Runs recorded pings through the simulated acoustics pipeline on a
+    background thread, so that the GUI never blocks on API.process().
+
+    The GUI calls request() with the ping it is showing. The worker
+    processes that ping first, then pre-processes its neighbors into a small
+    LRU cache. Results are posted back through a thread-safe queue
+    (self.results) as (ping number, sim_data) tuples, which the GUI drains
+    from its own thread with poll(). sim_data is None for a ping that failed
+    to process.
+
+    NOTE: the pipeline is stateful (gain conditioning carries over from one
+    ping to the next), so a ping's result depends on which pings were
+    processed before it.
+    """
+    def __init__(self, data, cache_size=32):
+        super(Sim_Worker, self).__init__()
+        self.daemon = True
+
+        self.data = data
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.results = Queue.Queue()
+
+        # work shared with the GUI thread
+        self.cond = threading.Condition()
+        self.pending = []
+        self.running = True
+
+        # the pipeline is only ever touched from this thread
+        self.terminal = None
+
+    def request(self, idx, neighbors=()):
+        """Asks for ping idx to be processed, followed by its neighbors.
+        Replaces any work that hasn't been started yet, so scrubbing
+        through a mission doesn't pile up stale requests."""
+        with self.cond:
+            wanted = [idx] + list(neighbors)
+            self.pending = [n for n in wanted if n not in self.cache]
+
+            # Cache hits are the most recently used, idx most of all (the
+            # furthest neighbors get evicted first).
+            for n in reversed(wanted):
+                if n in self.cache:
+                    self.cache[n] = self.cache.pop(n)
+
+            if idx in self.cache:
+                self.results.put((idx, self.cache[idx]))
+
+            self.cond.notify()
+
+    def stop(self):
+        """Asks the worker to exit. A ping that is already being processed
+        is finished first, so join() the worker before touching its data."""
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+
+    def poll(self):
+        """Returns a list of every (ping number, sim_data) result posted
+        since the last poll. Never blocks."""
+        results = []
+        while True:
+            try:
+                results.append(self.results.get_nowait())
+            except Queue.Empty:
+                return results
+
+    def run(self):
+        self.terminal = API()
+
+        while True:
+            with self.cond:
+                while self.running and not self.pending:
+                    self.cond.wait()
+
+                if not self.running:
+                    return
+
+                idx = self.pending.pop(0)
+
+            try:
+                sample = self.data.get_ping(idx)
+                sim_data = self.terminal.process(sample['input'][:,0:4], sample_rate=sample['sample rate'])
+            except Exception:
+                # let the GUI know, but leave the ping out of the cache so
+                # that the next request for it tries again
+                traceback.print_exc()
+                self.results.put((idx, None))
+                continue
+
+            with self.cond:
+                self.cache[idx] = sim_data
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+
+            self.results.put((idx, sim_data))